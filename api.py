@@ -0,0 +1,248 @@
+"""Local JSON API over the forecasts published to the model registry.
+
+    python api.py --port 8502
+
+    GET /health
+    GET /forecast?city=Coimbatore&days=30[&start=YYYY-MM-DD]
+    GET /optimal-purchase?city=Coimbatore&days=30[&start=YYYY-MM-DD]
+
+Forecasts are produced by the batch runner (`python cli.py --stages forecast`)
+and kept in an in-memory LRU of per-city arrays. Every request does a single
+`stat` of the city's registry manifest, so a new registry version is picked up
+on the next request without restarting the server. Encoded responses are
+kept with the cached forecast they came from, so repeated windows skip the
+row building and JSON encoding, and are dropped with it on a new version.
+"""
+import argparse
+import json
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from config import API_CACHE_SIZE, API_HOST, API_PORT, CITIES, MODEL_REGISTRY_DIR
+from models.registry import load_forecast, manifest_mtime
+
+logger = logging.getLogger("golden_time_machine.api")
+
+EPOCH = date(1970, 1, 1)
+MAX_WINDOW_DAYS = 366
+# Encoded responses kept per cached forecast, keyed by (endpoint, start, days)
+MAX_CACHED_RESPONSES = 1024
+
+CachedForecast = namedtuple("CachedForecast",
+                            ["mtime", "manifest", "days", "dates", "yhat", "lower", "upper", "responses"])
+
+class ForecastCache:
+    """Thread-safe LRU of per-city forecast arrays, invalidated by the registry manifest mtime."""
+
+    def __init__(self, capacity=API_CACHE_SIZE, registry_dir=MODEL_REGISTRY_DIR, cities=CITIES):
+        self.capacity = capacity
+        self.registry_dir = registry_dir
+        # Only configured cities are served; anything else in the query string is never used as a path
+        self.cities = {city.lower() for city in cities}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, city):
+        key = city.lower()
+        if key not in self.cities:
+            return None
+        mtime = manifest_mtime(key, self.registry_dir)
+        if mtime == 0:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.mtime == mtime:
+                self._entries.move_to_end(key)
+                return entry
+
+        # Load outside the lock so a refresh of one city never blocks reads of another
+        entry = self._load(key, mtime)
+        if entry is None:
+            return None
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+        return entry
+
+    def _load(self, city, mtime):
+        manifest, forecast = load_forecast(city, self.registry_dir)
+        if manifest is None:
+            return None
+        days = ((forecast['ds'].values.astype('datetime64[D]') - np.datetime64('1970-01-01', 'D'))
+                .astype(np.int64))
+        return CachedForecast(
+            mtime=mtime,
+            manifest=manifest,
+            days=days,
+            dates=forecast['ds'].dt.strftime('%Y-%m-%d').tolist(),
+            yhat=forecast['yhat'].to_numpy(dtype=np.float64),
+            lower=forecast['yhat_lower'].to_numpy(dtype=np.float64),
+            upper=forecast['yhat_upper'].to_numpy(dtype=np.float64),
+            responses={},
+        )
+
+def _window(entry, start, days):
+    """Return the slice of the forecast covering [start, start + days)."""
+    first = (start - EPOCH).days
+    lo = int(np.searchsorted(entry.days, first, side='left'))
+    hi = int(np.searchsorted(entry.days, first + days, side='left'))
+    return slice(lo, hi)
+
+def _row(entry, i):
+    expected = int(entry.yhat[i])
+    lower = int(entry.lower[i])
+    upper = int(entry.upper[i])
+    return {
+        "date": entry.dates[i],
+        "expected_price": expected,
+        "lower_bound": lower,
+        "upper_bound": upper,
+        # Same definition as find_optimal_purchase_dates in the Streamlit app
+        "reliability": round((1 - (upper - lower) / expected) * 100, 2) if expected else None,
+    }
+
+def forecast_response(entry, start, days):
+    window = _window(entry, start, days)
+    return {"forecast": [_row(entry, i) for i in range(window.start, window.stop)]}
+
+def optimal_purchase_response(entry, start, days):
+    window = _window(entry, start, days)
+    yhat = entry.yhat[window]
+    if yhat.size == 0:
+        return {"optimal_dates": []}
+    cheapest = np.flatnonzero(yhat == yhat.min()) + window.start
+    return {"optimal_dates": [_row(entry, i) for i in cheapest]}
+
+ROUTES = {
+    "/forecast": forecast_response,
+    "/optimal-purchase": optimal_purchase_response,
+}
+
+class ForecastRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "GoldenTimeMachineAPI/1.0"
+    # Idle keep-alive connections give their worker back after this many seconds
+    timeout = 5
+    # Buffer the headers and body into one send (handle_one_request flushes after each request);
+    # unbuffered, they are two syscalls and two wakeups of the client
+    wbufsize = -1
+    # Responses larger than the buffer still go out in two writes; without this, Nagle + delayed ACK adds ~40 ms
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self._send(200, {"status": "ok"})
+
+        route = ROUTES.get(url.path)
+        if route is None:
+            return self._send(404, {"error": f"unknown endpoint {url.path}"})
+
+        query = parse_qs(url.query)
+        city = query.get("city", [""])[0]
+        if not city:
+            return self._send(400, {"error": "missing 'city' parameter"})
+        try:
+            days = int(query.get("days", ["30"])[0])
+            start_arg = query.get("start", [None])[0]
+            start = datetime.strptime(start_arg, "%Y-%m-%d").date() if start_arg else date.today()
+        except ValueError as e:
+            return self._send(400, {"error": str(e)})
+        if not 1 <= days <= MAX_WINDOW_DAYS:
+            return self._send(400, {"error": f"'days' must be between 1 and {MAX_WINDOW_DAYS}"})
+
+        entry = self.server.cache.get(city)
+        if entry is None:
+            return self._send(404, {"error": f"no forecast registered for {city}; run `python cli.py --stages forecast`"})
+
+        key = (url.path, start, days)
+        payload = entry.responses.get(key)
+        if payload is None:
+            body = route(entry, start, days)
+            body.update({
+                "city": entry.manifest["city"],
+                "model": entry.manifest["model"],
+                "version": entry.manifest["version"],
+                "window": {"start": start.isoformat(), "end": (start + timedelta(days=days - 1)).isoformat()},
+                "forecast_end_date": entry.manifest["end_date"],
+            })
+            payload = json.dumps(body).encode("utf-8")
+            if len(entry.responses) >= MAX_CACHED_RESPONSES:
+                entry.responses.clear()
+            entry.responses[key] = payload
+        return self._send_payload(200, payload)
+
+    def _send(self, status, body):
+        return self._send_payload(status, json.dumps(body).encode("utf-8"))
+
+    def _send_payload(self, status, payload):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # The default writes every request to stderr, which dominates latency under load
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a fixed-size thread pool."""
+    allow_reuse_address = True
+
+    def __init__(self, address, handler, cache, max_workers=32):
+        super().__init__(address, handler)
+        self.cache = cache
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="api")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request_thread, request, client_address)
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+def create_server(host=API_HOST, port=API_PORT, registry_dir=MODEL_REGISTRY_DIR, cache_size=API_CACHE_SIZE, workers=32,
+                  cities=CITIES):
+    cache = ForecastCache(capacity=cache_size, registry_dir=registry_dir, cities=cities)
+    return PooledHTTPServer((host, port), ForecastRequestHandler, cache, max_workers=workers)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve registered gold price forecasts as JSON.")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--registry-dir", default=MODEL_REGISTRY_DIR)
+    parser.add_argument("--cache-size", type=int, default=API_CACHE_SIZE)
+    parser.add_argument("--workers", type=int, default=32)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = create_server(args.host, args.port, args.registry_dir, args.cache_size, args.workers)
+    logger.info("Serving forecasts from %s on http://%s:%d", args.registry_dir, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""Scaling benchmarks on synthetic gold price histories.
+
+    python -m benchmarks.run_benchmarks                      # quick preset, compare with baselines
+    python -m benchmarks.run_benchmarks --preset full
+    python -m benchmarks.run_benchmarks --only preprocess_data db_read
+    python -m benchmarks.run_benchmarks --update-baselines   # record the current numbers
+
+Each case is timed (best of --repeat runs) and then run once more under
+tracemalloc for its peak Python/NumPy allocation. A case regresses when
+either number exceeds its stored baseline by more than --tolerance and by more
+than an absolute noise floor (5 ms, 1 MiB). Sizes with no baseline (most of
+--preset full) are instead compared with the largest baselined size measured in
+the same run: they regress when they grow faster than their input by more than
+--scaling-tolerance (looser than --tolerance, as the extrapolation multiplies
+the noise of the smaller case). The exit status is 1 if any case regressed.
+"""
+import argparse
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+from datetime import timedelta
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from benchmarks.synthetic import generate_city_history, generate_cities
+from monitoring.metrics import MetricsRecorder, enable_span_peaks, span, use_recorder
+
+BASELINES_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+PRESETS = {
+    "quick": {"years": [1, 5], "cities": [1, 10]},
+    "full": {"years": [1, 5, 10, 20, 40], "cities": [1, 10, 100, 300]},
+}
+
+# Smallest absolute growth reported as a regression; below this, millisecond-scale cases trip on timer
+# and scheduler noise alone
+NOISE_FLOORS = {"seconds": 0.005, "peak_alloc_bytes": 2**20}
+
+BENCHMARKS = {}
+
+def benchmark(name, max_years=None, per_city=False, city_exponent=1):
+    """Register a case factory `fn(years, n_cities) -> run`.
+
+    The factory does the setup outside the timed region. Cases with
+    `per_city` are measured across the city axis as well; the others only
+    scale with history length. `max_years` caps slow cases. Cost is expected
+    to grow linearly with years and as cities ** `city_exponent` (see
+    `check_scaling`).
+    """
+    def decorator(fn):
+        BENCHMARKS[name] = {"factory": fn, "max_years": max_years, "per_city": per_city,
+                            "city_exponent": city_exponent}
+        return fn
+    return decorator
+
+def _prepared(years):
+    from eda.data_analysis import preprocess_data
+    from eda.stationarity import difference_data
+    return difference_data(preprocess_data(generate_city_history(years)), 'Evening')
+
+def _differenced(years):
+    import pandas as pd
+    series = pd.to_numeric(_prepared(years)['Evening_Differenced_1'], errors='coerce').dropna()
+    series.index.freq = pd.infer_freq(series.index)
+    return series
+
+@benchmark("parse_dates", per_city=True)
+def bench_parse_dates(years, n_cities):
+    import pandas as pd
+    from data_pipeline.date_codec import parse_dates
+    dates = pd.concat([history['Date'] for history in generate_cities(n_cities, years).values()], ignore_index=True)
+    return lambda: parse_dates(dates)
+
+@benchmark("preprocess_data")
+def bench_preprocess(years, n_cities):
+    from eda.data_analysis import preprocess_data
+    raw = generate_city_history(years)
+    return lambda: preprocess_data(raw)
+
+@benchmark("compact_series", per_city=True)
+def bench_compact_series(years, n_cities):
+    from eda.series_store import CompactSeries
+    histories = generate_cities(n_cities, years)
+
+    def run():
+        for city, history in histories.items():
+            CompactSeries.from_raw(city, history).differenced_series('Evening')
+    return run
+
+@benchmark("db_write", per_city=True)
+def bench_db_write(years, n_cities):
+    from database.db_handler import GoldPriceDB
+    histories = generate_cities(n_cities, years)
+
+    def run():
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            db = GoldPriceDB(os.path.join(tmp_dir, "bench.db"))
+            for city, history in histories.items():
+                db.update_data(city, history)
+            db.close()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return run
+
+@benchmark("db_write_bulk", per_city=True)
+def bench_db_write_bulk(years, n_cities):
+    from database.db_handler import GoldPriceDB
+    histories = generate_cities(n_cities, years)
+
+    def run():
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            db = GoldPriceDB(os.path.join(tmp_dir, "bench.db"))
+            db.update_cities(histories)
+            db.close()
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    return run
+
+@benchmark("db_read", per_city=True)
+def bench_db_read(years, n_cities):
+    from database.db_handler import GoldPriceDB
+    tmp_dir = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, tmp_dir, True)
+    db = GoldPriceDB(os.path.join(tmp_dir, "bench.db"))
+    cities = generate_cities(n_cities, years)
+    for city, history in cities.items():
+        db.update_data(city, history)
+
+    def run():
+        for city in cities:
+            db.get_all_data(city)
+    return run
+
+@benchmark("db_read_multi", per_city=True)
+def bench_db_read_multi(years, n_cities):
+    from database.db_handler import GoldPriceDB
+    tmp_dir = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, tmp_dir, True)
+    db = GoldPriceDB(os.path.join(tmp_dir, "bench.db"))
+    db.update_cities(generate_cities(n_cities, years))
+    return db.get_cities_data
+
+@benchmark("db_read_rollups", per_city=True)
+def bench_db_read_rollups(years, n_cities):
+    from database.db_handler import GoldPriceDB
+    tmp_dir = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, tmp_dir, True)
+    db = GoldPriceDB(os.path.join(tmp_dir, "bench.db"))
+    cities = generate_cities(n_cities, years)
+    for city, history in cities.items():
+        db.update_data(city, history)
+
+    def run():
+        for city in cities:
+            db.get_rollups(city, 'month')
+    return run
+
+@benchmark("validate_batch", per_city=True)
+def bench_validate_batch(years, n_cities):
+    from data_pipeline.validation import validate_batch
+    # One scraped batch per city, as a full-history backfill would deliver it
+    batches = list(generate_cities(n_cities, years).values())
+
+    def run():
+        for batch in batches:
+            validate_batch(batch)
+    return run
+
+@benchmark("anomaly_scan", per_city=True)
+def bench_anomaly_scan(years, n_cities):
+    from data_pipeline.anomaly import scan
+    # The one-off warm-up over the stored history; daily ingests then cost one update per city
+    histories = list(generate_cities(n_cities, years).values())
+
+    def run():
+        for history in histories:
+            scan(None, history)
+    return run
+
+@benchmark("create_sequences")
+def bench_create_sequences(years, n_cities):
+    from sklearn.preprocessing import MinMaxScaler
+    from models.lstm_model import create_sequences
+    scaled = MinMaxScaler().fit_transform(_differenced(years).values.reshape(-1, 1))
+    return lambda: create_sequences(scaled, 10)
+
+@benchmark("train_arima", max_years=20)
+def bench_train_arima(years, n_cities):
+    from models.arima_model import train_arima
+    series = _differenced(years)
+    return lambda: train_arima(series)
+
+@benchmark("train_prophet", max_years=10)
+def bench_train_prophet(years, n_cities):
+    from models.prophet_model import train_prophet
+    train_df = _differenced(years).reset_index()
+    train_df.columns = ['ds', 'y']
+    return lambda: train_prophet(train_df)
+
+@benchmark("baseline_forecasters", per_city=True)
+def bench_baseline_forecasters(years, n_cities):
+    import numpy as np
+    from eda.series_store import CompactSeries
+    from models.baseline_models import TRAINERS, forecast_baseline
+    # All cities share the synthetic start date, so their grids line up column for column
+    rows = [CompactSeries.from_raw(city, history).values('Evening')
+            for city, history in generate_cities(n_cities, years).items()]
+    length = min(len(row) for row in rows)
+    prices = np.stack([row[:length] for row in rows])
+
+    def run():
+        for train in TRAINERS.values():
+            forecast_baseline(train(prices), 90)
+    return run
+
+@benchmark("purchase_risk")
+def bench_purchase_risk(years, n_cities):
+    from eda.series_store import CompactSeries
+    from models.purchase_risk import bootstrap_purchase_risk
+    series = CompactSeries.from_raw("City0000", generate_city_history(years))
+    last_date = series.index()[-1]
+    return lambda: bootstrap_purchase_risk(series, last_date, last_date + timedelta(days=90), seed=0)
+
+@benchmark("cross_city", per_city=True, city_exponent=2)
+def bench_cross_city(years, n_cities):
+    from eda.cross_city import analyze_cities
+    from eda.series_store import CompactSeries
+    series = [CompactSeries.from_raw(city, history) for city, history in generate_cities(n_cities, years).items()]
+    return lambda: analyze_cities(series)
+
+@benchmark("eda_plots")
+def bench_eda_plots(years, n_cities):
+    from eda.visualization import plot_boxplots, plot_time_series, plot_rolling_statistics, plot_decomposition
+    from eda.stationarity import (plot_scatter_comparison, plot_lagged_scatter_comparison,
+                                  plot_time_series_comparison, plot_autocorrelation_comparison)
+    data = _prepared(years)
+    # The scatter plots index up to ~2 years ahead; interpolate the gaps the decomposition rejects
+    data = data.interpolate(limit_direction='both')
+    plots = [plot_boxplots, plot_time_series, plot_rolling_statistics, plot_decomposition]
+    if len(data) > 1100:
+        plots += [lambda d: plot_scatter_comparison(d, 'Evening'), lambda d: plot_lagged_scatter_comparison(d, 'Evening')]
+    plots += [lambda d: plot_time_series_comparison(d, 'Evening'), lambda d: plot_autocorrelation_comparison(d, 'Evening')]
+
+    def run():
+        for plot in plots:
+            fig = plot(data)
+            fig.canvas.draw()
+            plt.close(fig)
+    return run
+
+def _cases(names, preset):
+    sizes = PRESETS[preset]
+    for name in names:
+        spec = BENCHMARKS[name]
+        for years in sizes["years"]:
+            if spec["max_years"] is not None and years > spec["max_years"]:
+                continue
+            for n_cities in (sizes["cities"] if spec["per_city"] else [1]):
+                case_id = f"{name}[years={years},cities={n_cities}]" if spec["per_city"] else f"{name}[years={years}]"
+                yield case_id, name, years, n_cities
+
+def measure(factory, years, n_cities, repeat):
+    run = factory(years, n_cities)
+    run()  # warm-up: imports, Stan/TensorFlow initialisation, page cache
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    recorder = MetricsRecorder()
+    tracemalloc.start()
+    try:
+        # The span's RSS peak covers this run only (where the kernel supports resetting it)
+        with use_recorder(recorder), span("benchmark"):
+            run()
+        _, peak_alloc = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    rss = recorder.spans[0]
+    return {"seconds": min(timings), "peak_alloc_bytes": peak_alloc,
+            "peak_rss_bytes": rss["peak_rss_bytes"], "peak_rss_scope": rss["peak_rss_scope"]}
+
+def compare(case_id, result, baselines, tolerance):
+    """A metric regresses when it grows by more than `tolerance` of its baseline and by more than its noise floor."""
+    baseline = baselines.get(case_id)
+    if baseline is None:
+        return "new", []
+    regressions = [
+        f"{key} {result[key]:.4g} > {baseline[key]:.4g} (+{(result[key] / baseline[key] - 1) * 100:.0f}%)"
+        for key, floor in NOISE_FLOORS.items()
+        if baseline.get(key) and result[key] - baseline[key] > max(tolerance * baseline[key], floor)
+    ]
+    return ("REGRESSION" if regressions else "ok"), regressions
+
+def check_scaling(smaller, larger, growth, tolerance):
+    """Regressions of `larger` against `smaller`, a case of the same benchmark on `growth` times less input.
+
+    Needs no baseline for either size: a metric regresses when it grows by
+    more than `growth`, plus `tolerance`, and by more than its noise floor.
+    """
+    regressions = []
+    for key, floor in NOISE_FLOORS.items():
+        expected = smaller[key] * growth
+        if expected and larger[key] - expected > max(tolerance * expected, floor):
+            regressions.append(f"{key} x{larger[key] / smaller[key]:.1f} for x{growth:g} input "
+                               f"({smaller[key]:.4g} -> {larger[key]:.4g})")
+    return regressions
+
+def _scaling_anchor(name, years, n_cities, anchors):
+    """The largest smaller case checked against a baseline in this run, and the expected cost ratio to it."""
+    spec = BENCHMARKS[name]
+    smaller = [(anchor_years, anchor_cities, result) for anchor_years, anchor_cities, result in anchors.get(name, [])
+               if anchor_years <= years and anchor_cities <= n_cities]
+    if not smaller:
+        return None
+    anchor_years, anchor_cities, result = max(smaller, key=lambda anchor: anchor[0] * anchor[1])
+    return result, (years / anchor_years) * (n_cities / anchor_cities) ** spec["city_exponent"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline on synthetic gold price histories.")
+    parser.add_argument("--preset", choices=PRESETS, default="quick")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown/growth over the baseline, as a fraction.")
+    parser.add_argument("--scaling-tolerance", type=float, default=1.0,
+                        help="Allowed growth over linear scaling from the largest baselined size, as a fraction.")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--update-baselines", action="store_true")
+    parser.add_argument("--output", help="Also write this run's results to a JSON file.")
+    args = parser.parse_args(argv)
+    # statsmodels/Prophet warn on every fit of the gappy synthetic series; they only clutter the report
+    warnings.simplefilter("ignore")
+    # The runner is its own process, so resetting the RSS high-water mark per span disturbs nothing else
+    enable_span_peaks()
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+
+    results = {}
+    anchors = {}
+    failed = False
+    for case_id, name, years, n_cities in _cases(args.only, args.preset):
+        result = measure(BENCHMARKS[name]["factory"], years, n_cities, args.repeat)
+        results[case_id] = result
+        status, regressions = compare(case_id, result, baselines, args.tolerance)
+        if status != "new":
+            anchors.setdefault(name, []).append((years, n_cities, result))
+        else:
+            # Sizes without a baseline (most of --preset full) must grow in step with their input from a baselined size
+            anchor = _scaling_anchor(name, years, n_cities, anchors)
+            if anchor is not None:
+                smaller, growth = anchor
+                regressions = check_scaling(smaller, result, growth, args.scaling_tolerance)
+                status = "REGRESSION" if regressions else "new"
+        failed = failed or bool(regressions)
+        print(f"{case_id:<45} {result['seconds'] * 1000:>10.1f} ms {result['peak_alloc_bytes'] / 2**20:>9.1f} MiB  {status}",
+              flush=True)
+        for regression in regressions:
+            print(f"    {regression}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.update_baselines:
+        baselines.update({
+            case_id: {"seconds": result["seconds"], "peak_alloc_bytes": result["peak_alloc_bytes"]}
+            for case_id, result in results.items()
+        })
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+        print(f"Baselines written to {args.baselines}")
+        return 0
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.date_codec import epoch_day, format_dates
+
+# 'yy' years only round-trip unambiguously within 1969-2068 (strptime's %y pivot), so histories start in 2000
+SYNTHETIC_START_DATE = datetime(2000, 1, 1)
+
+def generate_city_history(years, seed=0, start_date=SYNTHETIC_START_DATE, missing_rate=0.01):
+    """Daily Morning/Evening prices shaped like the scraped table: string columns, some days missing.
+
+    Prices follow a geometric random walk with a mild upward drift, and the
+    morning rate differs from the evening rate on a small share of days.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(round(years * 365.25))
+    days = epoch_day(start_date) + np.arange(n, dtype=np.int32)
+
+    log_returns = rng.normal(loc=0.0003, scale=0.006, size=n)
+    evening = 2500 * np.exp(np.cumsum(log_returns))
+    evening = (np.round(evening / 5) * 5).astype(np.int64)
+    morning = evening + rng.choice([0, 0, 0, 0, 5, -5, 10, -10], size=n)
+
+    keep = rng.random(n) >= missing_rate
+    return pd.DataFrame({
+        'Date': format_dates(days[keep]),
+        'Morning': morning[keep].astype(str),
+        'Evening': evening[keep].astype(str),
+    })
+
+def generate_cities(n_cities, years, seed=0):
+    """Independent histories for `n_cities` synthetic cities, keyed by city name."""
+    return {
+        f"City{i:04d}": generate_city_history(years, seed=seed + i)
+        for i in range(n_cities)
+    }
@@ -0,0 +1,344 @@
+"""Headless batch runner for the Golden Time Machine pipeline.
+
+Runs ingestion, EDA summaries, model training, backtesting and forecasting for
+one or more cities without Streamlit, e.g. for nightly jobs or profiling:
+
+    python cli.py --city Coimbatore --stages ingest forecast
+    python cli.py --all-cities --workers 4 --output-dir output
+    python cli.py --all-cities --stages backtest --models lstm --global-lstm
+
+Exit status: 0 if every stage succeeded for every city, 1 if any stage failed,
+2 on invalid arguments.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from config import CITIES, DB_PATH, MODEL_REGISTRY_DIR
+from monitoring.metrics import MetricsRecorder, span, use_recorder
+
+STAGES = ["ingest", "eda", "train", "backtest", "forecast"]
+MODELS = ["arima", "lstm", "prophet"]  # same order as models.pipeline.MODELS
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+
+logger = logging.getLogger("golden_time_machine.cli")
+
+def load_city_data(city, db_path):
+    """Read the city's price history into a compact, read-only series."""
+    from database.db_handler import GoldPriceDB
+    from eda.series_store import CompactSeries
+
+    db = GoldPriceDB(db_path)
+    try:
+        return CompactSeries.from_raw(city, db.get_all_data(city))
+    finally:
+        db.close()
+
+def fit_models(inputs, models):
+    """Fit each model in this (worker) process; the CLI already parallelises across cities."""
+    from models.pipeline import FITTERS
+
+    return {name: {k: float(v) for k, v in FITTERS[name](inputs).metrics.items()} for name in models}
+
+def fit_global_lstm_stage(cities, stage, options):
+    """Train/backtest one city-embedding LSTM over all cities in this process; returns {city: metrics or error}."""
+    from models.pipeline import ModelResult, prepare_model_data, fit_global_lstm
+
+    test_days = options["test_days"] if stage == "backtest" else None
+    inputs, outcome = {}, {}
+    for city in cities:
+        try:
+            inputs[city] = prepare_model_data(load_city_data(city, options["db_path"]), test_days=test_days)
+        except Exception as e:
+            logger.exception("%s: could not prepare data for the global LSTM", city)
+            outcome[city] = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    if inputs:
+        try:
+            with span("pipeline", step=f"global_lstm_{stage}"):
+                results = fit_global_lstm(inputs)
+        except Exception as e:
+            logger.exception("global LSTM %s failed", stage)
+            results = {city: ModelResult("lstm", error=f"{type(e).__name__}: {e}") for city in inputs}
+        for city, result in results.items():
+            outcome[city] = ({"status": "ok", "result": {k: float(v) for k, v in result.metrics.items()}}
+                             if result.ok else {"status": "error", "error": result.error})
+    return outcome
+
+def eda_summary(series):
+    """Numeric counterpart of the EDA page: nulls, outliers and original/differenced statistics."""
+    from eda.data_analysis import calculate_statistics
+
+    data = series.to_frame(differenced=('Evening',))
+    stats = calculate_statistics(data)
+    summary = {
+        "rows": int(len(data)),
+        "start_date": data.index.min().strftime("%Y-%m-%d"),
+        "end_date": data.index.max().strftime("%Y-%m-%d"),
+        "null_values": int(stats["null_values"]),
+        "outliers": {col: int(count) for col, count in stats["outliers"].items()},
+    }
+    for column in ['Evening', 'Evening_Differenced_1']:
+        rolling = data[column].rolling(window=30)
+        summary[column] = {
+            "mean": float(data[column].mean()),
+            "std": float(data[column].std()),
+            "rolling_mean_30": float(rolling.mean().iloc[-1]),
+            "rolling_std_30": float(rolling.std().iloc[-1]),
+        }
+    return summary
+
+def prophet_training_frame(series):
+    return series.to_frame(columns=('Evening',)).reset_index()[['Date', 'Evening']].rename(columns={'Date': 'ds', 'Evening': 'y'})
+
+def forecast_prices(series, start_date, end_date, registry_dir=MODEL_REGISTRY_DIR, model=None):
+    """Headless version of the "Find Optimal Purchase Date" button; `model` skips the fit (e.g. from a batch)."""
+    from models.prophet_model import train_prophet, find_optimal_purchase_dates
+
+    if model is None:
+        model = train_prophet(prophet_training_frame(series), warm_start_key=(series.city, 'Evening'),
+                              registry_dir=registry_dir)
+
+    future = pd.DataFrame({'ds': pd.date_range(start=start_date, end=end_date)})
+    forecast = model.predict(future)
+    optimal_dates = find_optimal_purchase_dates(forecast, start_date, end_date)
+
+    forecast_display = forecast[['ds', 'yhat', 'yhat_lower', 'yhat_upper']].rename(
+        columns={'ds': 'Date', 'yhat': 'Expected Price', 'yhat_lower': 'Lower Bound', 'yhat_upper': 'Upper Bound'}
+    )
+    forecast_display['Date'] = forecast_display['Date'].dt.strftime('%d-%m-%Y')
+    for column in ['Expected Price', 'Lower Bound', 'Upper Bound']:
+        forecast_display[column] = forecast_display[column].astype(int)
+    forecast_display['Reliability (%)'] = (
+        (1 - (forecast_display['Upper Bound'] - forecast_display['Lower Bound']) / forecast_display['Expected Price']) * 100
+    ).round(2)
+    return forecast, forecast_display, optimal_dates
+
+def publish_forecast(city, history, model, options):
+    """Forecast the requested window with a fitted model, write the city's CSVs and register the forecast."""
+    from models.registry import register_forecast
+
+    np.random.seed(options["seed"])
+    forecast, forecast_display, optimal_dates = forecast_prices(history, options["start_date"], options["end_date"],
+                                                              options["registry_dir"], model=model)
+    city_dir = os.path.join(options["output_dir"], city.lower())
+    os.makedirs(city_dir, exist_ok=True)
+    forecast_display.to_csv(os.path.join(city_dir, "forecast.csv"), index=False)
+    optimal_dates.to_csv(os.path.join(city_dir, "optimal_dates.csv"), index=False)
+    entry = register_forecast(city, forecast, registry_dir=options["registry_dir"])
+    return {
+        "start_date": options["start_date"],
+        "end_date": options["end_date"],
+        "registry_version": entry["version"],
+        "optimal_dates": optimal_dates.to_dict(orient="records"),
+    }
+
+def forecast_stage(cities, options, workers):
+    """Fit every city's Prophet model in one parallel batch, then forecast and publish each; returns {city: outcome}."""
+    from models.prophet_model import train_prophet_batch
+
+    histories, outcome = {}, {}
+    for city in cities:
+        try:
+            histories[city] = load_city_data(city, options["db_path"])
+        except Exception as e:
+            logger.exception("%s: could not load data", city)
+            outcome[city] = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    with span("pipeline", step="prophet_batch"):
+        models = train_prophet_batch({city: prophet_training_frame(history) for city, history in histories.items()},
+                                     warm_start_name='Evening', max_workers=min(workers, max(len(histories), 1)),
+                                     registry_dir=options["registry_dir"])
+    for city, model in models.items():
+        try:
+            if isinstance(model, Exception):
+                raise model
+            with span("pipeline", city=city, step="forecast"):
+                outcome[city] = {"status": "ok", "result": publish_forecast(city, histories[city], model, options)}
+        except Exception as e:
+            logger.exception("%s: stage 'forecast' failed", city)
+            outcome[city] = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+    return outcome
+
+def write_city_summary(result, options):
+    result["ok"] = all(stage["status"] == "ok" for stage in result["stages"].values())
+    with open(os.path.join(options["output_dir"], result["city"].lower(), "summary.json"), "w") as f:
+        json.dump(result, f, indent=2, sort_keys=True, default=str)
+
+def run_city(city, stages, models, options):
+    """Run the requested stages for one city in a worker process, returning its result and timing spans."""
+    recorder = MetricsRecorder()
+    with use_recorder(recorder):
+        result = _run_city(city, stages, models, options)
+    result["spans"] = recorder.spans
+    return result
+
+def _run_city(city, stages, models, options):
+    from models.pipeline import prepare_model_data
+
+    np.random.seed(options["seed"])
+    city_dir = os.path.join(options["output_dir"], city.lower())
+    os.makedirs(city_dir, exist_ok=True)
+
+    result = {"city": city, "stages": {}}
+    history = None
+
+    def record(stage, fn):
+        try:
+            with span("pipeline", city=city, step=stage):
+                result["stages"][stage] = {"status": "ok", "result": fn()}
+        except Exception as e:
+            logger.exception("%s: stage '%s' failed", city, stage)
+            result["stages"][stage] = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+    if "ingest" in stages:
+        from data_pipeline.ingest import ingest_city
+        record("ingest", lambda: ingest_city(city, options["db_path"]))
+
+    if any(stage in stages for stage in STAGES[1:]):
+        try:
+            history = load_city_data(city, options["db_path"])
+        except Exception as e:
+            logger.exception("%s: could not load data", city)
+            for stage in STAGES[1:]:
+                if stage in stages:
+                    result["stages"][stage] = {"status": "error", "error": f"{type(e).__name__}: {e}"}
+            stages = []
+
+    if "eda" in stages:
+        record("eda", lambda: eda_summary(history))
+
+    if "train" in stages:
+        # Mirrors the Streamlit "Model the data" page: fit and score on the full differenced series
+        record("train", lambda: fit_models(prepare_model_data(history), models))
+
+    if "backtest" in stages:
+        record("backtest", lambda: fit_models(prepare_model_data(history, test_days=options["test_days"]), models))
+
+    metric_rows = [
+        {"stage": stage, "model": name, **scores}
+        for stage in ("train", "backtest")
+        if result["stages"].get(stage, {}).get("status") == "ok"
+        for name, scores in result["stages"][stage]["result"].items()
+    ]
+    if metric_rows:
+        pd.DataFrame(metric_rows).to_csv(os.path.join(city_dir, "metrics.csv"), index=False)
+
+    write_city_summary(result, options)
+    return result
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the gold price pipeline without the Streamlit UI.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--city", action="append", choices=CITIES, help="City to process (repeatable).")
+    target.add_argument("--all-cities", action="store_true", help="Process every city in config.CITIES.")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to run, in pipeline order.")
+    parser.add_argument("--models", nargs="+", choices=MODELS, default=MODELS, help="Models for the train/backtest stages.")
+    parser.add_argument("--db-path", default=DB_PATH)
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--registry-dir", default=MODEL_REGISTRY_DIR, help="Where forecast-stage results are published for the API.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes across cities.")
+    parser.add_argument("--test-days", type=int, default=30, help="Hold-out length for the backtest stage.")
+    parser.add_argument("--start-date", default=datetime.today().strftime("%Y-%m-%d"), help="First forecast day (YYYY-MM-DD).")
+    parser.add_argument("--horizon", type=int, default=30, help="Days to forecast after the start date.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--global-lstm", action="store_true",
+                        help="Fit one LSTM with a city embedding across all selected cities instead of one per city.")
+    parser.add_argument("--metrics-file", help="Export stage timings to this file (.prom/.txt for Prometheus text, otherwise JSON).")
+    args = parser.parse_args(argv)
+
+    try:
+        start_date = datetime.strptime(args.start_date, "%Y-%m-%d")
+    except ValueError:
+        parser.error(f"invalid --start-date {args.start_date!r}, expected YYYY-MM-DD")
+    if args.horizon < 0 or args.test_days < 1 or args.workers < 1:
+        parser.error("--horizon must be >= 0, --test-days and --workers must be >= 1")
+    args.end_date = (start_date + timedelta(days=args.horizon)).strftime("%Y-%m-%d")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    cities = CITIES if args.all_cities else list(dict.fromkeys(args.city))
+    stages = [stage for stage in STAGES if stage in args.stages]
+    options = {
+        "db_path": args.db_path,
+        "output_dir": args.output_dir,
+        "registry_dir": args.registry_dir,
+        "test_days": args.test_days,
+        "start_date": args.start_date,
+        "end_date": args.end_date,
+        "seed": args.seed,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # With --global-lstm the per-city workers skip the LSTM and one shared model is fitted afterwards
+    global_lstm_stages = [stage for stage in ("train", "backtest") if stage in stages] if args.global_lstm and "lstm" in args.models else []
+    city_models = [name for name in args.models if not (global_lstm_stages and name == "lstm")]
+    # Forecasts are fitted afterwards in one Prophet batch across all cities, once every city is ingested
+    city_stages = [stage for stage in stages if stage != "forecast"]
+
+    # Spawned workers keep TensorFlow/Stan state out of the parent and behave the same on every OS
+    with ProcessPoolExecutor(max_workers=min(args.workers, len(cities)), mp_context=get_context("spawn")) as pool:
+        futures = [pool.submit(run_city, city, city_stages, city_models, options) for city in cities]
+        results = []
+        for city, future in zip(cities, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                logger.exception("%s: worker crashed", city)
+                results.append({"city": city, "ok": False, "stages": {}, "error": f"{type(e).__name__}: {e}"})
+
+    recorder = MetricsRecorder()
+    for result in results:
+        recorder.extend(result.pop("spans", []))
+
+    global_lstm = {}
+    with use_recorder(recorder):
+        for stage in global_lstm_stages:
+            global_lstm[stage] = fit_global_lstm_stage(cities, stage, options)
+        if "forecast" in stages:
+            forecasts = forecast_stage([result["city"] for result in results if "error" not in result], options,
+                                       args.workers)
+            for result in results:
+                if result["city"] in forecasts:
+                    result["stages"]["forecast"] = forecasts[result["city"]]
+                    write_city_summary(result, options)
+    metric_rows = [
+        {"city": city, "stage": stage, "model": "lstm", **outcome["result"]}
+        for stage, outcomes in global_lstm.items()
+        for city, outcome in outcomes.items() if outcome["status"] == "ok"
+    ]
+    if metric_rows:
+        pd.DataFrame(metric_rows).to_csv(os.path.join(args.output_dir, "global_lstm_metrics.csv"), index=False)
+    if args.metrics_file:
+        recorder.export(args.metrics_file)
+
+    summary = {
+        "cities": results,
+        "ok": all(result["ok"] for result in results)
+              and all(outcome["status"] == "ok" for outcomes in global_lstm.values() for outcome in outcomes.values()),
+        "global_lstm": global_lstm,
+        "stages": stages,
+        "models": args.models,
+    }
+    with open(os.path.join(args.output_dir, "run_summary.json"), "w") as f:
+        json.dump(summary, f, indent=2, sort_keys=True, default=str)
+
+    for result in results:
+        logger.info("%s: %s", result["city"], "ok" if result["ok"] else "FAILED")
+    return EXIT_OK if summary["ok"] else EXIT_FAILED
+
+if __name__ == "__main__":
+    sys.exit(main())
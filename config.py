@@ -5,3 +5,15 @@ DB_PATH = "database/gold_prices.db"
 #    'lstm': 'models/lstm_model.h5',
 #    'prophet': 'models/prophet_model.json',
 #}
+MODEL_REGISTRY_DIR = "models/registry"
+
+# Simulated paths Prophet draws per forecast for yhat_lower/yhat_upper (Prophet's default is 1000).
+# Lower values cut predict latency at the cost of noisier bounds; 0 drops the bounds, which the purchase-date views need.
+PROPHET_UNCERTAINTY_SAMPLES = 1000
+
+API_HOST = "127.0.0.1"
+API_PORT = 8502
+API_CACHE_SIZE = 256
+
+# Write each run's stage timings here; ".prom"/".txt" for Prometheus text, otherwise JSON (None disables)
+METRICS_EXPORT_PATH = None
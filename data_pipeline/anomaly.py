@@ -0,0 +1,82 @@
+"""Online anomaly detection on the daily Evening price change.
+
+Each newly stored day updates a per-city DetectorState: the last price and
+an exponentially weighted mean and variance of the day-to-day change (the
+Evening_Differenced_1 series of the EDA). A change whose z-score against that
+state exceeds Z_THRESHOLD is reported as an event. The state is five numbers,
+so a daily ingest costs the same whatever the length of the history.
+
+The update is winsorized: a change is clipped to Z_THRESHOLD standard
+deviations before it enters the mean and variance, so a single spike does
+not inflate the scale and hide the next one.
+"""
+import math
+from dataclasses import dataclass, asdict
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.date_codec import INVALID_DAY, parse_dates, format_iso
+
+# Smoothing of the running mean/variance; 2 / (span + 1) with a span of about a month
+ANOMALY_ALPHA = 2 / (30 + 1)
+Z_THRESHOLD = 4.0
+# Changes needed before the running variance is trusted enough to flag anything
+WARMUP_CHANGES = 20
+
+EVENT_COLUMNS = ['Date', 'Evening', 'change', 'zscore']
+
+@dataclass
+class DetectorState:
+    last_day: int
+    last_price: float
+    mean: float = 0.0
+    var: float = 0.0
+    n: int = 0
+
+    def to_dict(self):
+        return asdict(self)
+
+def update_state(state, day, price, alpha=ANOMALY_ALPHA, threshold=Z_THRESHOLD, warmup=WARMUP_CHANGES):
+    """Fold one day's price into the state; returns (state, event or None).
+
+    Days on or before the state's last day (late backfills) are skipped, as
+    the running statistics only move forward in time.
+    """
+    if state is None:
+        return DetectorState(day, price), None
+    if day <= state.last_day:
+        return state, None
+
+    change = price - state.last_price
+    std = math.sqrt(state.var)
+    event = None
+    if state.n >= warmup and std > 0:
+        zscore = (change - state.mean) / std
+        if abs(zscore) > threshold:
+            event = {'Date': format_iso(day), 'Evening': price, 'change': change, 'zscore': zscore}
+        change = min(max(change, state.mean - threshold * std), state.mean + threshold * std)
+    deviation = change - state.mean
+    increment = alpha * deviation
+    state.mean += increment
+    state.var = (1 - alpha) * (state.var + deviation * increment)
+    state.n += 1
+    state.last_day, state.last_price = day, price
+    return state, event
+
+def scan(state, rows):
+    """Run the detector over stored rows (Date/Evening strings); returns (state, events frame).
+
+    Rows are taken in day order; unparseable dates and missing prices are skipped.
+    """
+    days = parse_dates(rows['Date'], errors='coerce').astype(np.int64)
+    prices = pd.to_numeric(rows['Evening'], errors='coerce').to_numpy(dtype=np.float64)
+    usable = np.flatnonzero((days != INVALID_DAY) & ~np.isnan(prices))
+    usable = usable[np.argsort(days[usable], kind='stable')]
+
+    events = []
+    for day, price in zip(days[usable].tolist(), prices[usable].tolist()):
+        state, event = update_state(state, day, price)
+        if event is not None:
+            events.append(event)
+    return state, pd.DataFrame(events, columns=EVENT_COLUMNS)
@@ -0,0 +1,94 @@
+"""Shared codec for the 'd-Mon-yy' dates printed on indgold.com (e.g. '1-Aug-21').
+
+Dates are decoded to integer days since 1970-01-01 (int32). Parsing
+factorizes the input first, so a column of millions of rows costs one
+dictionary lookup per *distinct* date string plus a NumPy gather.
+"""
+from datetime import date, datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+MONTHS = {'Jan': 1, 'Feb': 2, 'Mar': 3, 'Apr': 4, 'May': 5, 'Jun': 6,
+          'Jul': 7, 'Aug': 8, 'Sep': 9, 'Oct': 10, 'Nov': 11, 'Dec': 12}
+MONTH_ABBR = np.array(list(MONTHS))
+
+EPOCH = date(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+# Marks strings that are not a valid date (blank cells, the "today" row, typos)
+INVALID_DAY = np.iinfo(np.int32).min
+
+@lru_cache(maxsize=65536)
+def _parse_one(value):
+    try:
+        day, month, year = value.strip().split('-')
+        if len(year) == 2:
+            # Same pivot as strptime's %y: 69-99 -> 19yy, 00-68 -> 20yy
+            year = int(year) + (1900 if int(year) >= 69 else 2000)
+        return date(int(year), MONTHS[month.title()], int(day)).toordinal() - EPOCH_ORDINAL
+    except (AttributeError, KeyError, ValueError):
+        return INVALID_DAY
+
+def parse_dates(values, errors='raise'):
+    """Decode 'd-Mon-yy' strings to int32 epoch days.
+
+    With errors='coerce' unparseable values become INVALID_DAY; with
+    errors='raise' (the default, like pd.to_datetime) they raise ValueError.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, copy=False), use_na_sentinel=True)
+    lookup = np.fromiter((_parse_one(value) for value in uniques), dtype=np.int32, count=len(uniques))
+    # Append the sentinel so NaN/None (code -1) lands on it without a separate mask
+    days = np.append(lookup, np.int32(INVALID_DAY))[codes]
+
+    if errors == 'raise':
+        invalid = days == INVALID_DAY
+        if invalid.any():
+            bad = pd.Series(values, copy=False).iloc[np.flatnonzero(invalid)[:5]].tolist()
+            raise ValueError(f"{int(invalid.sum())} value(s) do not match the 'd-Mon-yy' format, e.g. {bad}")
+    return days
+
+def last_occurrences(days):
+    """Positions of the last row for each distinct day, in day order.
+
+    A day that appears twice is a re-scrape, so its later row is the one to keep.
+    """
+    days = np.asarray(days)
+    _, last_reversed = np.unique(days[::-1], return_index=True)
+    return len(days) - 1 - last_reversed
+
+def to_datetime64(days):
+    """Epoch days to a datetime64[ns] array; INVALID_DAY becomes NaT."""
+    days = np.asarray(days)
+    out = days.astype('datetime64[D]').astype('datetime64[ns]')
+    out[days == INVALID_DAY] = np.datetime64('NaT')
+    return out
+
+def to_datetime_index(values, errors='raise'):
+    """'d-Mon-yy' strings straight to a DatetimeIndex."""
+    return pd.DatetimeIndex(to_datetime64(parse_dates(values, errors=errors)))
+
+def epoch_day(value):
+    """Epoch day of a date/datetime/Timestamp (time of day is ignored)."""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() - EPOCH_ORDINAL
+
+def format_dates(days):
+    """Encode epoch days back to 'd-Mon-yy' strings, as the scraper stores them.
+
+    Like parse_dates, each distinct day is formatted once (multi-city frames repeat every day).
+    """
+    uniques, inverse = np.unique(np.asarray(days), return_inverse=True)
+    if uniques.size == 0:
+        return np.array([], dtype=str)
+    dates = pd.DatetimeIndex(to_datetime64(uniques))
+    day = dates.day.to_numpy().astype(str)
+    month = MONTH_ABBR[dates.month.to_numpy() - 1]
+    year = np.char.zfill((dates.year.to_numpy() % 100).astype(str), 2)
+    return np.char.add(np.char.add(np.char.add(np.char.add(day, '-'), month), '-'), year)[inverse.ravel()]
+
+def format_iso(day):
+    """Epoch day to 'YYYY-MM-DD'."""
+    return date.fromordinal(int(day) + EPOCH_ORDINAL).isoformat()
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pandas as pd
+
+from database.db_handler import GoldPriceDB
+from data_pipeline.anomaly import DetectorState, scan
+from data_pipeline.date_codec import INVALID_DAY, parse_dates
+from data_pipeline.scraper import GoldPriceScraper
+from data_pipeline.validation import COLUMNS, JUMP_WINDOW, ValidationResult, validate_batch
+
+# First month available on indgold.com for the city pages we scrape
+HISTORY_START_DATE = datetime(2021, 8, 1)
+
+def previous_day():
+    """Return midnight of yesterday, the last day with a complete price row."""
+    today = datetime.today()
+    return (today - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+def plan_update(db: GoldPriceDB, city: str, end_date: datetime) -> Optional[datetime]:
+    """Return the first date that still needs scraping for the city, or None if it is up to date."""
+    if not db.check_city_data(city):
+        return HISTORY_START_DATE
+
+    latest_date = datetime.strptime(db.get_latest_date(city), "%Y-%m-%d")
+    if latest_date < end_date:
+        return latest_date + timedelta(days=1)
+    return None
+
+def stored_context(db: GoldPriceDB, city: str, batch: pd.DataFrame):
+    """What validate_batch needs from storage: stored days within the batch's days, and the latest
+    JUMP_WINDOW stored days before them as jump-check anchors.
+
+    Both are narrow indexed reads, so the cost does not grow with the length of the history.
+    """
+    if 'Date' not in batch.columns:
+        return None, None  # validate_batch reports the schema error
+    days = parse_dates(batch['Date'], errors='coerce')
+    days = days[days != INVALID_DAY]
+    if days.size == 0:
+        return None, None
+    first, last = int(days.min()), int(days.max())
+    return db.get_stored_days(city, first, last), db.get_prices_before(city, first, JUMP_WINDOW)
+
+def ingest_range(db: GoldPriceDB, scraper: GoldPriceScraper, city: str,
+                 start_date: datetime, end_date: datetime) -> ValidationResult:
+    """Scrape the date range, validate it, and append the good rows to the city's table.
+
+    Rejected rows go to the city's quarantine table instead.
+    """
+    new_data = scraper.scrape_range(start_date, end_date)
+    if new_data.empty:
+        return ValidationResult(new_data.reindex(columns=COLUMNS), new_data.reindex(columns=COLUMNS + ['reason']))
+
+    existing_days, previous = stored_context(db, city, new_data)
+    result = validate_batch(new_data, existing_days, previous)
+    if not result.quarantined.empty:
+        db.quarantine_rows(city, result.quarantined)
+    if not result.valid.empty:
+        db.update_data(city, result.valid)
+        track_anomalies(db, city, result.valid)
+    return result
+
+def track_anomalies(db: GoldPriceDB, city: str, new_rows: pd.DataFrame) -> pd.DataFrame:
+    """Advance the city's anomaly detector over newly stored rows and persist any events.
+
+    Only the first run for a city reads the stored history, to warm the detector up.
+    """
+    state = db.get_anomaly_state(city)
+    if state is None:
+        state, events = scan(None, db.get_all_data(city))
+    else:
+        state, events = scan(DetectorState(**state), new_rows)
+    if state is not None:
+        db.save_anomalies(city, state.to_dict(), events)
+    return events
+
+def load_anomalies(db: GoldPriceDB, city: str) -> pd.DataFrame:
+    """The city's flagged events, warming the detector up first for data ingested before it existed."""
+    if db.get_anomaly_state(city) is None and db.check_city_data(city):
+        track_anomalies(db, city, None)
+    return db.get_anomalies(city)
+
+def ingest_city(city: str, db_path: str) -> dict:
+    """Bring the city's table up to date without any UI; used by the batch runner."""
+    db = GoldPriceDB(db_path)
+    try:
+        end_date = previous_day()
+        start_date = plan_update(db, city, end_date)
+        if start_date is None:
+            return {"start_date": None, "end_date": end_date.strftime("%Y-%m-%d"), "records": 0}
+
+        result = ingest_range(db, GoldPriceScraper(city), city, start_date, end_date)
+        return {
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d"),
+            "records": len(result.valid),
+            "validation": result.summary,
+            "anomalies": len(db.get_anomalies(city, start=start_date)),
+        }
+    finally:
+        db.close()
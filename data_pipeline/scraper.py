@@ -4,12 +4,15 @@ from selenium.webdriver.chrome.options import Options
 
 from bs4 import BeautifulSoup
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 
 from typing import Tuple, Optional
 
 import logging
 
+from data_pipeline.date_codec import INVALID_DAY, parse_dates, epoch_day
+from monitoring.metrics import timed
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO, # level=logging.INFO: This sets the minimum logging level. It means only log messages with severity INFO and above (WARNING, ERROR, CRITICAL) will be shown.
@@ -67,6 +70,7 @@ class GoldPriceScraper:
                  'july', 'august', 'september', 'october', 'november', 'december']
         return months.index(month) + 1
 
+    @timed("parse")
     def _scrape_table_data(self, html_content: str, period_type: str) -> pd.DataFrame:
         """Scrape table data based on the website format"""
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -100,6 +104,7 @@ class GoldPriceScraper:
         
         return df
 
+    @timed("fetch")
     def _fetch_page_content(self, url: str) -> Optional[str]:
         """Fetch HTML content using Selenium"""
         try:
@@ -133,6 +138,7 @@ class GoldPriceScraper:
             
         all_data = pd.DataFrame()
         current_date = start_date
+        first_day, last_day = epoch_day(start_date), epoch_day(end_date)
         
         while current_date <= end_date:
             month_name = current_date.strftime('%B').lower()
@@ -150,12 +156,10 @@ class GoldPriceScraper:
             #month_data['Date'] = pd.to_datetime(month_data['Date'])
             #month_data = month_data[(month_data['Date'] >= start_date) & (month_data['Date'] <= end_date)]
             
-            def is_within_range(date_str, start_date, end_date):
-            # Parse the 'd-Mon-yy' date string manually
-                date_obj = datetime.strptime(date_str, '%d-%b-%y')
-                return start_date <= date_obj <= end_date
-
-            month_data = month_data[month_data['Date'].apply(lambda x: is_within_range(x, start_date, end_date))]
+            # Filter data within the exact date range; unparseable rows (blank, "today") are kept so that
+            # validation quarantines them rather than losing them here
+            days = parse_dates(month_data['Date'], errors='coerce')
+            month_data = month_data[((days >= first_day) & (days <= last_day)) | (days == INVALID_DAY)]
 
             all_data = pd.concat([all_data, month_data], ignore_index=True)
             
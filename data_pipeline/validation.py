@@ -0,0 +1,171 @@
+"""Data-quality checks between the scraper and the database.
+
+validate_batch looks at a whole scraped batch at once:
+
+- schema: the Date/Morning/Evening columns must exist (else ValueError)
+- bad_date: the date is not 'd-Mon-yy' (blank cells, the "today" row)
+- bad_price: a price is blank, non-numeric or not positive, after thousands
+  separators and currency symbols are stripped
+- duplicate: the date repeats within the batch (the last row is kept) or is
+  already stored
+- jump: a price is more than MAX_DAILY_CHANGE away from the median of its
+  neighbours, i.e. an isolated spike rather than a real move. The latest
+  stored days count as trusted neighbours, so even a one-row daily batch is
+  checked; a genuine level shift passes once a batch holds more post-move
+  days than the window of stored ones (quarantined days are scraped again
+  on the next ingest, so within JUMP_WINDOW + 1 daily runs)
+
+Rows that fail are returned for quarantine with the first failing reason.
+Missing days are reported as gaps but do not reject anything. Every check is
+a few array operations on the batch, so backfills of years of history
+validate in milliseconds.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.date_codec import INVALID_DAY, last_occurrences, parse_dates, format_iso
+from monitoring.metrics import timed
+
+COLUMNS = ['Date', 'Morning', 'Evening']
+PRICE_COLUMNS = ['Morning', 'Evening']
+
+# Largest believable move against neighbouring days; real daily moves stay under ~5%
+MAX_DAILY_CHANGE = 0.10
+# Rows on each side that make up a price's neighbourhood for the jump check
+JUMP_WINDOW = 2
+
+@dataclass
+class ValidationResult:
+    # Rows that passed, with normalized price strings, ready for update_data
+    valid: pd.DataFrame
+    # Rejected rows as scraped, plus a 'reason' column
+    quarantined: pd.DataFrame
+    # (first missing day, last missing day) ISO date pairs
+    gaps: list = field(default_factory=list)
+
+    @property
+    def summary(self):
+        return {
+            "valid": int(len(self.valid)),
+            "quarantined": self.quarantined['reason'].value_counts().to_dict(),
+            "gaps": len(self.gaps),
+            "missing_days": int(sum((pd.Timestamp(end) - pd.Timestamp(start)).days + 1 for start, end in self.gaps)),
+        }
+
+def _clean_prices(values):
+    """Strip whitespace, thousands separators and currency symbols; unparseable values become NaN.
+
+    Like parse_dates, the work is done once per distinct string and gathered back.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, copy=False), use_na_sentinel=True)
+    text = pd.Series(uniques, dtype='string').str.replace(r'[,\s₹]|Rs\.?', '', regex=True)
+    parsed = pd.to_numeric(text, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.append(parsed, np.nan)[codes]
+
+def _row_nanmedian(values):
+    """Median of each row ignoring NaN (NaN for all-NaN rows); sorting pushes NaN to the end of each row."""
+    ordered = np.sort(values, axis=1)
+    counts = np.count_nonzero(~np.isnan(values), axis=1)
+    rows = np.arange(len(values))
+    low = ordered[rows, np.maximum(counts - 1, 0) // 2]
+    high = ordered[rows, counts // 2 - (counts == 0)]
+    return np.where(counts > 0, (low + high) / 2, np.nan)
+
+def _jumps(prices, anchors=None, window=JUMP_WINDOW, max_change=MAX_DAILY_CHANGE):
+    """Flag prices that are far from the median of their neighbours (prices sorted by day, NaN ignored).
+
+    `anchors` are the latest stored prices before the batch, oldest first:
+    neighbours of the first rows that are trusted, i.e. never judged or
+    dropped themselves.
+    """
+    anchors = np.asarray([] if anchors is None else anchors, dtype=np.float64)
+    context = np.concatenate([anchors, prices])
+
+    def deviates(reference_prices):
+        padded = np.pad(reference_prices, window, constant_values=np.nan)
+        neighbours = np.lib.stride_tricks.sliding_window_view(padded, 2 * window + 1)[len(anchors):].copy()
+        neighbours[:, window] = np.nan  # a row is not its own neighbour
+        # All-NaN neighbourhoods (isolated rows) give NaN references and are never flagged
+        with np.errstate(all='ignore'):
+            return np.abs(prices / _row_nanmedian(neighbours) - 1) > max_change
+
+    # A spike also makes its neighbours in the batch look off; a second pass without the
+    # first-pass suspects clears them, while the spike itself still deviates from clean neighbours
+    suspects = deviates(context)
+    return deviates(np.concatenate([anchors, np.where(suspects, np.nan, prices)]))
+
+@timed("validate")
+def validate_batch(batch, existing_days=None, previous=None):
+    """Split a scraped batch into rows to store and rows to quarantine.
+
+    `existing_days` holds the epoch days already stored for the city (those
+    within the batch's days are enough) and `previous` the latest stored
+    days before the batch as (epoch days, {column: prices}), oldest first
+    (see GoldPriceDB.get_prices_before). Both are optional context for the
+    duplicate, jump and gap checks.
+    """
+    missing = [col for col in COLUMNS if col not in batch.columns]
+    if missing:
+        raise ValueError(f"scraped batch is missing column(s) {missing}")
+
+    batch = batch[COLUMNS].reset_index(drop=True)
+    accepted = np.ones(len(batch), dtype=bool)
+    reason = np.full(len(batch), None, dtype=object)
+
+    def reject(mask, label):
+        newly = mask & accepted
+        reason[newly] = label
+        accepted[newly] = False
+
+    days = parse_dates(batch['Date'], errors='coerce').astype(np.int64)
+    reject(days == INVALID_DAY, 'bad_date')
+
+    prices = {col: _clean_prices(batch[col]) for col in PRICE_COLUMNS}
+    for values in prices.values():
+        reject(~(values > 0), 'bad_price')
+
+    # Later rows win within a batch, as they do in storage
+    superseded = np.ones(len(batch), dtype=bool)
+    superseded[last_occurrences(days)] = False
+    reject(superseded, 'duplicate')
+    stored_days = np.asarray(existing_days if existing_days is not None else [], dtype=np.int64)
+    if stored_days.size:
+        reject(np.isin(days, stored_days), 'duplicate')
+
+    candidates = np.flatnonzero(accepted)
+    order = candidates[np.argsort(days[candidates], kind='stable')]
+    previous_days, previous_prices = previous if previous is not None else (np.empty(0, dtype=np.int64), {})
+    for col, values in prices.items():
+        jumped = np.zeros(len(batch), dtype=bool)
+        jumped[order] = _jumps(values[order], previous_prices.get(col))
+        reject(jumped, 'jump')
+
+    # Stored in day order, since a later duplicate can win over an earlier position
+    kept = np.flatnonzero(accepted)
+    kept = kept[np.argsort(days[kept], kind='stable')]
+    valid = batch.iloc[kept].copy()
+    for col, values in prices.items():
+        values = values[kept]
+        # Store whole rupees without a trailing '.0', as the site prints them
+        valid[col] = np.where(values == np.round(values), values.astype(np.int64).astype(str), values.astype(str))
+
+    quarantined = batch.iloc[np.flatnonzero(~accepted)].copy()
+    quarantined['reason'] = reason[~accepted]
+
+    # Gaps inside the batch and between the stored history and the batch; stored days the batch
+    # re-scraped (rejected as duplicates) still count as present
+    kept_days = days[accepted]
+    if kept_days.size:
+        batch_days = days[days != INVALID_DAY]
+        stored_in_batch = stored_days[(stored_days >= batch_days.min()) & (stored_days <= batch_days.max())]
+        kept_days = np.concatenate([kept_days, stored_in_batch, np.asarray(previous_days[-1:], dtype=np.int64)])
+    return ValidationResult(valid, quarantined, find_gaps(kept_days))
+
+def find_gaps(days):
+    """Runs of missing days between the given epoch days, as (first, last) ISO date pairs."""
+    days = np.unique(np.asarray(days, dtype=np.int64))
+    steps = np.diff(days)
+    breaks = np.flatnonzero(steps > 1)
+    return [(format_iso(days[i] + 1), format_iso(days[i + 1] - 1)) for i in breaks]
@@ -1,67 +1,542 @@
+"""SQLite storage for daily gold prices of every city.
+
+All cities share long-format tables keyed by a small integer city id from
+the `cities` dictionary table:
+
+- prices:      (city_id, day) -> Morning, Evening
+- rollups:     (city_id, period, period_start) -> week/month/year aggregates
+- quarantine:  rows rejected by ingest validation
+- anomalies:   (city_id, day) -> flagged daily changes, plus anomaly_state
+
+`day` is the epoch day of data_pipeline.date_codec. The keyed tables are
+WITHOUT ROWID, so each city's rows are stored contiguously in key order and a
+city's history, or a day range of it, is one index range scan. City names
+only ever reach SQL as bound parameters.
+
+Databases written with the older one-table-per-city layout ({city}_prices
+etc.) are migrated when opened.
+"""
 import sqlite3
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from data_pipeline.date_codec import INVALID_DAY, epoch_day, last_occurrences, parse_dates, format_dates, format_iso, to_datetime64
+from monitoring.metrics import timed
+
+ROLLUP_PERIODS = ('week', 'month', 'year')
+ROLLUP_PRICE_COLUMNS = ('Morning', 'Evening')
+# Per price column; open/close carry the day they were seen on so partial aggregates can be merged
+ROLLUP_STATS = ('open', 'open_day', 'high', 'low', 'close', 'close_day', 'sum', 'count')
+ROLLUP_COLUMNS = ('period', 'period_start') + tuple(f'{col}_{stat}' for col in ROLLUP_PRICE_COLUMNS for stat in ROLLUP_STATS)
+
+LOCK_TIMEOUT_SECONDS = 60
+# Tables of the old one-table-per-city layout: {city}_prices etc.
+LEGACY_SUFFIXES = ('_prices', '_rollups', '_quarantine', '_anomalies')
+
+QUARANTINE_COLUMNS = ['Date', 'Morning', 'Evening', 'reason', 'quarantined_at']
+ANOMALY_STATE_COLUMNS = ('last_day', 'last_price', 'mean', 'var', 'n')
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS cities "
+    "(city_id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, version INTEGER NOT NULL DEFAULT 0);",
+    "CREATE TABLE IF NOT EXISTS prices "
+    "(city_id INTEGER NOT NULL, day INTEGER NOT NULL, Morning REAL, Evening REAL, "
+    "PRIMARY KEY (city_id, day)) WITHOUT ROWID;",
+    "CREATE TABLE IF NOT EXISTS rollups "
+    "(city_id INTEGER NOT NULL, period TEXT NOT NULL, period_start INTEGER NOT NULL, "
+    + ", ".join(f"{col}_{stat} REAL" for col in ROLLUP_PRICE_COLUMNS for stat in ROLLUP_STATS)
+    + ", PRIMARY KEY (city_id, period, period_start)) WITHOUT ROWID;",
+    "CREATE TABLE IF NOT EXISTS quarantine "
+    "(city_id INTEGER NOT NULL, Date TEXT, Morning TEXT, Evening TEXT, reason TEXT, quarantined_at TEXT);",
+    "CREATE INDEX IF NOT EXISTS quarantine_city ON quarantine (city_id);",
+    "CREATE TABLE IF NOT EXISTS anomalies "
+    "(city_id INTEGER NOT NULL, day INTEGER NOT NULL, Evening REAL, change REAL, zscore REAL, detected_at TEXT, "
+    "PRIMARY KEY (city_id, day)) WITHOUT ROWID;",
+    "CREATE TABLE IF NOT EXISTS anomaly_state "
+    "(city_id INTEGER PRIMARY KEY, last_day INTEGER, last_price REAL, mean REAL, var REAL, n INTEGER);",
+)
+
+def _parse_rows(data):
+    """Sorted epoch days and float Morning/Evening prices of a Date/Morning/Evening frame.
+
+    Unparseable dates are dropped; when a date repeats the later row wins.
+    """
+    days = parse_dates(data['Date'], errors='coerce').astype(np.int64)
+    valid = np.flatnonzero(days != INVALID_DAY)
+    keep = valid[last_occurrences(days[valid])]
+    prices = {col: pd.to_numeric(data[col], errors='coerce').to_numpy(dtype=np.float64)[keep]
+              for col in ROLLUP_PRICE_COLUMNS}
+    return days[keep], prices
+
+def _nullable(values):
+    """Plain Python values for sqlite3, with NaN as None (NULL)."""
+    values = np.array(values, dtype=object)
+    values[pd.isna(values)] = None
+    return values.tolist()
+
+def _iso_dates(days):
+    return np.datetime_as_string(np.asarray(days, dtype=np.int64).astype('datetime64[D]'))
+
+def _period_starts(days, period):
+    """Epoch day of the Monday / first of the month / 1 January on or before each epoch day."""
+    if period == 'week':
+        # 1970-01-05 (epoch day 4) was a Monday
+        return (days - 4) // 7 * 7 + 4
+    unit = 'M' if period == 'month' else 'Y'
+    return days.astype('datetime64[D]').astype(f'datetime64[{unit}]').astype('datetime64[D]').astype(np.int64)
+
+def _rollup_partials(days, prices):
+    """Aggregate daily prices (epoch days, {column: float array}) into per-period partial rollups.
+
+    Returns a dict of equal-length column arrays, in ROLLUP_COLUMNS order.
+    """
+    order = np.argsort(days, kind='stable')
+    days = days[order]
+    prices = {col: prices[col][order] for col in ROLLUP_PRICE_COLUMNS}
+
+    frames = []
+    for period in ROLLUP_PERIODS:
+        starts = _period_starts(days, period)
+        keys = np.unique(starts)
+        frame = {'period': np.full(len(keys), period, dtype=object), 'period_start': keys}
+        for col, values in prices.items():
+            priced = ~np.isnan(values)
+            col_starts, col_values, col_days = starts[priced], values[priced], days[priced]
+            # Rows are sorted by day, so each period is one contiguous run and reduceat works on runs
+            col_keys, first = np.unique(col_starts, return_index=True)
+            last = np.append(first[1:], len(col_values)) - 1
+            rows = np.searchsorted(keys, col_keys)
+
+            stats = {stat: np.full(len(keys), np.nan) for stat in ROLLUP_STATS}
+            stats['sum'][:] = 0
+            stats['count'][:] = 0
+            if len(col_values):
+                stats['open'][rows] = col_values[first]
+                stats['open_day'][rows] = col_days[first]
+                stats['high'][rows] = np.maximum.reduceat(col_values, first)
+                stats['low'][rows] = np.minimum.reduceat(col_values, first)
+                stats['close'][rows] = col_values[last]
+                stats['close_day'][rows] = col_days[last]
+                stats['sum'][rows] = np.add.reduceat(col_values, first)
+                stats['count'][rows] = last - first + 1
+            frame.update({f'{col}_{stat}': stats[stat] for stat in ROLLUP_STATS})
+        frames.append(frame)
+    return {column: np.concatenate([frame[column] for frame in frames]) for column in ROLLUP_COLUMNS}
+
+def _merge_rollup_rows(stored, new):
+    """Combine two rollup rows (dicts) of the same period: stored aggregates and freshly appended days."""
+    merged = dict(stored)
+    for col in ROLLUP_PRICE_COLUMNS:
+        stat = lambda name: f'{col}_{name}'
+        if not new[stat('count')]:
+            continue
+        if not stored[stat('count')]:
+            merged.update({stat(name): new[stat(name)] for name in ROLLUP_STATS})
+            continue
+        if new[stat('open_day')] < stored[stat('open_day')]:
+            merged[stat('open')], merged[stat('open_day')] = new[stat('open')], new[stat('open_day')]
+        if new[stat('close_day')] >= stored[stat('close_day')]:
+            merged[stat('close')], merged[stat('close_day')] = new[stat('close')], new[stat('close_day')]
+        merged[stat('high')] = max(stored[stat('high')], new[stat('high')])
+        merged[stat('low')] = min(stored[stat('low')], new[stat('low')])
+        merged[stat('sum')] = stored[stat('sum')] + new[stat('sum')]
+        merged[stat('count')] = stored[stat('count')] + new[stat('count')]
+    return merged
 
 class GoldPriceDB:
     def __init__(self, db_path):
-        self.conn = sqlite3.connect(db_path)
-        
+        # Writers from other processes (the batch runner's workers) can hold the lock for a migration or a backfill
+        self.conn = sqlite3.connect(db_path, timeout=LOCK_TIMEOUT_SECONDS)
+        # City ids never change once assigned, so lookups are cached for the connection's lifetime
+        self._city_ids = {}
+        with self.conn:
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+        self._migrate_legacy_tables()
+
+    def _city_id(self, city, create=False):
+        """The city's id, or None if it was never stored; `create` assigns a new one instead."""
+        name = city.lower()
+        city_id = self._city_ids.get(name)
+        if city_id is None:
+            if create:
+                # Another connection may register the same city first; the SELECT then finds its id
+                self.conn.execute("INSERT OR IGNORE INTO cities (name) VALUES (?);", (name,))
+            row = self.conn.execute("SELECT city_id FROM cities WHERE name = ?;", (name,)).fetchone()
+            if row is None:
+                return None
+            city_id = row[0]
+            self._city_ids[name] = city_id
+        return city_id
+
+    def _legacy_tables(self):
+        tables = [row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type='table';")]
+        legacy = [name for name in tables if name.endswith(LEGACY_SUFFIXES)]
+        # The detector state table was keyed by city name before city ids existed
+        if 'city' in [row[1] for row in self.conn.execute("PRAGMA table_info(anomaly_state);")]:
+            legacy.append('anomaly_state')
+        return legacy
+
+    def _migrate_legacy_tables(self):
+        """Copy data from the one-table-per-city layout into the shared tables, then drop the old tables.
+
+        Prices and quarantined rows are copied; rollups are rebuilt from the
+        copied prices. Anomaly events and detector state are derived data and
+        are recomputed by the next ingest or dashboard view. Stored rows whose
+        date cannot be parsed have no day to be keyed by and are quarantined
+        with reason 'bad_date'.
+
+        Several processes may open a legacy database at once (the batch
+        runner's workers), so the whole migration runs under one write lock
+        and the table list is re-read once the lock is held: the first
+        process migrates, the others find nothing left to do. Nothing is
+        dropped unless every legacy row is accounted for in the new tables.
+        """
+        if not self._legacy_tables():
+            return
+
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE;")
+            legacy = self._legacy_tables()
+            quarantined_at = datetime.now().isoformat(timespec='seconds')
+            for table in sorted(name for name in legacy if name.endswith('_prices')):
+                city = table[:-len('_prices')]
+                data = pd.read_sql(f'SELECT Date, Morning, Evening FROM "{table}";', self.conn)
+                days = parse_dates(data['Date'], errors='coerce')
+                bad = days == INVALID_DAY
+                if bad.any():
+                    self._insert_quarantine(city, data[bad].assign(reason='bad_date', quarantined_at=quarantined_at))
+                parsed = self._insert_prices({city: data[~bad]})
+                city_id = self._city_id(city)
+
+                expected_days = np.unique(days[~bad]).size
+                stored = self.conn.execute("SELECT COUNT(*) FROM prices WHERE city_id = ?;", (city_id,)).fetchone()[0]
+                if stored != expected_days:
+                    raise sqlite3.DatabaseError(
+                        f"migrating {table}: {stored} rows stored for {expected_days} distinct days; nothing was dropped"
+                    )
+                if city in parsed:
+                    self._replace_rollups(city_id, *self._stored_prices(city_id))
+            for table in legacy:
+                if table.endswith('_quarantine'):
+                    rows = pd.read_sql(f'SELECT {", ".join(QUARANTINE_COLUMNS)} FROM "{table}";', self.conn)
+                    self._insert_quarantine(table[:-len('_quarantine')], rows)
+            for table in legacy:
+                self.conn.execute(f'DROP TABLE "{table}";')
+            if 'anomaly_state' in legacy:
+                self.conn.execute(SCHEMA[-1])
+
+    def cities(self):
+        """Names (lower case) of the cities with stored prices."""
+        query = "SELECT name FROM cities WHERE EXISTS (SELECT 1 FROM prices WHERE prices.city_id = cities.city_id) ORDER BY name;"
+        return [row[0] for row in self.conn.execute(query)]
+
     def check_city_data(self, city):
-        query = f"SELECT name FROM sqlite_master WHERE type='table' AND name='{city.lower()}_prices';"
-        return pd.read_sql(query, self.conn).shape[0] > 0
-    
-    #def get_latest_date(self, city):
-    #    return pd.read_sql(f"SELECT MAX(date) FROM {city.lower()}_prices;", self.conn).iloc[0,0]
-    
+        city_id = self._city_id(city)
+        if city_id is None:
+            return False
+        return self.conn.execute("SELECT 1 FROM prices WHERE city_id = ? LIMIT 1;", (city_id,)).fetchone() is not None
+
+    @timed("db_read")
     def get_latest_date(self, city):
-        try:
-            query = f"""
-            SELECT Date
-            FROM {city.lower()}_prices
-            WHERE Date IS NOT NULL;
-            """            
-            result = pd.read_sql(query, self.conn)
-
-            if not result.empty:
-                # Function to convert the date string into 'YYYY-MM-DD' format
-                def convert_date(date_str):
-                    day, month_str, year = date_str.split('-')
-                    
-                    months = {
-                        'Jan': '01', 'Feb': '02', 'Mar': '03', 'Apr': '04',
-                        'May': '05', 'Jun': '06', 'Jul': '07', 'Aug': '08',
-                        'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dec': '12'
-                    }
-                    
-                    month = months.get(month_str, '00')  # Default to '00' if month is invalid
-                    
-                    # Handle single digit day (e.g., '1' should become '01')
-                    day = day.zfill(2) # zero fill for length 2
-                    
-                    # Ensure the year is in four digits (e.g., '22' -> '2022')
-                    year = '20' + year
-                    
-                    return f"{year}-{month}-{day}"
-                
-                formatted_dates = [convert_date(date) for date in result['Date']]
-
-                max_date = max(formatted_dates, key=lambda d: datetime.strptime(d, "%Y-%m-%d"))
-
-                return max_date
-
-            else:
-                print("No valid dates found.")
-                return None 
-            
-        except Exception as e:
-            print(f"Error fetching latest date: {str(e)}")
-            return None
-        
+        latest = self.conn.execute("SELECT MAX(day) FROM prices WHERE city_id = ?;", (self._city_id(city),)).fetchone()[0]
+        return None if latest is None else format_iso(latest)
+
+    def data_version(self, city):
+        """Counter bumped on every write to the city's prices; a cheap change check for caches."""
+        row = self.conn.execute("SELECT version FROM cities WHERE city_id = ?;", (self._city_id(city),)).fetchone()
+        return 0 if row is None else row[0]
+
+    def data_versions(self):
+        """{city: data version} for every city with stored prices, from one query."""
+        query = ("SELECT name, version FROM cities "
+                 "WHERE EXISTS (SELECT 1 FROM prices WHERE prices.city_id = cities.city_id);")
+        return dict(self.conn.execute(query).fetchall())
+
     def update_data(self, city, new_df):
-        new_df.to_sql(f"{city.lower()}_prices", self.conn, if_exists='append', index=False)
-        
+        self.update_cities({city: new_df})
+
+    @timed("db_write")
+    def update_cities(self, frames):
+        """Store new daily rows for several cities at once; `frames` maps city -> Date/Morning/Evening frame.
+
+        A day that is already stored is replaced, as a re-scrape would mean.
+        Rows whose date cannot be parsed are skipped (ingest validation
+        quarantines them before they get here). Rollups are merged with the
+        new days, or rebuilt for cities where stored days were replaced.
+        """
+        with self.conn:
+            partials = self._insert_prices(frames)
+            for city, (city_id, days, prices, replaced) in partials.items():
+                if replaced or not self._has_rollups(city_id):
+                    self._replace_rollups(city_id, *self._stored_prices(city_id))
+                else:
+                    self._merge_rollups(city_id, _rollup_partials(days, prices))
+
+    def _insert_prices(self, frames):
+        """Write every city's rows with one INSERT; returns {city: (city_id, days, prices, replaced_existing)}."""
+        parsed = {}
+        rows = []
+        for city, data in frames.items():
+            city_id = self._city_id(city, create=True)
+            days, prices = _parse_rows(data)
+            if days.size == 0:
+                continue
+            replaced = bool(np.isin(days, self._stored_days(city_id, days[0], days[-1])).any())
+            parsed[city] = (city_id, days, prices, replaced)
+            rows.append(zip([city_id] * len(days), days.tolist(),
+                            _nullable(prices['Morning']), _nullable(prices['Evening'])))
+        if not parsed:
+            return parsed
+
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO prices (city_id, day, Morning, Evening) VALUES (?, ?, ?, ?);",
+            (row for city_rows in rows for row in city_rows),
+        )
+        ids = [city_id for city_id, *_ in parsed.values()]
+        self.conn.execute(
+            f"UPDATE cities SET version = version + 1 WHERE city_id IN ({', '.join('?' * len(ids))});", ids
+        )
+        return parsed
+
+    def _stored_days(self, city_id, first, last):
+        cursor = self.conn.execute(
+            "SELECT day FROM prices WHERE city_id = ? AND day BETWEEN ? AND ?;", (city_id, int(first), int(last))
+        )
+        return np.array(cursor.fetchall(), dtype=np.int64).ravel()
+
+    def _stored_prices(self, city_id):
+        """All of a city's (days, {column: prices}), in day order."""
+        cursor = self.conn.execute("SELECT day, Morning, Evening FROM prices WHERE city_id = ? ORDER BY day;", (city_id,))
+        # NULL prices come back as None and become NaN
+        values = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)
+        return values[:, 0].astype(np.int64), {'Morning': values[:, 1], 'Evening': values[:, 2]}
+
+    def _has_rollups(self, city_id):
+        return self.conn.execute("SELECT 1 FROM rollups WHERE city_id = ? LIMIT 1;", (city_id,)).fetchone() is not None
+
+    def _write_rollups(self, city_id, columns):
+        # tolist() hands sqlite3 plain Python ints/floats; NaN is stored as NULL
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO rollups (city_id, {', '.join(ROLLUP_COLUMNS)}) "
+            f"VALUES (?, {', '.join('?' * len(ROLLUP_COLUMNS))});",
+            zip([city_id] * len(columns['period']), *(np.asarray(columns[column]).tolist() for column in ROLLUP_COLUMNS)),
+        )
+
+    def _merge_rollups(self, city_id, partials):
+        """Fold the new days' partial aggregates into the stored rows of the periods they touch.
+
+        Only the touched rows are read and rewritten, so a daily append costs a
+        few row lookups whatever the length of the history.
+        """
+        if len(partials['period']) == 0:
+            return
+        new_rows = {}
+        for values in zip(*(partials[column].tolist() for column in ROLLUP_COLUMNS)):
+            row = dict(zip(ROLLUP_COLUMNS, values))
+            new_rows[row['period'], row['period_start']] = row
+
+        merged = []
+        for period in ROLLUP_PERIODS:
+            starts = [start for key_period, start in new_rows if key_period == period]
+            cursor = self.conn.execute(
+                f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM rollups "
+                f"WHERE city_id = ? AND period = ? AND period_start IN ({', '.join('?' * len(starts))});",
+                [city_id, period, *starts],
+            )
+            for values in cursor.fetchall():
+                stored = dict(zip(ROLLUP_COLUMNS, values))
+                key = (stored['period'], stored['period_start'])
+                merged.append(_merge_rollup_rows(stored, new_rows.pop(key)))
+        merged.extend(new_rows.values())
+        self._write_rollups(city_id, {column: [row[column] for row in merged] for column in ROLLUP_COLUMNS})
+
+    @timed("db_write")
+    def refresh_rollups(self, city):
+        """Rebuild the city's week/month/year rollups from all of its daily rows."""
+        city_id = self._city_id(city)
+        if city_id is None:
+            return
+        with self.conn:
+            self._replace_rollups(city_id, *self._stored_prices(city_id))
+
+    def _replace_rollups(self, city_id, days, prices):
+        self.conn.execute("DELETE FROM rollups WHERE city_id = ?;", (city_id,))
+        self._write_rollups(city_id, _rollup_partials(days, prices))
+
+    @timed("db_read")
+    def get_rollups(self, city, period='month', start=None, end=None):
+        """Per-period OHLC, mean, min, max and count of the Morning and Evening prices.
+
+        `period` is 'week', 'month' or 'year'; `start`/`end` (dates, inclusive)
+        bound the period start dates.
+        """
+        if period not in ROLLUP_PERIODS:
+            raise ValueError(f"period must be one of {ROLLUP_PERIODS}, got {period!r}")
+        city_id = self._city_id(city)
+
+        numeric = ROLLUP_COLUMNS[1:]
+        query = f"SELECT {', '.join(numeric)} FROM rollups WHERE city_id = ? AND period = ?"
+        params = [city_id, period]
+        if start is not None:
+            query += " AND period_start >= ?"
+            params.append(epoch_day(pd.Timestamp(start)))
+        if end is not None:
+            query += " AND period_start <= ?"
+            params.append(epoch_day(pd.Timestamp(end)))
+        # NULLs (a price column with no data in the period) become NaN
+        values = np.array(self.conn.execute(query + " ORDER BY period_start;", params).fetchall(),
+                          dtype=np.float64).reshape(-1, len(numeric))
+        stored = dict(zip(numeric, values.T))
+
+        rollups = {}
+        for col in ROLLUP_PRICE_COLUMNS:
+            count = stored[f'{col}_count']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = stored[f'{col}_sum'] / count
+            rollups.update({
+                f'{col}_open': stored[f'{col}_open'],
+                f'{col}_high': stored[f'{col}_high'],
+                f'{col}_low': stored[f'{col}_low'],
+                f'{col}_close': stored[f'{col}_close'],
+                f'{col}_mean': np.where(count > 0, mean, np.nan),
+                f'{col}_min': stored[f'{col}_low'],
+                f'{col}_max': stored[f'{col}_high'],
+                f'{col}_count': count.astype(np.int64),
+            })
+        index = pd.DatetimeIndex(to_datetime64(stored['period_start'].astype(np.int64)), name='Period')
+        rollups = pd.DataFrame(rollups, index=index)
+        return rollups
+
+    @timed("db_write")
+    def quarantine_rows(self, city, rows):
+        """Keep rows rejected by validation (Date, Morning, Evening, reason) in the quarantine table."""
+        with self.conn:
+            self._insert_quarantine(city, rows.assign(quarantined_at=datetime.now().isoformat(timespec='seconds')))
+
+    def _insert_quarantine(self, city, rows):
+        city_id = self._city_id(city, create=True)
+        # Rejected values are kept as scraped, as text
+        columns = [[None if pd.isna(value) else str(value) for value in rows[column]] for column in QUARANTINE_COLUMNS]
+        self.conn.executemany(
+            f"INSERT INTO quarantine (city_id, {', '.join(QUARANTINE_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?);",
+            zip([city_id] * len(rows), *columns),
+        )
+
+    @timed("db_read")
+    def get_quarantine(self, city):
+        return pd.read_sql(
+            f"SELECT {', '.join(QUARANTINE_COLUMNS)} FROM quarantine WHERE city_id = ? ORDER BY rowid;",
+            self.conn, params=(self._city_id(city),),
+        )
+
+    @timed("db_read")
+    def get_anomaly_state(self, city):
+        """The city's stored detector state as a dict (see data_pipeline.anomaly.DetectorState), or None."""
+        row = self.conn.execute(
+            f"SELECT {', '.join(ANOMALY_STATE_COLUMNS)} FROM anomaly_state WHERE city_id = ?;", (self._city_id(city),)
+        ).fetchone()
+        return None if row is None else dict(zip(ANOMALY_STATE_COLUMNS, row))
+
+    @timed("db_write")
+    def save_anomalies(self, city, state, events):
+        """Store the detector state and any new events (Date, Evening, change, zscore) in one transaction."""
+        detected_at = datetime.now().isoformat(timespec='seconds')
+        with self.conn:
+            city_id = self._city_id(city, create=True)
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO anomaly_state (city_id, {', '.join(ANOMALY_STATE_COLUMNS)}) "
+                "VALUES (?, ?, ?, ?, ?, ?);",
+                (city_id, *(state[column] for column in ANOMALY_STATE_COLUMNS)),
+            )
+            days = [epoch_day(pd.Timestamp(value)) for value in events['Date']]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO anomalies (city_id, day, Evening, change, zscore, detected_at) "
+                "VALUES (?, ?, ?, ?, ?, ?);",
+                [(city_id, day, *row, detected_at)
+                 for day, row in zip(days, events[['Evening', 'change', 'zscore']].itertuples(index=False))],
+            )
+
+    @timed("db_read")
+    def get_anomalies(self, city, start=None):
+        """Flagged price changes, oldest first; `start` (a date) keeps events on or after it."""
+        query = "SELECT day, Evening, change, zscore, detected_at FROM anomalies WHERE city_id = ?"
+        params = [self._city_id(city)]
+        if start is not None:
+            query += " AND day >= ?"
+            params.append(epoch_day(pd.Timestamp(start)))
+        events = pd.read_sql(query + " ORDER BY day;", self.conn, params=params)
+        events.insert(0, 'Date', _iso_dates(events.pop('day')))
+        return events
+
+    @timed("db_read")
+    def count_rows(self, city):
+        return self.conn.execute("SELECT COUNT(*) FROM prices WHERE city_id = ?;", (self._city_id(city),)).fetchone()[0]
+
+    @timed("db_read")
+    def get_stored_days(self, city, first, last):
+        """Epoch days stored for the city from `first` to `last` (epoch days, inclusive)."""
+        return self._stored_days(self._city_id(city), first, last)
+
+    @timed("db_read")
+    def get_prices_before(self, city, day, limit):
+        """The city's last `limit` stored days before epoch day `day`, oldest first, as (days, {column: prices})."""
+        cursor = self.conn.execute(
+            "SELECT day, Morning, Evening FROM prices WHERE city_id = ? AND day < ? ORDER BY day DESC LIMIT ?;",
+            (self._city_id(city), int(day), int(limit)),
+        )
+        values = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 3)[::-1]
+        return values[:, 0].astype(np.int64), {'Morning': values[:, 1], 'Evening': values[:, 2]}
+
+    @timed("db_read")
     def get_all_data(self, city):
-        return pd.read_sql(f"SELECT * FROM {city.lower()}_prices ORDER BY date;", self.conn)
-    
+        """The city's daily rows in date order: 'd-Mon-yy' Date strings and float Morning/Evening prices."""
+        days, prices = self._stored_prices(self._city_id(city))
+        return pd.DataFrame({'Date': format_dates(days), **prices})
+
+    @timed("db_read")
+    def get_price_arrays(self, cities):
+        """{city (lower case): (sorted epoch days, {'Morning', 'Evening': float prices})} from one query.
+
+        The array form of get_cities_data, for callers that work on epoch days anyway.
+        """
+        ids = {self._city_id(city): city.lower() for city in cities}
+        ids.pop(None, None)
+        empty = (np.empty(0, dtype=np.int64), {col: np.empty(0) for col in ROLLUP_PRICE_COLUMNS})
+        arrays = {city.lower(): empty for city in cities}
+        if not ids:
+            return arrays
+
+        cursor = self.conn.execute(
+            f"SELECT city_id, day, Morning, Evening FROM prices WHERE city_id IN ({', '.join('?' * len(ids))}) "
+            "ORDER BY city_id, day;", list(ids),
+        )
+        # NULL prices come back as None and become NaN
+        values = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 4)
+        city_ids, first = np.unique(values[:, 0].astype(np.int64), return_index=True)
+        for city_id, rows in zip(city_ids.tolist(), np.split(values, first[1:])):
+            arrays[ids[city_id]] = (rows[:, 1].astype(np.int64), {'Morning': rows[:, 2], 'Evening': rows[:, 3]})
+        return arrays
+
+    @timed("db_read")
+    def get_cities_data(self, cities=None):
+        """Daily rows of several cities (all by default) from one statement, as a long City/Date/Morning/Evening frame."""
+        names = dict(self.conn.execute("SELECT city_id, name FROM cities;").fetchall())
+        query = "SELECT city_id, day, Morning, Evening FROM prices"
+        params = []
+        if cities is not None:
+            params = [self._city_id(city) for city in cities]
+            query += f" WHERE city_id IN ({', '.join('?' * len(params))})"
+        # NULL prices come back as None and become NaN
+        values = np.array(self.conn.execute(query + " ORDER BY city_id, day;", params).fetchall(),
+                          dtype=np.float64).reshape(-1, 4)
+        city_ids, inverse = np.unique(values[:, 0].astype(np.int64), return_inverse=True)
+        return pd.DataFrame({
+            'City': np.array([names[city_id] for city_id in city_ids.tolist()], dtype=object)[inverse.ravel()],
+            'Date': format_dates(values[:, 1].astype(np.int64)),
+            'Morning': values[:, 2],
+            'Evening': values[:, 3],
+        })
+
     def close(self):
         self.conn.close()
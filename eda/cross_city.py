@@ -0,0 +1,210 @@
+"""Cross-city analytics: how cities' gold prices move together and which is cheapest.
+
+Every city's Evening series (a CompactSeries from the SeriesStore) is placed
+on one shared daily grid, giving an (n_cities, n_days) float64 matrix with
+NaN for missing days. All statistics are whole-matrix operations:
+
+- correlation_matrix: pairwise Pearson correlation over the days both cities
+  have, as a few masked matrix products instead of a loop over pairs
+- rolling_spread: each city's price minus the national (cross-city) median,
+  averaged over a trailing window with cumulative sums
+- lead_lag: cross-correlation of each city's daily changes with the national
+  median's at lags of up to +/- max_lag days, through one batched FFT
+
+CROSS_CITY_CACHE keeps the last reports keyed by the cities' data versions,
+so repeated views recompute nothing until new prices are stored.
+"""
+import threading
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.date_codec import to_datetime64
+from eda.series_store import SERIES_STORE
+from monitoring.metrics import timed
+
+SPREAD_WINDOW = 30
+MAX_LAG = 30
+# Fewest shared days for a correlation to be reported
+MIN_OVERLAP = 30
+
+@dataclass(frozen=True)
+class PriceMatrix:
+    cities: tuple
+    start_day: int
+    # (n_cities, n_days) prices; day j is start_day + j epoch days, NaN where a city has no price
+    values: np.ndarray
+
+    def index(self):
+        return pd.DatetimeIndex(to_datetime64(self.start_day + np.arange(self.values.shape[1])), name='Date')
+
+def align_series(series_list, column='Evening'):
+    """Place CompactSeries of several cities on one daily grid spanning all of them."""
+    series_list = [series for series in series_list if len(series)]
+    if not series_list:
+        return PriceMatrix((), 0, np.empty((0, 0)))
+    start_day = min(series.start_day for series in series_list)
+    end_day = max(series.start_day + len(series) for series in series_list)
+
+    values = np.full((len(series_list), end_day - start_day), np.nan)
+    for row, series in enumerate(series_list):
+        offset = series.start_day - start_day
+        values[row, offset:offset + len(series)] = series.values(column)
+    return PriceMatrix(tuple(series.city for series in series_list), start_day, values)
+
+def differenced(values):
+    """Day-to-day change along the last axis; NaN on the first day and next to missing days."""
+    out = np.full_like(values, np.nan)
+    np.subtract(values[..., 1:], values[..., :-1], out=out[..., 1:])
+    return out
+
+def national_median(values):
+    """Cross-city median price for each day, ignoring cities without a price (NaN if none has one)."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN days
+        return np.nanmedian(values, axis=0)
+
+def correlation_matrix(values, min_overlap=MIN_OVERLAP):
+    """Pairwise Pearson correlation between rows over the columns both have (NaN below min_overlap).
+
+    With a 0/1 mask M of observed values and X zero-filled, every per-pair
+    sum is a matrix product (counts = M M', sums = X M', cross sums = X X'),
+    so all pairs cost four BLAS calls.
+    """
+    observed = ~np.isnan(values)
+    mask = observed.astype(np.float64)
+    filled = np.where(observed, values, 0.0)
+
+    counts = mask @ mask.T
+    sums = filled @ mask.T                  # [i, j]: sum of row i over the days shared with row j
+    squares = (filled ** 2) @ mask.T
+    cross = filled @ filled.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = cross - sums * sums.T / counts
+        variance = squares - sums ** 2 / counts
+        correlation = covariance / np.sqrt(variance * variance.T)
+    correlation[counts < min_overlap] = np.nan
+    return np.clip(correlation, -1.0, 1.0)
+
+def rolling_spread(values, reference, window=SPREAD_WINDOW):
+    """Trailing `window`-day mean of (row - reference), over the days each row has a price."""
+    spread = values - reference
+    observed = ~np.isnan(spread)
+    # Cumulative sums with a leading zero column; a window's total is the difference of two of them
+    totals = np.concatenate([np.zeros((len(values), 1)), np.cumsum(np.where(observed, spread, 0.0), axis=1)], axis=1)
+    counts = np.concatenate([np.zeros((len(values), 1)), np.cumsum(observed, axis=1)], axis=1)
+    end = np.arange(1, values.shape[1] + 1)
+    start = np.maximum(end - window, 0)
+    window_counts = counts[:, end] - counts[:, start]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(window_counts > 0, (totals[:, end] - totals[:, start]) / window_counts, np.nan)
+
+def lead_lag(changes, reference, max_lag=MAX_LAG, min_overlap=MIN_OVERLAP):
+    """Correlation of each row with `reference` shifted by -max_lag..max_lag days; returns (correlations, lags).
+
+    Column k holds corr(row_t, reference_{t+lag_k}): a peak at a positive lag
+    means the row moves that many days before the reference. Both sides are
+    standardized and zero-filled, the lagged products of all rows come from
+    one rfft/irfft pair, and each lag is divided by its own overlap count
+    (the same FFT over the missing-value masks).
+    """
+    def standardized(x):
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # rows without data
+            mean = np.nanmean(x, axis=-1, keepdims=True)
+            std = np.nanstd(x, axis=-1, keepdims=True)
+        observed = ~np.isnan(x)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(observed & (std > 0), (x - mean) / std, 0.0), observed.astype(np.float64)
+
+    x, x_mask = standardized(changes)
+    r, r_mask = standardized(np.asarray(reference, dtype=np.float64)[None, :])
+    n_days = changes.shape[1]
+    # Zero padding to at least n_days + max_lag keeps the circular correlation from wrapping
+    size = 1 << int(np.ceil(np.log2(max(n_days + max_lag, 2))))
+
+    def lagged_sums(a, b):
+        return np.fft.irfft(np.conj(np.fft.rfft(a, n=size, axis=1)) * np.fft.rfft(b, n=size, axis=1), n=size, axis=1)
+
+    lags = np.arange(-max_lag, max_lag + 1)
+    columns = lags % size
+    products = lagged_sums(x, r)[:, columns]
+    overlap = np.rint(lagged_sums(x_mask, r_mask)[:, columns])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlations = np.where(overlap >= min_overlap, products / overlap, np.nan)
+    return np.clip(correlations, -1.0, 1.0), lags
+
+@dataclass(frozen=True)
+class CrossCityReport:
+    # Pairwise correlation of daily Evening changes, cities x cities
+    correlation: pd.DataFrame
+    # Trailing mean of price minus the national median, days x cities
+    spread: pd.DataFrame
+    # Correlation with the national median's changes, cities x lags (days)
+    lead_lag: pd.DataFrame
+    # Per city: the lag with the highest correlation (positive = moves first) and that correlation
+    best_lag: pd.DataFrame
+    # Latest rolling spread per city, cheapest first
+    latest_spread: pd.Series
+
+@timed("analyze")
+def analyze_cities(series_list, window=SPREAD_WINDOW, max_lag=MAX_LAG):
+    """All cross-city statistics of the given CompactSeries, from one aligned Evening price matrix."""
+    matrix = align_series(series_list, 'Evening')
+    cities = list(matrix.cities)
+    median = national_median(matrix.values)
+    changes = differenced(matrix.values)
+
+    spread = pd.DataFrame(rolling_spread(matrix.values, median, window).T, index=matrix.index(), columns=cities)
+    correlations, lags = lead_lag(changes, differenced(median), max_lag)
+    lead_lag_frame = pd.DataFrame(correlations, index=cities, columns=pd.Index(lags, name='Lag (days)'))
+
+    best = np.full(len(cities), np.nan)
+    best_correlation = np.full(len(cities), np.nan)
+    has_data = ~np.isnan(correlations).all(axis=1)
+    if has_data.any():
+        positions = np.nanargmax(correlations[has_data], axis=1)
+        best[has_data] = lags[positions]
+        best_correlation[has_data] = correlations[has_data][np.arange(has_data.sum()), positions]
+
+    # Each city's most recent spread, even if its last price is older than the grid's last day
+    last_observed = spread.ffill().iloc[-1] if len(spread) else pd.Series(dtype=np.float64)
+    return CrossCityReport(
+        correlation=pd.DataFrame(correlation_matrix(changes), index=cities, columns=cities),
+        spread=spread,
+        lead_lag=lead_lag_frame,
+        best_lag=pd.DataFrame({'Lag (days)': best, 'Correlation': best_correlation}, index=cities),
+        latest_spread=last_observed.sort_values().rename('Spread vs national median'),
+    )
+
+class CrossCityCache:
+    """Reports by (cities, parameters), recomputed only when a city's data version changes."""
+
+    def __init__(self, max_entries=8):
+        self._reports = {}
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def get(self, db, cities=None, window=SPREAD_WINDOW, max_lag=MAX_LAG):
+        versions = db.data_versions()
+        cities = sorted(versions) if cities is None else [city.lower() for city in cities]
+        key = (tuple((city, versions.get(city, 0)) for city in cities), window, max_lag)
+        with self._lock:
+            report = self._reports.get(key)
+        if report is not None:
+            return report
+
+        report = analyze_cities(SERIES_STORE.get_many(db, cities), window, max_lag)
+        with self._lock:
+            if len(self._reports) >= self._max_entries:
+                self._reports.pop(next(iter(self._reports)))
+            self._reports[key] = report
+        return report
+
+    def invalidate(self):
+        with self._lock:
+            self._reports.clear()
+
+CROSS_CITY_CACHE = CrossCityCache()
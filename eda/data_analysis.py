@@ -1,9 +1,12 @@
 import pandas as pd
+from data_pipeline.date_codec import to_datetime_index
+from monitoring.metrics import timed
 
+@timed("preprocess")
 def preprocess_data(data):
     """Preprocess the data for EDA."""
     df = data.copy()
-    df['Date'] = pd.to_datetime(df['Date'], format='%d-%b-%y')
+    df['Date'] = to_datetime_index(df['Date'])
     df.set_index('Date', inplace=True)
 
     # Convert Morning and Evening columns to numeric
@@ -0,0 +1,155 @@
+"""Compact, read-only in-memory price series shared by the EDA and model code.
+
+A city's history is held as two int32 arrays (Morning, Evening) on an
+implicit daily grid: day i is `start_day + i` epoch days. Missing days and
+unparseable prices hold the MISSING sentinel. That is 8 bytes per day, against
+roughly 32 for the float64 frame with a DatetimeIndex and a differenced
+column. Differencing is computed when asked for, and pandas objects are only
+built at the boundary (`to_frame`, `differenced_series`).
+"""
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.date_codec import last_occurrences, parse_dates, to_datetime64
+
+PRICE_COLUMNS = ('Morning', 'Evening')
+MISSING = np.iinfo(np.int32).min
+
+def _readonly(array):
+    array.flags.writeable = False
+    return array
+
+@dataclass(frozen=True)
+class CompactSeries:
+    city: str
+    start_day: int
+    morning: np.ndarray
+    evening: np.ndarray
+
+    @classmethod
+    def from_raw(cls, city, data):
+        """Build from the DB/scraper frame (string 'Date', 'Morning', 'Evening' columns).
+
+        Later rows win when a date appears twice, matching what a re-scrape would mean.
+        """
+        days = parse_dates(data['Date'])
+        keep = last_occurrences(days)
+        prices = {col: pd.to_numeric(data[col], errors='coerce').to_numpy(dtype=np.float64)[keep] for col in PRICE_COLUMNS}
+        return cls.from_days(city, days[keep], prices)
+
+    @classmethod
+    def from_days(cls, city, days, prices):
+        """Build from distinct epoch days and {column: float prices} (NaN for missing), e.g. straight from the DB."""
+        if len(days) == 0:
+            empty = _readonly(np.empty(0, dtype=np.int32))
+            return cls(city, 0, empty, empty)
+
+        start_day = int(days.min())
+        offsets = days - start_day
+        length = int(offsets.max()) + 1
+
+        columns = {}
+        for col in PRICE_COLUMNS:
+            values = np.asarray(prices[col], dtype=np.float64)
+            packed = np.full(length, MISSING, dtype=np.int32)
+            valid = ~np.isnan(values)
+            packed[offsets[valid]] = np.rint(values[valid]).astype(np.int32)
+            columns[col.lower()] = _readonly(packed)
+        return cls(city, start_day, columns['morning'], columns['evening'])
+
+    def __len__(self):
+        return len(self.evening)
+
+    @property
+    def nbytes(self):
+        return self.morning.nbytes + self.evening.nbytes
+
+    def _column(self, column):
+        return self.morning if column == 'Morning' else self.evening
+
+    def missing(self, column):
+        return self._column(column) == MISSING
+
+    def values(self, column):
+        """float64 prices with NaN for missing days (a new array; the store stays untouched)."""
+        packed = self._column(column)
+        values = packed.astype(np.float64)
+        values[packed == MISSING] = np.nan
+        return values
+
+    def differenced(self, column):
+        """First difference y_t - y_{t-1}; NaN at the start and next to missing days, like Series.diff()."""
+        values = self.values(column)
+        out = np.empty_like(values)
+        out[:1] = np.nan
+        np.subtract(values[1:], values[:-1], out=out[1:])
+        return out
+
+    def index(self):
+        return pd.DatetimeIndex(to_datetime64(self.start_day + np.arange(len(self), dtype=np.int32)),
+                                name='Date', freq='D')
+
+    def to_frame(self, columns=PRICE_COLUMNS, differenced=()):
+        """pandas view for plotting/modelling: the same shape preprocess_data (+ difference_data) produces."""
+        data = {col: self.values(col) for col in columns}
+        for col in differenced:
+            data[f'{col}_Differenced_1'] = self.differenced(col)
+        return pd.DataFrame(data, index=self.index())
+
+    def differenced_series(self, column='Evening'):
+        """The differenced column with missing values dropped, as the models consume it."""
+        series = pd.Series(self.differenced(column), index=self.index(), name=f'{column}_Differenced_1')
+        return series.dropna()
+
+class SeriesStore:
+    """Process-wide cache of CompactSeries, reloaded when the city's data version changes."""
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def get(self, db, city):
+        version = db.data_version(city)
+        with self._lock:
+            cached = self._series.get(city.lower())
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        days, prices = db.get_price_arrays([city])[city.lower()]
+        series = CompactSeries.from_days(city, days, prices)
+        with self._lock:
+            self._series[city.lower()] = (version, series)
+        return series
+
+    def get_many(self, db, cities):
+        """Series of several cities; the ones not cached at their current version are loaded with one query."""
+        versions = db.data_versions()
+        with self._lock:
+            cached = {city: self._series.get(city.lower()) for city in cities}
+        stale = [city for city, entry in cached.items() if entry is None or entry[0] != versions.get(city.lower(), 0)]
+
+        if stale:
+            arrays = db.get_price_arrays(stale)
+            with self._lock:
+                for city in stale:
+                    series = CompactSeries.from_days(city, *arrays[city.lower()])
+                    cached[city] = (versions.get(city.lower(), 0), series)
+                    self._series[city.lower()] = cached[city]
+        return [cached[city][1] for city in cities]
+
+    def invalidate(self, city=None):
+        with self._lock:
+            if city is None:
+                self._series.clear()
+            else:
+                self._series.pop(city.lower(), None)
+
+    @property
+    def nbytes(self):
+        with self._lock:
+            return sum(series.nbytes for _, series in self._series.values())
+
+SERIES_STORE = SeriesStore()
@@ -2,14 +2,22 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import streamlit as st
 from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
+from monitoring.metrics import timed
 
+@timed("preprocess")
 def difference_data(data, column):
     """Difference the data to make it stationary."""
     data[f'{column}_Differenced_1'] = data[column].diff().dropna()
     return data
 
-def plot_scatter_comparison(data, column):
-    """Plot scatter plots for original and differenced data."""
+@timed("render")
+def plot_scatter_comparison(data, column, weekly=None, lag_weeks=104):
+    """Plot scatter plots for original and differenced data.
+
+    The long-lag row compares values about two years apart. With `weekly`
+    (GoldPriceDB.get_rollups(city, 'week')) it uses weekly mean prices
+    `lag_weeks` apart instead of 730-day lags of the daily rows.
+    """
     fig, axes = plt.subplots(2, 2, figsize=(16, 12))
     
     # Original Data: yt vs yt-1
@@ -27,29 +35,37 @@ def plot_scatter_comparison(data, column):
     axes[0, 1].set_ylabel("yt")
     axes[0, 1].grid(True)
     
+    if weekly is not None:
+        # Weekly means on a regular weekly grid (weeks without prices stay empty), lagged by lag_weeks
+        levels = weekly[f'{column}_mean'].asfreq('7D')
+        changes = levels.diff()
+        lag_k, label = lag_weeks, f"{lag_weeks} weeks"
+        z_t, z_t_k = levels.iloc[:-lag_k], levels.iloc[lag_k:]
+        z_t_diff, z_t_k_diff = changes.iloc[1:-lag_k], changes.iloc[lag_k + 1:]
+    else:
+        lag_k = label = 730
+        z_t, z_t_k = data.iloc[:-lag_k][column], data.iloc[lag_k:][column]
+        z_t_diff, z_t_k_diff = data.iloc[1:-lag_k][diff_column], data.iloc[lag_k:-1][diff_column]
+
     # Original Data: z_t vs z_t+lag_k
-    lag_k = 730
-    z_t = data.iloc[:-lag_k][column]
-    z_t_k = data.iloc[lag_k:][column]
     axes[1, 0].scatter(z_t, z_t_k, color='blue')
-    axes[1, 0].set_title(f"Original: z_t vs z_t+{lag_k}")
+    axes[1, 0].set_title(f"Original: z_t vs z_t+{label}")
     axes[1, 0].set_xlabel("z_t")
-    axes[1, 0].set_ylabel(f"z_t+{lag_k}")
+    axes[1, 0].set_ylabel(f"z_t+{label}")
     axes[1, 0].grid(True)
     
     # Differenced Data: z_t vs z_t+lag_k
-    z_t_diff = data.iloc[1:-lag_k][diff_column]
-    z_t_k_diff = data.iloc[lag_k:-1][diff_column]
     axes[1, 1].scatter(z_t_diff, z_t_k_diff, color='orange')
-    axes[1, 1].set_title(f"Differenced: z_t vs z_t+{lag_k}")
+    axes[1, 1].set_title(f"Differenced: z_t vs z_t+{label}")
     axes[1, 1].set_xlabel("z_t")
-    axes[1, 1].set_ylabel(f"z_t+{lag_k}")
+    axes[1, 1].set_ylabel(f"z_t+{label}")
     axes[1, 1].grid(True)
     
     plt.tight_layout()
     plt.close()
     return fig
 
+@timed("render")
 def plot_lagged_scatter_comparison(data, column):
     """Plot scatter plots for lagged data (yt vs yt+300 and yt vs yt-300)."""
     fig, axes = plt.subplots(2, 2, figsize=(16, 12))
@@ -87,6 +103,7 @@ def plot_lagged_scatter_comparison(data, column):
     plt.close()
     return fig
 
+@timed("render")
 def plot_time_series_comparison(data, column):
     """Plot time series and rolling statistics for original and differenced data."""
     fig, axes = plt.subplots(2, 2, figsize=(16, 12))
@@ -122,6 +139,7 @@ def plot_time_series_comparison(data, column):
     plt.close()
     return fig
 
+@timed("render")
 def plot_autocorrelation_comparison(data, column, lags=50):
     """Plot ACF and PACF for original and differenced data."""
     fig, axes = plt.subplots(2, 2, figsize=(16, 12))
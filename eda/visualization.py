@@ -1,8 +1,11 @@
 import matplotlib.pyplot as plt
+import pandas as pd
 import seaborn as sns
 from statsmodels.graphics.tsaplots import plot_acf, plot_pacf
 import statsmodels.api as sm
+from monitoring.metrics import timed
 
+@timed("render")
 def plot_boxplots(data):
     """Plot boxplots for Morning and Evening prices."""
     fig, axes = plt.subplots(1, 2, figsize=(16, 6))
@@ -21,6 +24,7 @@ def plot_boxplots(data):
     
     return fig
 
+@timed("render")
 def plot_time_series(data):
     """Plot time series for Morning and Evening prices."""
     fig, axes = plt.subplots(2, 1, figsize=(15, 10))
@@ -30,6 +34,78 @@ def plot_time_series(data):
     
     return fig
 
+@timed("render")
+def plot_period_summary(monthly, yearly, column='Evening'):
+    """Plot monthly price ranges and yearly averages from the pre-aggregated rollups."""
+    fig, axes = plt.subplots(2, 1, figsize=(15, 10))
+
+    axes[0].fill_between(monthly.index, monthly[f'{column}_min'], monthly[f'{column}_max'],
+                         color='gold', alpha=0.4, label='Monthly range (min-max)')
+    axes[0].plot(monthly.index, monthly[f'{column}_mean'], color='darkorange', label='Monthly mean')
+    axes[0].set_title(f'Gold Price - {column}, monthly')
+    axes[0].set_ylabel('Price')
+    axes[0].grid(True)
+    axes[0].legend()
+
+    years = yearly.index.year
+    axes[1].bar(years, yearly[f'{column}_max'] - yearly[f'{column}_min'], bottom=yearly[f'{column}_min'],
+                color='gold', alpha=0.4, label='Yearly range (min-max)')
+    axes[1].plot(years, yearly[f'{column}_mean'], color='darkorange', marker='o', label='Yearly mean')
+    axes[1].set_xticks(years)
+    axes[1].set_title(f'Gold Price - {column}, yearly')
+    axes[1].set_ylabel('Price')
+    axes[1].grid(True)
+    axes[1].legend()
+
+    return fig
+
+@timed("render")
+def plot_anomalies(data, events, column='Evening'):
+    """Plot the price with the days flagged by the online anomaly detector marked."""
+    fig, ax = plt.subplots(figsize=(15, 5))
+
+    ax.plot(data.index, data[column], color='goldenrod', label=column)
+    flagged = pd.to_datetime(events['Date'])
+    rises = events['change'] > 0
+    ax.scatter(flagged[rises], events.loc[rises, column], color='green', marker='^', zorder=3, label='Unusual rise')
+    ax.scatter(flagged[~rises], events.loc[~rises, column], color='red', marker='v', zorder=3, label='Unusual drop')
+    ax.set_title(f'Gold Price - {column}, flagged daily changes')
+    ax.set_ylabel('Price')
+    ax.grid(True)
+    ax.legend()
+
+    return fig
+
+@timed("render")
+def plot_cross_city(report, city):
+    """Plot the cross-city correlation heatmap, rolling spreads and the city's lead/lag profile."""
+    city = city.lower()
+    fig, axes = plt.subplots(3, 1, figsize=(15, 18))
+
+    labelled = len(report.correlation) <= 30
+    sns.heatmap(report.correlation, ax=axes[0], cmap='coolwarm', vmin=-1, vmax=1,
+                xticklabels=labelled, yticklabels=labelled)
+    axes[0].set_title('Correlation of daily Evening price changes')
+
+    axes[1].plot(report.spread.index, report.spread.to_numpy(), color='lightgrey', linewidth=0.8)
+    if city in report.spread:
+        axes[1].plot(report.spread.index, report.spread[city], color='darkorange', label=city.title())
+        axes[1].legend()
+    axes[1].axhline(0, color='black', linewidth=1)
+    axes[1].set_title('Rolling spread against the national median (below 0 = cheaper)')
+    axes[1].set_ylabel('Price difference')
+    axes[1].grid(True)
+
+    if city in report.lead_lag.index:
+        axes[2].bar(report.lead_lag.columns, report.lead_lag.loc[city], color='gold')
+    axes[2].set_title(f'{city.title()} vs national median: correlation by lag (positive = {city.title()} moves first)')
+    axes[2].set_xlabel('Lag (days)')
+    axes[2].set_ylabel('Correlation')
+    axes[2].grid(True)
+
+    return fig
+
+@timed("render")
 def plot_rolling_statistics(data, window=30):
     """Plot rolling mean and standard deviation."""
     normalized_data = data.copy()
@@ -52,6 +128,7 @@ def plot_rolling_statistics(data, window=30):
     
     return fig
 
+@timed("render")
 def plot_decomposition(data, model='additive'):
     """Decompose time series into trend, seasonal, and residual components."""
     fig, axes = plt.subplots(4, 1, figsize=(14, 10))
@@ -2,105 +2,154 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime, timedelta
 
-from config import CITIES, DB_PATH
+from config import CITIES, DB_PATH, METRICS_EXPORT_PATH
 
 from database.db_handler import GoldPriceDB
 from data_pipeline.scraper import GoldPriceScraper
+from data_pipeline.ingest import previous_day, plan_update, ingest_range, load_anomalies
 
-from eda.data_analysis import preprocess_data, calculate_statistics
-from eda.visualization import plot_boxplots, plot_time_series, plot_rolling_statistics, plot_decomposition
+from eda.data_analysis import calculate_statistics
+from eda.series_store import SERIES_STORE
+from eda.cross_city import CROSS_CITY_CACHE
+from eda.visualization import plot_boxplots, plot_time_series, plot_period_summary, plot_anomalies, plot_cross_city, plot_rolling_statistics, plot_decomposition
 from eda.stationarity import * #difference_data, plot_stationarity_comparison, print_stationarity_stats, plot_scatter_comparison, plot_autocorrelation
 
-from models.arima_model import train_arima, evaluate_arima, plot_arima_results, revert_forecast_to_original_scale, plot_reverted_forecast
-from models.lstm_model import create_sequences, build_lstm_model, train_lstm, evaluate_lstm, plot_lstm_results
-from models.prophet_model import train_prophet, evaluate_prophet, plot_prophet_results, reconstruct_forecast, plot_reconstructed_forecast, find_optimal_purchase_dates
-
-from sklearn.preprocessing import MinMaxScaler
+from models.arima_model import plot_arima_results, plot_reverted_forecast
+from models.lstm_model import plot_lstm_results, plot_lstm_level_results
+from models.prophet_model import train_prophet, plot_prophet_results, plot_reconstructed_forecast, find_optimal_purchase_dates
+from models.pipeline import prepare_model_data, run_model_fits
+from models.baseline_models import train_holt_winters, forecast_frame
+from models.purchase_risk import N_PATHS, BLOCK_LENGTH, bootstrap_purchase_risk, forecast_purchase_risk
+
+from monitoring.metrics import MetricsRecorder, get_recorder, span, use_recorder
+
+def show_figure(fig):
+    """st.pyplot with the figure rasterisation counted towards the render stage."""
+    with span("render", name="st.pyplot"):
+        st.pyplot(fig)
+
+def show_timing_panel(recorder):
+    """Per-run breakdown of where the time went, stage by stage."""
+    st.subheader("Timing")
+    summary = pd.DataFrame.from_dict(recorder.summary(), orient='index')
+    summary['peak_rss_bytes'] = summary['peak_rss_bytes'] / 2**20
+    # Without a resettable high-water mark every stage shows the same process-lifetime peak; say so
+    per_span = (summary.pop('peak_rss_scope') == 'span').all()
+    summary = summary.rename(columns={
+        'calls': 'Calls', 'wall_seconds': 'Wall (s)', 'cpu_seconds': 'CPU (s)',
+        'peak_rss_bytes': 'Peak RSS in stage (MiB)' if per_span else 'Process-lifetime peak RSS (MiB)',
+    })
+    st.dataframe(summary.sort_values('Wall (s)', ascending=False).round(3))
+
+    spans = pd.DataFrame([{
+        'Stage': entry['stage'],
+        'Step': entry['labels'].get('name', ''),
+        'Wall (s)': round(entry['wall_seconds'], 3),
+        'CPU (s)': round(entry['cpu_seconds'], 3),
+    } for entry in recorder.spans])
+    with st.expander("All spans"):
+        st.dataframe(spans)
+
+def show_validation_report(result):
+    """Tell the user about scraped rows that were quarantined and days the site had no prices for."""
+    if not result.quarantined.empty:
+        st.warning(f"{len(result.quarantined)} scraped row(s) failed validation and were quarantined.")
+        with st.expander("Quarantined rows"):
+            st.dataframe(result.quarantined)
+    if result.gaps:
+        missing = ", ".join(start if start == end else f"{start} to {end}" for start, end in result.gaps)
+        st.info(f"No prices were published for: {missing}")
 
 def data_collection(city):
     # Database Initialization
     db = GoldPriceDB(DB_PATH)
     scraper = GoldPriceScraper(city)
 
-    today = datetime.today()
-    previous_day = today - timedelta(days=1)
-    previous_day = previous_day.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_date = previous_day()
+    start_date = plan_update(db, city, end_date)
 
     if not db.check_city_data(city):
         st.warning(f"No historical data found for {city}. Initializing data collection...")
         
-        start_date = datetime(2021, 8, 1)
-        with st.spinner(f"Scraping data from {start_date.strftime('%Y-%m-%d')} to {previous_day.strftime('%Y-%m-%d')}..."):
+        with st.spinner(f"Scraping data from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}..."):
             try:
-                complete_data = scraper.scrape_range(start_date, previous_day)
-                db.update_data(city, complete_data)
-                st.success(f"Successfully added {len(complete_data)} records for {city}!")
+                result = ingest_range(db, scraper, city, start_date, end_date)
+                st.success(f"Successfully added {len(result.valid)} records for {city}!")
+                show_validation_report(result)
                 st.session_state.data_collected = True
             except Exception as e:
                 st.error(f"Error scraping initial data: {str(e)}")
                 st.session_state.data_collected = False
                 return                
 
+    elif start_date is not None:
+        st.info(f"Updating data from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}...") # In Python, strftime stands for "string format time." It is a method used to format datetime objects into readable strings according to a specified format.
+
+        with st.spinner("Fetching latest prices..."):
+            try:
+                result = ingest_range(db, scraper, city, start_date, end_date)
+                        
+                if not result.valid.empty:
+                    st.success(f"Successfully updated {len(result.valid)} new records!")
+                else:
+                    st.success("Database is already up to date!")
+                show_validation_report(result)
+                st.session_state.data_collected = True
+
+            except Exception as e:
+                st.error(f"Error updating data: {str(e)}")
+                st.session_state.data_collected = False
+                return
     else:
-        latest_date_str = db.get_latest_date(city)
-        latest_date = datetime.strptime(latest_date_str, "%Y-%m-%d") # strptime stands for "string parse time." It is a method in Python used to convert a string representation of a date and time into a datetime object, based on a specified format.
-        print("Latest Date: ",latest_date)
-        print("Previous day: ",previous_day)
-        if latest_date < previous_day:
-            # Calculate the start date for updating (next day after latest date)
-            update_start_date = latest_date + timedelta(days=1)
-
-            st.info(f"Updating data from {update_start_date.strftime('%Y-%m-%d')} to {previous_day.strftime('%Y-%m-%d')}...") # In Python, strftime stands for "string format time." It is a method used to format datetime objects into readable strings according to a specified format.
-    
-            with st.spinner("Fetching latest prices..."):
-                try:
-                    new_data = scraper.scrape_range(update_start_date, previous_day)
-                            
-                    if not new_data.empty:
-                        db.update_data(city, new_data)
-                        st.success(f"Successfully updated {len(new_data)} new records!")
-                        st.session_state.data_collected = True
-                    else:
-                        #st.warning("No new data found to update.")
-                        st.success("Database is already up to date!")
-                        st.session_state.data_collected = True
-
-                except Exception as e:
-                    st.error(f"Error updating data: {str(e)}")
-                    st.session_state.data_collected = False
-                    return
-        else:
-            st.success("Database is already up to date!")
-            st.session_state.data_collected = True
+        st.success("Database is already up to date!")
+        st.session_state.data_collected = True
 
 def perform_eda(city):
     """Perform Exploratory Data Analysis and display results."""
     db = GoldPriceDB(DB_PATH)
-    data = db.get_all_data(city)
-    data = preprocess_data(data)
+    data = SERIES_STORE.get(db, city).to_frame()
     
     st.subheader("Data Statistics")
     stats = calculate_statistics(data)
     st.write(f"Total null values: {stats['null_values']}")
     #st.write(f"Total duplicate rows: {stats['duplicates']}")
     st.write(f"Outliers - Morning: {stats['outliers']['Morning']}, Evening: {stats['outliers']['Evening']}")
+
+    st.write("### Unusual Daily Price Changes")
+    anomalies = load_anomalies(db, city)
+    st.write(f"{len(anomalies)} day(s) flagged by the anomaly detector.")
+    if not anomalies.empty:
+        show_figure(plot_anomalies(data, anomalies))
+        st.dataframe(anomalies)
     
     st.subheader("Visualizations")
     
     st.write("### Boxplots for Morning and Evening Prices")
-    st.pyplot(plot_boxplots(data))
+    show_figure(plot_boxplots(data))
     
     st.write("### Time Series of Gold Prices")
-    st.pyplot(plot_time_series(data))
+    show_figure(plot_time_series(data))
+
+    st.write("### Monthly and Yearly Price Ranges")
+    show_figure(plot_period_summary(db.get_rollups(city, 'month'), db.get_rollups(city, 'year')))
     
+    if len(db.cities()) > 1:
+        st.write("### Cross-City Comparison")
+        report = CROSS_CITY_CACHE.get(db)
+        show_figure(plot_cross_city(report, city))
+        st.write("Latest 30-day spread against the national median, cheapest first:")
+        st.dataframe(report.latest_spread)
+        st.write("Lead/lag against the national median:")
+        st.dataframe(report.best_lag)
+
     st.write("### Rolling Mean and Standard Deviation")
-    st.pyplot(plot_rolling_statistics(data))
+    show_figure(plot_rolling_statistics(data))
     
     st.write("### Time Series Decomposition using additive model")
-    st.pyplot(plot_decomposition(data, model='additive'))
+    show_figure(plot_decomposition(data, model='additive'))
 
     st.write("### Time Series Decomposition using multiplicative model")
-    st.pyplot(plot_decomposition(data, model='multiplicative'))
+    show_figure(plot_decomposition(data, model='multiplicative'))
 
     #st.write("### Autocorrelation and Partial Autocorrelation")
     #st.pyplot(plot_autocorrelation(data))
@@ -110,14 +159,15 @@ def perform_eda(city):
     data = difference_data(data, 'Evening')
     
     st.write("### Scatter Plots")
-    st.pyplot(plot_scatter_comparison(data, 'Evening'))
-    st.pyplot(plot_lagged_scatter_comparison(data, 'Evening'))
+    # The two-year lag row reads the weekly rollups rather than every daily row
+    show_figure(plot_scatter_comparison(data, 'Evening', weekly=db.get_rollups(city, 'week')))
+    show_figure(plot_lagged_scatter_comparison(data, 'Evening'))
     
     st.write("### Time Series and Rolling Statistics")
-    st.pyplot(plot_time_series_comparison(data, 'Evening'))
+    show_figure(plot_time_series_comparison(data, 'Evening'))
     
     st.write("### Autocorrelation Analysis")
-    st.pyplot(plot_autocorrelation_comparison(data, 'Evening'))
+    show_figure(plot_autocorrelation_comparison(data, 'Evening'))
     
     st.write("### Statistics")
     print_statistics(data, 'Evening')
@@ -125,110 +175,85 @@ def perform_eda(city):
 
     st.session_state.eda_performed = True
 
-def perform_arima_analysis(city):
+def show_model_metrics(title, result):
+    st.subheader(title)
+    st.write(f"Mean Absolute Error (MAE): {result.mae}")
+    st.write(f"Mean Squared Error (MSE): {result.mse}")
+    st.write(f"Root Mean Squared Error (RMSE): {result.rmse}")
+    st.write(f"R-squared (R2 Score): {result.r2}")
+
+def show_arima_results(inputs, result):
+    show_model_metrics("ARIMA Model Results", result)
+    outputs = result.outputs
+    show_figure(plot_arima_results(inputs.train_series, inputs.test_series, outputs['forecast']))
+    if outputs['test_levels'].notna().any():
+        show_figure(plot_reverted_forecast(outputs['test_levels'], outputs['forecast_levels'], outputs['conf_int_levels']))
+    else:
+        st.info("The ARIMA forecast covers the days after the last collected price, so there are no actual "
+                "prices to compare it with on the price scale yet.")
+
+def show_lstm_results(inputs, result):
+    show_model_metrics("LSTM Model Results", result)
+    outputs = result.outputs
+    show_figure(plot_lstm_results(inputs.test_series, outputs['actual'], outputs['predicted'], outputs['seq_length']))
+    show_figure(plot_lstm_level_results(inputs.test_series.index[outputs['seq_length']:], outputs['actual_levels'],
+                                        outputs['predicted_levels']))
+
+def show_prophet_results(inputs, result):
+    show_model_metrics("Prophet Model Results", result)
+    show_figure(plot_prophet_results(result.outputs['test_df'], result.outputs['forecasted_values']))
+    show_figure(plot_reconstructed_forecast(result.outputs['reconstructed_df']))
+
+MODEL_VIEWS = {
+    "arima": ("ARIMA", show_arima_results),
+    "lstm": ("LSTM", show_lstm_results),
+    "prophet": ("Prophet", show_prophet_results),
+}
+
+def perform_model_analysis(city):
+    """Prepare the data once, fit all models in parallel and show each one as soon as it finishes."""
     db = GoldPriceDB(DB_PATH)
-    data = db.get_all_data(city)
-    data = preprocess_data(data)
-    data = difference_data(data, 'Evening')
-    
-    train_series = pd.to_numeric(data['Evening_Differenced_1'], errors='coerce').dropna()
-    train_series.index.freq = pd.infer_freq(train_series.index)
-    
-    test_series = pd.to_numeric(data['Evening_Differenced_1'], errors='coerce').dropna()
-    test_series.index.freq = pd.infer_freq(test_series.index)
-    
-    model = train_arima(train_series)
-    forecast, mae, mse, rmse, r2 = evaluate_arima(model, test_series)
-    
-    st.subheader("ARIMA Model Results")
-    st.write(f"Mean Absolute Error (MAE): {mae}")
-    st.write(f"Mean Squared Error (MSE): {mse}")
-    st.write(f"Root Mean Squared Error (RMSE): {rmse}")
-    st.write(f"R-squared (R2 Score): {r2}")
-    
-    st.pyplot(plot_arima_results(train_series, test_series, forecast))
-    
-    #forecast_original_series = revert_forecast_to_original_scale(forecast, data['Evening'])
-    #st.pyplot(plot_reverted_forecast(test_series, forecast_original_series))
+    inputs = prepare_model_data(SERIES_STORE.get(db, city))
+
+    # One slot per model, in the usual page order, filled in completion order
+    slots = {name: st.empty() for name in MODEL_VIEWS}
+    for name, (label, _) in MODEL_VIEWS.items():
+        slots[name].info(f"Fitting the {label} model...")
+
+    for result in run_model_fits(inputs, models=list(MODEL_VIEWS)):
+        get_recorder().extend(result.spans)
+        label, show = MODEL_VIEWS[result.model]
+        with slots[result.model].container():
+            if result.ok:
+                show(inputs, result)
+            else:
+                st.error(f"{label} model failed: {result.error}")
 
-def perform_lstm_analysis(city):
-    db = GoldPriceDB(DB_PATH)
-    data = db.get_all_data(city)
-    data = preprocess_data(data)
-    data = difference_data(data, 'Evening')
-    
-    train_series = pd.to_numeric(data['Evening_Differenced_1'], errors='coerce').dropna()
-    train_series.index.freq = pd.infer_freq(train_series.index)
-    
-    test_series = pd.to_numeric(data['Evening_Differenced_1'], errors='coerce').dropna()
-    test_series.index.freq = pd.infer_freq(test_series.index)
-    
-    scaler = MinMaxScaler(feature_range=(0, 1))
-    train_scaled = scaler.fit_transform(train_series.values.reshape(-1, 1))
-    test_scaled = scaler.transform(test_series.values.reshape(-1, 1))
-    
-    seq_length = 10
-    x_train, y_train = create_sequences(train_scaled, seq_length)
-    x_test, y_test = create_sequences(test_scaled, seq_length)
-    
-    model = build_lstm_model(seq_length)
-    model = train_lstm(model, x_train, y_train)
-    
-    predicted, actual, mae, mse, rmse, r2 = evaluate_lstm(model, x_test, y_test, scaler)
-    
-    st.subheader("LSTM Model Results")
-    st.write(f"Mean Absolute Error (MAE): {mae}")
-    st.write(f"Mean Squared Error (MSE): {mse}")
-    st.write(f"Root Mean Squared Error (RMSE): {rmse}")
-    st.write(f"R-squared (R2 Score): {r2}")
-    
-    st.pyplot(plot_lstm_results(test_series, actual, predicted, seq_length))
+def find_optimal_purchase_date(city, start_date, end_date, fast=False):
+    """Finds the optimal day(s) for purchasing gold within the given date range.
 
-def perform_prophet_analysis(city):
+    With fast=True a NumPy Holt-Winters model replaces Prophet; it only
+    forecasts the days after the last collected price.
+    """
     db = GoldPriceDB(DB_PATH)
-    data = db.get_all_data(city)
-    data = preprocess_data(data)
-    data = difference_data(data, 'Evening')
-    
-    train_series = pd.to_numeric(data['Evening_Differenced_1'], errors='coerce').dropna()
-    train_series.index.freq = pd.infer_freq(train_series.index)
-    
-    test_series = pd.to_numeric(data['Evening_Differenced_1'], errors='coerce').dropna()
-    test_series.index.freq = pd.infer_freq(test_series.index)
-    
-    train_df = train_series.reset_index()
-    test_df = test_series.reset_index()
-    
-    train_df.columns = ['ds', 'y']
-    test_df.columns = ['ds', 'y']
-    
-    model = train_prophet(train_df)
-    forecast, forecasted_values, mae, mse, rmse, r2 = evaluate_prophet(model, test_df)
-    
-    st.subheader("Prophet Model Results")
-    st.write(f"Mean Absolute Error (MAE): {mae}")
-    st.write(f"Mean Squared Error (MSE): {mse}")
-    st.write(f"Root Mean Squared Error (RMSE): {rmse}")
-    st.write(f"R-squared (R2 Score): {r2}")
-    
-    st.pyplot(plot_prophet_results(test_df, forecasted_values))
-    
-    #reconstructed_df = reconstruct_forecast(forecasted_values, data, test_df)
-    #st.pyplot(plot_reconstructed_forecast(reconstructed_df))
+    series = SERIES_STORE.get(db, city)
+
+    if fast:
+        last_date = series.index()[-1]
+        if pd.Timestamp(start_date) <= last_date:
+            st.info(f"Fast mode forecasts from {(last_date + timedelta(days=1)).strftime('%d-%m-%Y')} onwards.")
+        model = train_holt_winters(series.values('Evening'))
+        forecast = forecast_frame(model, last_date, start_date, end_date)
+    else:
+        data = series.to_frame(columns=('Evening',))
+        data = data.reset_index()
 
-def find_optimal_purchase_date(city, start_date, end_date):
-    """Finds the optimal day(s) for purchasing gold within the given date range."""
-    db = GoldPriceDB(DB_PATH)
-    data = db.get_all_data(city)
-    data = preprocess_data(data)
-    
-    data = data.reset_index()
+        train_df = data[['Date', 'Evening']].rename(columns={'Date': 'ds', 'Evening': 'y'})
+        model = train_prophet(train_df, warm_start_key=(city, 'Evening'))
 
-    train_df = data[['Date', 'Evening']].rename(columns={'Date': 'ds', 'Evening': 'y'})
-    model = train_prophet(train_df)
-    
-    future = pd.DataFrame({'ds': pd.date_range(start=start_date, end=end_date)})
-    forecast = model.predict(future)
+        future = pd.DataFrame({'ds': pd.date_range(start=start_date, end=end_date)})
+        with span("predict", name="prophet_forecast"):
+            forecast = model.predict(future)
     
     optimal_dates = find_optimal_purchase_dates(forecast, start_date, end_date)
     
@@ -260,9 +285,52 @@ def find_optimal_purchase_date(city, start_date, end_date):
     ).round(2)
 
     st.write(forecast_display)
+
+    show_purchase_risk(series, forecast, model, start_date, end_date, fast)
+
+def show_purchase_risk(series, forecast, model, start_date, end_date, fast):
+    """Monte Carlo view: chance that each day is the cheapest and the expected saving over buying on day one."""
+    st.subheader("Purchase Risk")
+    if fast:
+        risk = forecast_purchase_risk(forecast, series.index()[-1], model.residuals[0], start_date, end_date,
+                                      block_length=BLOCK_LENGTH)
+        st.caption(f"{N_PATHS:,} simulated price paths around the Holt-Winters forecast, built from "
+                   f"{BLOCK_LENGTH}-day blocks of its in-sample one-step errors.")
+    else:
+        risk = bootstrap_purchase_risk(series, start_date, end_date)
+        st.caption(f"{N_PATHS:,} simulated price paths from a {BLOCK_LENGTH}-day block bootstrap of past daily price changes.")
+
+    if risk.empty:
+        st.warning("The selected range has no days after the last collected price to simulate.")
+        return
+
+    risk_display = risk.rename(columns={'ds': 'Date'})
+    risk_display['Date'] = risk_display['Date'].dt.strftime('%d-%m-%Y')  # Format date
+    for column in ['Expected Price', 'Lower Bound', 'Upper Bound', 'Expected Savings']:
+        risk_display[column] = risk_display[column].round().astype(int)
+    risk_display['Chance Cheapest (%)'] = risk_display['Chance Cheapest (%)'].round(2)
+
+    best = risk_display.loc[risk_display['Chance Cheapest (%)'].idxmax()]
+    st.write(f"Most likely cheapest day: **{best['Date']}** ({best['Chance Cheapest (%)']}% of simulations).")
+    st.bar_chart(risk_display.set_index('Date')['Chance Cheapest (%)'])
+    st.dataframe(risk_display)
+
 def main():
     st.set_page_config(page_title="Golden Time Machine", layout="wide")
+    show_timings = st.sidebar.checkbox("Show timing panel", value=False)
+
+    # Spans from this script run only, so concurrent sessions do not mix their timings
+    recorder = MetricsRecorder()
+    with use_recorder(recorder):
+        run_app()
+
+    if recorder.spans:
+        if METRICS_EXPORT_PATH:
+            recorder.export(METRICS_EXPORT_PATH)
+        if show_timings:
+            show_timing_panel(recorder)
 
+def run_app():
     if 'data_collected' not in st.session_state:
         st.session_state.data_collected = False
 
@@ -288,9 +356,7 @@ def main():
 
     if st.button("Model the data using ARIMA, LSTM and Prophet models"):
         if st.session_state.eda_performed:
-            perform_arima_analysis(city)
-            perform_lstm_analysis(city)
-            perform_prophet_analysis(city)
+            perform_model_analysis(city)
         else:
             st.warning("Please perform EDA first by clicking 'Perform EDA'.")        
 
@@ -298,13 +364,14 @@ def main():
     st.subheader("Find Optimal Purchase Date")
     start_date = st.date_input("Select start date", datetime.today())
     end_date = st.date_input("Select end date", datetime.today() + timedelta(days=30))
+    fast_mode = st.checkbox("Fast mode (NumPy Holt-Winters instead of Prophet)")
 
     if start_date > end_date:
         st.error("End date must be greater than or equal to start date.")
     else:
         if st.button("Find Optimal Purchase Date"):
             if st.session_state.data_collected:
-                find_optimal_purchase_date(city, start_date, end_date)
+                find_optimal_purchase_date(city, start_date, end_date, fast=fast_mode)
             else:
                 st.warning("Please collect data first by clicking 'Confirm Selection'.")
     #else:
@@ -4,12 +4,16 @@ import matplotlib.pyplot as plt
 import streamlit as st
 from statsmodels.tsa.arima.model import ARIMA
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from models.reconstruction import reconstruct_levels
+from monitoring.metrics import timed
 
+@timed("fit")
 def train_arima(train_series, order=(1, 0, 1)):
     model = ARIMA(train_series, order=order)
     arima_result = model.fit()
     return arima_result
 
+@timed("predict")
 def evaluate_arima(model, test_series):
     forecast = model.forecast(steps=len(test_series))
     mae = mean_absolute_error(test_series, forecast)
@@ -18,6 +22,7 @@ def evaluate_arima(model, test_series):
     r2 = r2_score(test_series, forecast)
     return forecast, mae, mse, rmse, r2
 
+@timed("render")
 def plot_arima_results(train_series, test_series, forecast):
     fig, ax = plt.subplots(figsize=(12, 6))
     ax.plot(train_series.index, train_series, label="Training Data", color='blue')
@@ -31,16 +36,22 @@ def plot_arima_results(train_series, test_series, forecast):
     #st.pyplot(fig)
 
 def revert_forecast_to_original_scale(forecast, original_series):
-    last_original_value = original_series.iloc[-1]
-    forecast_original = [last_original_value + forecast[0]]
-    for i in range(1, len(forecast)):
-        forecast_original.append(forecast_original[-1] + forecast[i])
+    forecast_original, _, _ = reconstruct_levels(forecast, original_series.iloc[-1])
     return pd.Series(forecast_original, index=forecast.index)
 
-def plot_reverted_forecast(test_series, forecast_original_series):
+def revert_conf_int_to_original_scale(forecast, conf_int, original_series):
+    """Level-scale bounds for a differenced forecast's conf_int() frame (lower, upper columns)."""
+    _, lower, upper = reconstruct_levels(forecast, original_series.iloc[-1], conf_int.iloc[:, 0], conf_int.iloc[:, 1])
+    return pd.DataFrame({'lower': lower, 'upper': upper}, index=forecast.index)
+
+@timed("render")
+def plot_reverted_forecast(test_series, forecast_original_series, conf_int_original=None):
     fig, ax = plt.subplots(figsize=(12, 6))
     ax.plot(test_series.index, test_series, label="Actual Data", color="blue")
     ax.plot(test_series.index, forecast_original_series, label="Reverted Forecast", color="red")
+    if conf_int_original is not None:
+        ax.fill_between(test_series.index, conf_int_original['lower'], conf_int_original['upper'],
+                        color="red", alpha=0.2, label="Forecast Interval")
     ax.set_title("Actual vs. Forecast (Original Scale)")
     ax.set_xlabel("Date")
     ax.set_ylabel("Gold Price")
@@ -0,0 +1,193 @@
+"""Pure-NumPy baseline forecasters: seasonal naive, EWMA, Holt-Winters and least-squares AR.
+
+Every train_* accepts one series (pd.Series / 1-D array) or many cities at
+once as a 2-D array of shape (n_cities, n_days) on a shared daily grid, and
+returns a BaselineModel. forecast_baseline and evaluate_baseline then work
+on all cities in one vectorized pass. Fitting and forecasting take
+milliseconds, so they can answer interactive "best day to buy" requests that
+Prophet or the LSTM cannot.
+"""
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from scipy.stats import norm
+
+from monitoring.metrics import timed
+
+@dataclass
+class BaselineModel:
+    kind: str
+    # Per-city state needed to forecast, each shaped (n_cities, ...)
+    state: dict
+    # Std of the in-sample one-step-ahead errors, per city; drives the intervals
+    residual_std: np.ndarray
+    params: dict = field(default_factory=dict)
+    squeeze: bool = False
+    # The in-sample one-step-ahead errors themselves, (n_cities, n_errors) in time order, for resampling
+    residuals: np.ndarray = None
+
+def _as_matrix(train):
+    """(n_cities, n_days) float64 copy with gaps forward-filled (leading gaps back-filled)."""
+    values = np.asarray(train, dtype=np.float64)
+    squeeze = values.ndim == 1
+    values = np.atleast_2d(values).copy()
+
+    missing = np.isnan(values)
+    if missing.any():
+        # Index of the last observed value at or before each position, per row
+        idx = np.where(~missing, np.arange(values.shape[1]), 0)
+        np.maximum.accumulate(idx, axis=1, out=idx)
+        values = np.take_along_axis(values, idx, axis=1)
+        first_valid = np.argmax(~missing, axis=1)
+        lead = np.arange(values.shape[1]) < first_valid[:, None]
+        values[lead] = np.broadcast_to(values[np.arange(len(values)), first_valid][:, None], values.shape)[lead]
+    return values, squeeze
+
+def _residual_std(errors):
+    return np.sqrt(np.nanmean(errors ** 2, axis=1))
+
+@timed("fit")
+def train_seasonal_naive(train, season_length=7):
+    """Forecast each day as the value one season earlier."""
+    y, squeeze = _as_matrix(train)
+    errors = y[:, season_length:] - y[:, :-season_length]
+    return BaselineModel("seasonal_naive", {"last_season": y[:, -season_length:]}, _residual_std(errors),
+                         {"season_length": season_length}, squeeze, errors)
+
+@timed("fit")
+def train_ewma(train, alpha=0.3):
+    """Exponentially weighted level; the forecast is flat at the last level."""
+    y, squeeze = _as_matrix(train)
+    # l_t = alpha * y_t + (1 - alpha) * l_{t-1}, started at l_0 = y_0, as one IIR filter over all rows
+    level, _ = lfilter([alpha], [1.0, alpha - 1.0], y, axis=1, zi=(1 - alpha) * y[:, :1])
+    errors = y[:, 1:] - level[:, :-1]
+    return BaselineModel("ewma", {"level": level[:, -1]}, _residual_std(errors), {"alpha": alpha}, squeeze, errors)
+
+@timed("fit")
+def train_holt_winters(train, alpha=0.3, beta=0.05, gamma=0.1, season_length=7):
+    """Additive Holt-Winters (level, trend, weekly season) with fixed smoothing constants.
+
+    The recursion runs over time, but each step updates every city at once.
+    """
+    y, squeeze = _as_matrix(train)
+    m = season_length
+    if y.shape[1] < 2 * m:
+        raise ValueError(f"Holt-Winters needs at least {2 * m} observations, got {y.shape[1]}")
+
+    level = y[:, :m].mean(axis=1)
+    trend = (y[:, m:2 * m].mean(axis=1) - level) / m
+    season = y[:, :m] - level[:, None]
+    errors = np.empty((y.shape[0], y.shape[1] - m))
+
+    for t in range(m, y.shape[1]):
+        s = season[:, t % m]
+        errors[:, t - m] = y[:, t] - (level + trend + s)
+        previous_level = level
+        level = alpha * (y[:, t] - s) + (1 - alpha) * (level + trend)
+        trend = beta * (level - previous_level) + (1 - beta) * trend
+        season[:, t % m] = gamma * (y[:, t] - level) + (1 - gamma) * s
+
+    # Rotate so that season[:, 0] belongs to the first forecast day
+    season = np.roll(season, -(y.shape[1] % m), axis=1)
+    return BaselineModel("holt_winters", {"level": level, "trend": trend, "season": season},
+                         _residual_std(errors), {"alpha": alpha, "beta": beta, "gamma": gamma,
+                                                 "season_length": m}, squeeze, errors)
+
+@timed("fit")
+def train_ar(train, p=7):
+    """AR(p) with intercept, fitted per city by ordinary least squares in one batched solve."""
+    y, squeeze = _as_matrix(train)
+    if y.shape[1] <= 2 * p:
+        raise ValueError(f"AR({p}) needs more than {2 * p} observations, got {y.shape[1]}")
+
+    # lags[c, t, k] = y[c, t + k] is the window ending just before target y[c, t + p]; a strided view, not a copy
+    lags = np.lib.stride_tricks.sliding_window_view(y[:, :-1], p, axis=1)
+    target = y[:, p:]
+    n = target.shape[1]
+
+    # Normal equations for [intercept, lags] assembled blockwise, so the design matrix is never built
+    lag_sums = lags.sum(axis=1)
+    gram = np.empty((y.shape[0], p + 1, p + 1))
+    gram[:, 0, 0] = n
+    gram[:, 0, 1:] = lag_sums
+    gram[:, 1:, 0] = lag_sums
+    gram[:, 1:, 1:] = np.einsum('ctk,ctj->ckj', lags, lags, optimize=True)
+    rhs = np.concatenate([target.sum(axis=1, keepdims=True), np.einsum('ctk,ct->ck', lags, target, optimize=True)], axis=1)
+    # A tiny ridge keeps flat (constant-price) series solvable
+    gram += 1e-8 * np.eye(p + 1)
+    coef = np.linalg.solve(gram, rhs[..., None])[..., 0]
+
+    errors = target - (coef[:, :1] + np.einsum('ctk,ck->ct', lags, coef[:, 1:], optimize=True))
+    return BaselineModel("ar", {"coef": coef, "history": y[:, -p:]}, _residual_std(errors), {"p": p}, squeeze, errors)
+
+TRAINERS = {
+    "seasonal_naive": train_seasonal_naive,
+    "ewma": train_ewma,
+    "holt_winters": train_holt_winters,
+    "ar": train_ar,
+}
+
+@timed("predict")
+def forecast_baseline(model, steps):
+    """Point forecasts for the next `steps` days, shaped (n_cities, steps) (1-D for a single series)."""
+    h = np.arange(steps)
+    if model.kind == "seasonal_naive":
+        last_season = model.state["last_season"]
+        forecast = last_season[:, h % last_season.shape[1]]
+    elif model.kind == "ewma":
+        forecast = np.repeat(model.state["level"][:, None], steps, axis=1)
+    elif model.kind == "holt_winters":
+        season = model.state["season"]
+        forecast = (model.state["level"][:, None] + model.state["trend"][:, None] * (h + 1)
+                    + season[:, h % season.shape[1]])
+    elif model.kind == "ar":
+        coef = model.state["coef"]
+        window = model.state["history"].copy()
+        forecast = np.empty((coef.shape[0], steps))
+        for i in range(steps):
+            forecast[:, i] = coef[:, 0] + np.einsum('ck,ck->c', coef[:, 1:], window)
+            window = np.concatenate([window[:, 1:], forecast[:, i:i + 1]], axis=1)
+    else:
+        raise ValueError(f"unknown baseline model {model.kind!r}")
+    return forecast[0] if model.squeeze else forecast
+
+def forecast_interval(model, steps, interval_width=0.8):
+    """(lower, upper) bands: residual std growing with sqrt(horizon), a random-walk approximation."""
+    z = norm.ppf(0.5 + interval_width / 2)
+    spread = z * model.residual_std[:, None] * np.sqrt(np.arange(1, steps + 1))
+    forecast = np.atleast_2d(forecast_baseline(model, steps))
+    lower, upper = forecast - spread, forecast + spread
+    return (lower[0], upper[0]) if model.squeeze else (lower, upper)
+
+def evaluate_baseline(model, test_series):
+    """Forecast over the test window and score it; metrics are per city for 2-D input."""
+    actual = np.atleast_2d(np.asarray(test_series, dtype=np.float64))
+    forecast = np.atleast_2d(forecast_baseline(model, actual.shape[1]))
+    errors = actual - forecast
+    mae = np.mean(np.abs(errors), axis=1)
+    mse = np.mean(errors ** 2, axis=1)
+    rmse = np.sqrt(mse)
+    ss_tot = np.sum((actual - actual.mean(axis=1, keepdims=True)) ** 2, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r2 = 1 - np.sum(errors ** 2, axis=1) / ss_tot
+    if model.squeeze:
+        return forecast[0], mae[0], mse[0], rmse[0], r2[0]
+    return forecast, mae, mse, rmse, r2
+
+def forecast_frame(model, last_date, start_date, end_date, interval_width=0.8):
+    """Single-city forecast in Prophet's column layout (ds, yhat, yhat_lower, yhat_upper).
+
+    Covers the days after `last_date` (the end of the training data) that fall in
+    [start_date, end_date], so it can go straight into find_optimal_purchase_dates.
+    """
+    first_day = pd.Timestamp(last_date).normalize() + pd.Timedelta(days=1)
+    end_date = pd.Timestamp(end_date)
+    steps = max((end_date - first_day).days + 1, 0)
+    forecast = pd.DataFrame({
+        'ds': pd.date_range(start=first_day, periods=steps, freq='D'),
+        'yhat': forecast_baseline(model, steps),
+    })
+    forecast['yhat_lower'], forecast['yhat_upper'] = forecast_interval(model, steps, interval_width)
+    return forecast[forecast['ds'] >= pd.Timestamp(start_date)].reset_index(drop=True)
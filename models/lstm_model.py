@@ -1,10 +1,12 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense
+import tensorflow as tf
+from tensorflow.keras.models import Model, Sequential
+from tensorflow.keras.layers import LSTM, Concatenate, Dense, Embedding, Flatten, Input, RepeatVector
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from monitoring.metrics import timed
 
 def create_sequences(data, seq_length):
     x, y = [], []
@@ -22,10 +24,12 @@ def build_lstm_model(seq_length):
     model.compile(optimizer='adam', loss='mean_squared_error')
     return model
 
+@timed("fit")
 def train_lstm(model, x_train, y_train, epochs=20, batch_size=32):
     model.fit(x_train, y_train, epochs=epochs, batch_size=batch_size, verbose=0)
     return model
 
+@timed("predict")
 def evaluate_lstm(model, x_test, y_test, scaler):
     predicted_scaled = model.predict(x_test)
     predicted = scaler.inverse_transform(predicted_scaled)
@@ -36,6 +40,7 @@ def evaluate_lstm(model, x_test, y_test, scaler):
     r2 = r2_score(actual, predicted)
     return predicted, actual, mae, mse, rmse, r2
 
+@timed("render")
 def plot_lstm_results(test_series, actual, predicted, seq_length):
     fig, ax = plt.subplots(figsize=(14, 10))
     ax.plot(test_series.index[seq_length:], actual, label="Actual Test Data", color='green')
@@ -44,4 +49,91 @@ def plot_lstm_results(test_series, actual, predicted, seq_length):
     ax.set_xlabel("Date")
     ax.set_ylabel("Evening_Differenced_1")
     ax.legend()
-    return fig
\ No newline at end of file
+    return fig
+
+@timed("render")
+def plot_lstm_level_results(dates, actual_levels, predicted_levels):
+    fig, ax = plt.subplots(figsize=(12, 6))
+    ax.plot(dates, actual_levels, label="Actual Data", color='green')
+    ax.plot(dates, predicted_levels, label="Reconstructed Predicted Data", color='red')
+    ax.set_title("Actual vs Predicted - LSTM Model (Original Scale)")
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Evening Gold Prices")
+    ax.legend()
+    return fig
+
+# Multi-city mode: one global LSTM for every city, told apart by a learned city embedding.
+# Adding a city adds windows to the same fit instead of another model to train and hold in memory.
+
+def create_multi_city_sequences(series_by_city, seq_length, scalers=None):
+    """Windows from every city's series stacked into one set, each city min-max scaled on its own.
+
+    `series_by_city` maps city -> 1-D series; its key order defines the city ids.
+    Scalers are fitted when `scalers` is None (training) and reused otherwise
+    (test data). Returns (x, city_ids, y, scalers) with x shaped (n, seq_length, 1).
+    """
+    fit = scalers is None
+    scalers = {} if fit else scalers
+    xs, ids, ys = [], [], []
+    for city_id, (city, series) in enumerate(series_by_city.items()):
+        values = np.asarray(series, dtype=np.float64).reshape(-1, 1)
+        if fit:
+            scalers[city] = MinMaxScaler(feature_range=(0, 1)).fit(values)
+        scaled = scalers[city].transform(values)[:, 0].astype(np.float32)
+        if len(scaled) <= seq_length:
+            continue
+        # Same windows as create_sequences, taken as a strided view instead of a Python loop
+        windows = np.lib.stride_tricks.sliding_window_view(scaled, seq_length + 1)
+        xs.append(windows[:, :-1])
+        ys.append(windows[:, -1])
+        ids.append(np.full(len(windows), city_id, dtype=np.int32))
+
+    if not xs:
+        raise ValueError(f"no city has more than {seq_length} observations")
+    x = np.concatenate(xs)[..., None]
+    return x, np.concatenate(ids), np.concatenate(ys), scalers
+
+def make_multi_city_dataset(x, city_ids, y, batch_size=256, shuffle=True, seed=0):
+    """Batched tf.data pipeline over the stacked windows; shuffling mixes the cities within each batch."""
+    dataset = tf.data.Dataset.from_tensor_slices(({'window': x, 'city': city_ids}, y))
+    if shuffle:
+        dataset = dataset.shuffle(len(y), seed=seed, reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def build_global_lstm_model(seq_length, n_cities, embedding_dim=4):
+    window = Input(shape=(seq_length, 1), name='window')
+    city = Input(shape=(1,), dtype='int32', name='city')
+    embedded = Flatten()(Embedding(n_cities, embedding_dim)(city))
+    # Feed the city embedding alongside the price at every time step
+    features = Concatenate()([window, RepeatVector(seq_length)(embedded)])
+    hidden = LSTM(50, activation='relu', return_sequences=True)(features)
+    hidden = LSTM(50, activation='relu')(hidden)
+    model = Model(inputs=[window, city], outputs=Dense(1)(hidden))
+    model.compile(optimizer='adam', loss='mean_squared_error')
+    return model
+
+@timed("fit")
+def train_global_lstm(model, dataset, epochs=20):
+    # The dataset is already shuffled across cities
+    model.fit(dataset, epochs=epochs, shuffle=False, verbose=0)
+    return model
+
+@timed("predict")
+def predict_global_lstm(model, x, city_ids, batch_size=8192):
+    """Scaled one-step predictions for many windows of many cities in a few large CPU batches."""
+    return model.predict({'window': x, 'city': city_ids}, batch_size=batch_size, verbose=0)[:, 0]
+
+def evaluate_global_lstm(model, x_test, city_test, y_test, scalers):
+    """Score every city from one batched prediction; returns {city: (predicted, actual, mae, mse, rmse, r2)}."""
+    predicted_scaled = predict_global_lstm(model, x_test, city_test)
+    results = {}
+    for city_id, (city, scaler) in enumerate(scalers.items()):
+        rows = city_test == city_id
+        if not rows.any():
+            continue
+        predicted = scaler.inverse_transform(predicted_scaled[rows].reshape(-1, 1))
+        actual = scaler.inverse_transform(y_test[rows].reshape(-1, 1))
+        mse = mean_squared_error(actual, predicted)
+        results[city] = (predicted, actual, mean_absolute_error(actual, predicted), mse, np.sqrt(mse),
+                         r2_score(actual, predicted))
+    return results
\ No newline at end of file
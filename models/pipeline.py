@@ -0,0 +1,220 @@
+"""Prepare a city's data once and fit the ARIMA, LSTM and Prophet models concurrently.
+
+    inputs = prepare_model_data(SERIES_STORE.get(db, city))
+    for result in run_model_fits(inputs):
+        ...  # results arrive in completion order
+
+Fits run in a long-lived pool of spawned worker processes, so TensorFlow and
+Stan stay imported between runs and a slow LSTM fit does not hold back the
+ARIMA and Prophet results. The fit_* functions are plain functions and can
+also be called in-process (the batch CLI does). fit_global_lstm trains a
+single LSTM across many cities at once.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from multiprocessing import get_context
+
+import pandas as pd
+
+from monitoring.metrics import MetricsRecorder, use_recorder
+
+MODELS = ("arima", "lstm", "prophet")
+LSTM_SEQ_LENGTH = 10
+
+@dataclass
+class ModelInputs:
+    """Model-ready series shared by every fit; built once per run."""
+    city: str
+    train_series: pd.Series
+    test_series: pd.Series
+    # Evening prices (missing days dropped), used to put the forecasts back on the price scale
+    levels: pd.Series = None
+
+    @property
+    def history_levels(self):
+        """Prices before the test window; the last one anchors the level-scale forecasts."""
+        return self.levels[self.levels.index < self.test_series.index[0]]
+
+    @property
+    def train_levels(self):
+        """Prices up to the last training day; the last one anchors forecasts of the days after training."""
+        return self.levels[self.levels.index <= self.train_series.index[-1]]
+
+    def test_levels(self, index=None):
+        """Actual prices on the test window's dates (or on `index`)."""
+        return self.levels.reindex(self.test_series.index if index is None else index)
+
+@dataclass
+class ModelResult:
+    model: str
+    mae: float = None
+    mse: float = None
+    rmse: float = None
+    r2: float = None
+    # Whatever the model's plot function needs, e.g. the forecast or predicted/actual arrays
+    outputs: dict = field(default_factory=dict)
+    error: str = None
+    spans: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    @property
+    def metrics(self):
+        return {"mae": self.mae, "mse": self.mse, "rmse": self.rmse, "r2": self.r2}
+
+def _with_freq(series):
+    series.index.freq = pd.infer_freq(series.index)
+    return series
+
+def prepare_model_data(series, test_days=None):
+    """Differenced Evening series for the models, from a CompactSeries.
+
+    Without `test_days` the models are scored on the window they are fitted
+    on, as the "Model the data" page always has; with it the last `test_days`
+    observations are held out.
+    """
+    differenced = _with_freq(series.differenced_series('Evening'))
+    levels = pd.Series(series.values('Evening'), index=series.index(), name='Evening').dropna()
+    if test_days is None:
+        return ModelInputs(series.city, differenced, differenced, levels)
+    if len(differenced) <= test_days:
+        raise ValueError(f"need more than {test_days} observations, have {len(differenced)}")
+    return ModelInputs(series.city, _with_freq(differenced.iloc[:-test_days].copy()),
+                       _with_freq(differenced.iloc[-test_days:].copy()), levels)
+
+def fit_arima(inputs):
+    from models.arima_model import (train_arima, evaluate_arima, revert_forecast_to_original_scale,
+                                    revert_conf_int_to_original_scale)
+
+    model = train_arima(inputs.train_series)
+    forecast, mae, mse, rmse, r2 = evaluate_arima(model, inputs.test_series)
+    # 80% band, the same width as Prophet's default intervals
+    conf_int = model.get_forecast(steps=len(inputs.test_series)).conf_int(alpha=0.2)
+    # The forecast covers the days after training, so it starts from the last training day's price and is
+    # compared with the actual prices on its own dates (none exist when nothing was held out)
+    anchor = inputs.train_levels
+    return ModelResult("arima", mae, mse, rmse, r2, outputs={
+        "forecast": forecast,
+        "forecast_levels": revert_forecast_to_original_scale(forecast, anchor),
+        "conf_int_levels": revert_conf_int_to_original_scale(forecast, conf_int, anchor),
+        "test_levels": inputs.test_levels(forecast.index),
+    })
+
+def fit_lstm(inputs, seq_length=LSTM_SEQ_LENGTH):
+    from sklearn.preprocessing import MinMaxScaler
+    from models.lstm_model import create_sequences, build_lstm_model, train_lstm, evaluate_lstm
+    from models.reconstruction import one_step_levels
+
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    train_scaled = scaler.fit_transform(inputs.train_series.values.reshape(-1, 1))
+    test_scaled = scaler.transform(inputs.test_series.values.reshape(-1, 1))
+
+    x_train, y_train = create_sequences(train_scaled, seq_length)
+    x_test, y_test = create_sequences(test_scaled, seq_length)
+
+    model = build_lstm_model(seq_length)
+    model = train_lstm(model, x_train, y_train)
+    predicted, actual, mae, mse, rmse, r2 = evaluate_lstm(model, x_test, y_test, scaler)
+
+    # One-step predictions: each day starts from the previous day's actual price
+    dates = inputs.test_series.index[seq_length:]
+    actual_levels = inputs.test_levels(dates).to_numpy()
+    predicted_levels = one_step_levels(predicted[:, 0], actual_levels, actual[:, 0])
+    return ModelResult("lstm", mae, mse, rmse, r2,
+                       outputs={"predicted": predicted, "actual": actual, "seq_length": seq_length,
+                                "predicted_levels": predicted_levels, "actual_levels": actual_levels})
+
+def fit_prophet(inputs):
+    from models.prophet_model import train_prophet, evaluate_prophet, reconstruct_forecast
+
+    train_df = inputs.train_series.reset_index()
+    test_df = inputs.test_series.reset_index()
+    train_df.columns = ['ds', 'y']
+    test_df.columns = ['ds', 'y']
+
+    model = train_prophet(train_df, warm_start_key=(inputs.city, inputs.train_series.name))
+    forecast, forecasted_values, mae, mse, rmse, r2 = evaluate_prophet(model, test_df)
+    level_df = pd.DataFrame({'ds': test_df['ds'], 'y': inputs.test_levels().to_numpy()})
+    bounds = (forecast['yhat_lower'].values, forecast['yhat_upper'].values) if 'yhat_lower' in forecast else (None, None)
+    reconstructed_df = reconstruct_forecast(forecasted_values, inputs.history_levels.to_frame(), level_df, *bounds)
+    return ModelResult("prophet", mae, mse, rmse, r2,
+                       outputs={"test_df": test_df, "forecasted_values": forecasted_values,
+                                "reconstructed_df": reconstructed_df})
+
+FITTERS = {"arima": fit_arima, "lstm": fit_lstm, "prophet": fit_prophet}
+
+def fit_global_lstm(inputs_by_city, seq_length=LSTM_SEQ_LENGTH, epochs=20):
+    """One LSTM with a city embedding fitted on every city's windows; returns {city: ModelResult}.
+
+    `inputs_by_city` maps city -> ModelInputs. Cities too short to yield a
+    single window get an error result instead of failing the whole fit.
+    """
+    from models.lstm_model import (create_multi_city_sequences, make_multi_city_dataset,
+                                   build_global_lstm_model, train_global_lstm, evaluate_global_lstm)
+
+    train = {city: inputs.train_series for city, inputs in inputs_by_city.items()}
+    test = {city: inputs.test_series for city, inputs in inputs_by_city.items()}
+    x_train, city_train, y_train, scalers = create_multi_city_sequences(train, seq_length)
+    x_test, city_test, y_test, _ = create_multi_city_sequences(test, seq_length, scalers=scalers)
+
+    model = build_global_lstm_model(seq_length, len(scalers))
+    model = train_global_lstm(model, make_multi_city_dataset(x_train, city_train, y_train), epochs=epochs)
+    scores = evaluate_global_lstm(model, x_test, city_test, y_test, scalers)
+
+    results = {}
+    for city in inputs_by_city:
+        if city not in scores:
+            results[city] = ModelResult("lstm", error=f"fewer than {seq_length + 1} observations")
+            continue
+        predicted, actual, mae, mse, rmse, r2 = scores[city]
+        results[city] = ModelResult("lstm", mae, mse, rmse, r2,
+                                    outputs={"predicted": predicted, "actual": actual, "seq_length": seq_length})
+    return results
+
+def fit_model(name, inputs):
+    """Run one fit, capturing its timing spans and turning failures into an error result."""
+    recorder = MetricsRecorder()
+    with use_recorder(recorder):
+        try:
+            result = FITTERS[name](inputs)
+        except Exception as e:
+            result = ModelResult(name, error=f"{type(e).__name__}: {e}")
+    result.spans = recorder.spans
+    return result
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=len(MODELS), mp_context=get_context("spawn"))
+        return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def run_model_fits(inputs, models=MODELS):
+    """Fit `models` concurrently in worker processes, yielding each ModelResult as it completes."""
+    try:
+        futures = {_get_pool().submit(fit_model, name, inputs): name for name in models}
+    except BrokenProcessPool:
+        _reset_pool()
+        futures = {_get_pool().submit(fit_model, name, inputs): name for name in models}
+
+    for future in as_completed(futures):
+        try:
+            yield future.result()
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); start a fresh pool next time
+            _reset_pool()
+            yield ModelResult(futures[future], error=f"worker process died: {e}")
@@ -1,14 +1,96 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
 from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from config import MODEL_REGISTRY_DIR, PROPHET_UNCERTAINTY_SAMPLES
+from models.reconstruction import reconstruct_levels
+from models.registry import load_warm_start, save_warm_start
+from monitoring.metrics import MetricsRecorder, get_recorder, timed, use_recorder
 
-def train_prophet(train_df):
-    model = Prophet()
-    model.fit(train_df)
+def warm_start_params(model):
+    """A fitted model's parameters in the form Prophet.fit(init=...) takes."""
+    params = {name: float(model.params[name][0][0]) for name in ('k', 'm', 'sigma_obs')}
+    params.update({name: model.params[name][0].tolist() for name in ('delta', 'beta')})
+    return params
+
+@timed("fit")
+def train_prophet(train_df, warm_start_key=None, uncertainty_samples=PROPHET_UNCERTAINTY_SAMPLES,
+                  registry_dir=MODEL_REGISTRY_DIR):
+    """Fit Prophet, optionally warm-started from the previous fit with the same key.
+
+    `warm_start_key` is a (city, series name) pair; the fitted parameters are
+    saved under it, with the last training day, for the next call. A fit
+    only starts from parameters whose training data ended no later than its
+    own, so a full-history fit never seeds a backtest on a shorter window
+    (which would leak the held-out days into it). Prophet falls back to its
+    default initial values for any parameter whose shape no longer matches
+    (e.g. once enough history has accumulated for yearly seasonality to
+    switch on).
+    `uncertainty_samples` sets how many simulated paths `predict` draws for
+    yhat_lower/yhat_upper: fewer is faster but gives noisier bounds.
+    """
+    model = Prophet(uncertainty_samples=uncertainty_samples)
+    if warm_start_key is None:
+        model.fit(train_df)
+        return model
+
+    city, name = warm_start_key
+    key = f"prophet_{name}"
+    train_end = pd.Timestamp(train_df['ds'].max()).strftime('%Y-%m-%d')
+    saved = load_warm_start(city, key, registry_dir)
+    saved_end = saved.get("train_end") if saved else None
+    if saved_end is not None and saved_end <= train_end:
+        init = {param: np.asarray(value) if isinstance(value, list) else value for param, value in saved["params"].items()}
+        model.fit(train_df, init=init)
+    else:
+        model.fit(train_df)
+    # Keep the parameters of the longest history seen, so backtests do not overwrite the full fit's
+    if saved_end is None or saved_end <= train_end:
+        save_warm_start(city, key, {"train_end": train_end, "params": warm_start_params(model)}, registry_dir)
     return model
 
+def _train_prophet_worker(city, train_df, warm_start_name, uncertainty_samples, registry_dir):
+    key = None if warm_start_name is None else (city, warm_start_name)
+    recorder = MetricsRecorder()
+    with use_recorder(recorder):
+        model = train_prophet(train_df, warm_start_key=key, uncertainty_samples=uncertainty_samples,
+                              registry_dir=registry_dir)
+    # Fitted Prophet objects travel back to the parent in Prophet's own JSON format
+    return model_to_json(model), recorder.spans
+
+def train_prophet_batch(train_dfs, warm_start_name=None, max_workers=None,
+                        uncertainty_samples=PROPHET_UNCERTAINTY_SAMPLES, registry_dir=MODEL_REGISTRY_DIR):
+    """Fit one Prophet model per city in parallel worker processes.
+
+    `train_dfs` maps city -> (ds, y) frame. With `warm_start_name` each city
+    is warm-started under (city, warm_start_name). Returns {city: model}; a
+    city whose fit failed maps to the exception instead, so one bad series
+    does not lose every other city's fit. The workers' timing spans are
+    added to the caller's recorder.
+    """
+    if not train_dfs:
+        return {}
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=get_context("spawn")) as pool:
+        futures = {
+            city: pool.submit(_train_prophet_worker, city, train_df, warm_start_name, uncertainty_samples, registry_dir)
+            for city, train_df in train_dfs.items()
+        }
+        models = {}
+        for city, future in futures.items():
+            try:
+                model_json, spans = future.result()
+            except Exception as e:
+                models[city] = e
+                continue
+            get_recorder().extend(spans)
+            models[city] = model_from_json(model_json)
+        return models
+
+@timed("predict")
 def evaluate_prophet(model, test_df):
     future = pd.DataFrame({'ds': test_df['ds']})
     forecast = model.predict(future)
@@ -19,6 +101,7 @@ def evaluate_prophet(model, test_df):
     r2 = r2_score(test_df['y'], forecasted_values)
     return forecast, forecasted_values, mae, mse, rmse, r2
 
+@timed("render")
 def plot_prophet_results(test_df, forecasted_values):
     fig, ax = plt.subplots(figsize=(12, 6))
     ax.plot(test_df['ds'], test_df['y'], label="Actual Test Data", color='green')
@@ -29,23 +112,28 @@ def plot_prophet_results(test_df, forecasted_values):
     ax.legend()
     return fig
 
-def reconstruct_forecast(forecasted_values, train_data, test_df):
-    last_original_value = train_data['Evening'].iloc[-1]
-    reconstructed_forecast = [last_original_value]
-    for diff_value in forecasted_values:
-        next_value = reconstructed_forecast[-1] + diff_value
-        reconstructed_forecast.append(next_value)
-    reconstructed_forecast = reconstructed_forecast[1:]
-    return pd.DataFrame({
+def reconstruct_forecast(forecasted_values, train_data, test_df, lower=None, upper=None):
+    """Level-scale forecast; `test_df` holds the actual prices, and lower/upper the differenced bounds if any."""
+    predicted, predicted_lower, predicted_upper = reconstruct_levels(forecasted_values, train_data['Evening'].iloc[-1],
+                                                                     lower, upper)
+    reconstructed_df = pd.DataFrame({
         'ds': test_df['ds'],
         'actual': test_df['y'].values,
-        'predicted': reconstructed_forecast
+        'predicted': predicted
     })
+    if predicted_lower is not None:
+        reconstructed_df['lower'] = predicted_lower
+        reconstructed_df['upper'] = predicted_upper
+    return reconstructed_df
 
+@timed("render")
 def plot_reconstructed_forecast(reconstructed_df):
     fig, ax = plt.subplots(figsize=(12, 6))
     ax.plot(reconstructed_df['ds'], reconstructed_df['actual'], label="Actual Data", color='green')
     ax.plot(reconstructed_df['ds'], reconstructed_df['predicted'], label="Reconstructed Predicted Data", color='red')
+    if 'lower' in reconstructed_df:
+        ax.fill_between(reconstructed_df['ds'], reconstructed_df['lower'], reconstructed_df['upper'],
+                        color='red', alpha=0.2, label="Forecast Interval")
     ax.set_title("Actual vs Predicted - Reconstructed")
     ax.set_xlabel("Date")
     ax.set_ylabel("Evening Gold Prices")
@@ -0,0 +1,35 @@
+"""Rebuild Evening price levels from predictions of Evening_Differenced_1.
+
+The models predict daily price changes. A multi-step level forecast is the
+last known price plus the running total of the predicted changes, i.e. one
+cumsum along the last axis. An (n_cities, horizon) array therefore costs the
+same pass as a single city.
+"""
+import numpy as np
+
+def reconstruct_levels(differences, last_level, lower=None, upper=None):
+    """Levels from multi-step difference forecasts, with optional interval bounds.
+
+    `last_level` is the price on the day before the first forecast day
+    (one per row for 2-D input). Bounds are carried over assuming independent
+    errors from step to step: the half-widths of the difference intervals add
+    in quadrature, so the level band widens with the horizon. Returns
+    (levels, lower, upper); the bounds are None when not given.
+    """
+    differences = np.asarray(differences, dtype=np.float64)
+    levels = np.asarray(last_level, dtype=np.float64)[..., None] + np.cumsum(differences, axis=-1)
+    if lower is None or upper is None:
+        return levels, None, None
+
+    below = np.sqrt(np.cumsum((differences - np.asarray(lower, dtype=np.float64)) ** 2, axis=-1))
+    above = np.sqrt(np.cumsum((np.asarray(upper, dtype=np.float64) - differences) ** 2, axis=-1))
+    return levels, levels - below, levels + above
+
+def one_step_levels(differences, actual_levels, actual_differences):
+    """Levels from one-step-ahead difference predictions (e.g. the LSTM's).
+
+    Each prediction starts from the previous day's actual price, which is
+    today's actual level minus today's actual change, so nothing accumulates.
+    """
+    return (np.asarray(actual_levels, dtype=np.float64) - np.asarray(actual_differences, dtype=np.float64)
+            + np.asarray(differences, dtype=np.float64))
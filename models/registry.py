@@ -0,0 +1,112 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from config import MODEL_REGISTRY_DIR
+
+FORECAST_COLUMNS = ['ds', 'yhat', 'yhat_lower', 'yhat_upper']
+
+def _city_dir(city, registry_dir):
+    name = city.lower()
+    # City names come from API query strings; never let one point outside the registry
+    if not name or name in (os.curdir, os.pardir) or os.sep in name or (os.altsep and os.altsep in name):
+        raise ValueError(f"invalid city name {city!r}")
+    return os.path.join(registry_dir, name)
+
+def _manifest_path(city, registry_dir):
+    return os.path.join(_city_dir(city, registry_dir), "manifest.json")
+
+def _write_atomic(path, write):
+    # Per-writer temp name, so concurrent writers of the same file cannot clobber each other's temp file
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+def register_forecast(city, forecast, model_name="prophet", registry_dir=MODEL_REGISTRY_DIR):
+    """Publish a forecast frame (ds, yhat, yhat_lower, yhat_upper) as the city's current version."""
+    city_dir = _city_dir(city, registry_dir)
+    os.makedirs(city_dir, exist_ok=True)
+
+    version = time.time_ns()
+    forecast_file = f"forecast_{version}.csv"
+    frame = forecast[FORECAST_COLUMNS].copy()
+    frame['ds'] = pd.to_datetime(frame['ds']).dt.strftime('%Y-%m-%d')
+    _write_atomic(os.path.join(city_dir, forecast_file), lambda p: frame.to_csv(p, index=False))
+
+    previous = get_entry(city, registry_dir)
+    manifest = {
+        "city": city,
+        "model": model_name,
+        "version": version,
+        "forecast_file": forecast_file,
+        # Kept on disk for one more generation, for readers that loaded the previous manifest
+        "previous_forecast_file": previous["forecast_file"] if previous else None,
+        "start_date": frame['ds'].iloc[0] if len(frame) else None,
+        "end_date": frame['ds'].iloc[-1] if len(frame) else None,
+    }
+
+    # The manifest is swapped in last, so readers never see a version whose forecast file is missing
+    def write_manifest(path):
+        with open(path, "w") as f:
+            json.dump(manifest, f, indent=2)
+    _write_atomic(_manifest_path(city, registry_dir), write_manifest)
+
+    stale = previous.get("previous_forecast_file") if previous else None
+    if stale and stale not in (forecast_file, manifest["previous_forecast_file"]):
+        try:
+            os.remove(os.path.join(city_dir, stale))
+        except OSError:
+            pass
+    return manifest
+
+def _warm_start_path(city, name, registry_dir):
+    return os.path.join(_city_dir(city, registry_dir), f"warm_start_{name.lower()}.json")
+
+def save_warm_start(city, name, params, registry_dir=MODEL_REGISTRY_DIR):
+    """Keep a model's fitted parameters for `name` (e.g. "prophet_evening") so the next fit can start from them."""
+    os.makedirs(_city_dir(city, registry_dir), exist_ok=True)
+
+    def write(path):
+        with open(path, "w") as f:
+            json.dump(params, f)
+    _write_atomic(_warm_start_path(city, name, registry_dir), write)
+
+def load_warm_start(city, name, registry_dir=MODEL_REGISTRY_DIR):
+    """Parameters saved by save_warm_start, or None."""
+    try:
+        with open(_warm_start_path(city, name, registry_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def get_entry(city, registry_dir=MODEL_REGISTRY_DIR):
+    """Return the city's current manifest, or None if nothing has been registered."""
+    try:
+        with open(_manifest_path(city, registry_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def manifest_mtime(city, registry_dir=MODEL_REGISTRY_DIR):
+    """Cheap change check: modification time of the city's manifest (0 if absent)."""
+    try:
+        return os.stat(_manifest_path(city, registry_dir)).st_mtime_ns
+    except (OSError, ValueError):
+        return 0
+
+def load_forecast(city, registry_dir=MODEL_REGISTRY_DIR):
+    """Return (manifest, forecast frame) for the city's current version, or (None, None)."""
+    for attempt in range(2):
+        entry = get_entry(city, registry_dir)
+        if entry is None:
+            return None, None
+        try:
+            forecast = pd.read_csv(os.path.join(_city_dir(city, registry_dir), entry["forecast_file"]), parse_dates=['ds'])
+            return entry, forecast
+        except FileNotFoundError:
+            # Two newer versions were published between reading the manifest and the file; read the manifest again
+            if attempt:
+                raise
@@ -0,0 +1,244 @@
+"""Lightweight per-stage timing and memory spans.
+
+    with span("preprocess", city="Coimbatore"):
+        data = preprocess_data(data)
+
+    @timed("fit")
+    def train_arima(...): ...
+
+Each span records wall time, CPU time and peak RSS. By default that is the
+process-lifetime peak (peak_rss_scope "process"), read without touching any
+kernel state. A process that owns its memory accounting, such as the benchmark
+runner, can call `enable_span_peaks()` to get the peak reached while each span
+ran (scope "span"): on Linux that resets the kernel's high-water mark (VmHWM),
+which also resets ru_maxrss and any other profiler's view of the peak, so it
+is never on in the app or the API.
+Spans go to the recorder active in the current context (see `use_recorder`),
+or to a process-wide default, and can be exported as JSON or Prometheus text.
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class _SpanPeaks:
+    """Per-span peak RSS on top of the single, process-wide, resettable VmHWM.
+
+    Resetting sets the high-water mark to the current RSS, so a span's peak is
+    VmHWM when it ends. Before each reset the mark so far is folded into every
+    span still open (nested or in other threads), so starting a span never
+    loses an enclosing span's peak. The /proc files stay open (reopened after
+    a fork): spans wrap small, frequent calls, and open/read/close per span
+    costs ~6x more than a pread.
+    """
+
+    def __init__(self):
+        self._open = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._status = self._clear_refs = None
+        self.enabled = False
+        self.supported = None
+
+    def _ensure_files(self):
+        if self._pid != os.getpid():
+            self._status = os.open("/proc/self/status", os.O_RDONLY)
+            self._clear_refs = os.open("/proc/self/clear_refs", os.O_WRONLY)
+            self._pid = os.getpid()
+
+    def _high_water_mark(self):
+        status = os.pread(self._status, 8192, 0)
+        at = status.index(b"VmHWM:")
+        return int(status[at + 6:status.index(b"kB", at)]) * 1024
+
+    def start(self):
+        """Begin a span; returns a token for `stop`, or None if the high-water mark is not reset per span."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            if self.supported is False:
+                return None
+            try:
+                self._ensure_files()
+                if self._open:
+                    peak = self._high_water_mark()
+                    for token in self._open:
+                        self._open[token] = max(self._open[token], peak)
+                os.write(self._clear_refs, b"5")
+                self.supported = True
+            except (OSError, ValueError):
+                self.supported = False
+                return None
+            token = object()
+            self._open[token] = 0
+            return token
+
+    def stop(self, token):
+        with self._lock:
+            return max(self._open.pop(token), self._high_water_mark())
+
+_span_peaks = _SpanPeaks()
+
+def enable_span_peaks(enabled=True):
+    """Report each span's own peak RSS by resetting the process-wide VmHWM as spans start.
+
+    Only for processes whose peak RSS nobody else reads: after a reset,
+    `peak_rss_bytes()` and external profilers see the peak since the last span
+    started, not since the process did.
+    """
+    _span_peaks.enabled = enabled
+
+class MetricsRecorder:
+    """Thread-safe collection of finished spans."""
+
+    def __init__(self):
+        self._spans = []
+        self._lock = threading.Lock()
+
+    def record(self, stage, wall_seconds, cpu_seconds, peak_rss, labels, peak_rss_scope="span"):
+        entry = {
+            "stage": stage,
+            "wall_seconds": wall_seconds,
+            "cpu_seconds": cpu_seconds,
+            "peak_rss_bytes": peak_rss,
+            # "span": peak while the span ran; "process": process-lifetime peak (no resettable high-water mark)
+            "peak_rss_scope": peak_rss_scope,
+            "labels": labels,
+            "ended_at": time.time(),
+        }
+        with self._lock:
+            self._spans.append(entry)
+
+    def extend(self, spans):
+        """Merge spans collected elsewhere, e.g. returned from a worker process."""
+        with self._lock:
+            self._spans.extend(spans)
+
+    @property
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def summary(self):
+        """Aggregate spans by stage: calls, total wall/CPU seconds and the highest peak RSS (and its scope)."""
+        totals = {}
+        for entry in self.spans:
+            stage = totals.setdefault(entry["stage"], {
+                "calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_bytes": None, "peak_rss_scope": "span",
+            })
+            stage["calls"] += 1
+            stage["wall_seconds"] += entry["wall_seconds"]
+            stage["cpu_seconds"] += entry["cpu_seconds"]
+            if entry["peak_rss_bytes"] is not None:
+                stage["peak_rss_bytes"] = max(stage["peak_rss_bytes"] or 0, entry["peak_rss_bytes"])
+            if entry.get("peak_rss_scope", "process") == "process":
+                stage["peak_rss_scope"] = "process"
+        return totals
+
+    def to_json(self):
+        return json.dumps({"summary": self.summary(), "spans": self.spans}, indent=2, default=str)
+
+    def to_prometheus(self, prefix="gtm"):
+        """Render per-stage, per-label totals in the Prometheus text exposition format."""
+        series = {}
+        for entry in self.spans:
+            labels = {"stage": entry["stage"], "rss_scope": entry.get("peak_rss_scope", "process"),
+                      **{k: str(v) for k, v in entry["labels"].items()}}
+            key = tuple(sorted(labels.items()))
+            totals = series.setdefault(key, {"calls": 0, "wall": 0.0, "cpu": 0.0, "rss": 0})
+            totals["calls"] += 1
+            totals["wall"] += entry["wall_seconds"]
+            totals["cpu"] += entry["cpu_seconds"]
+            totals["rss"] = max(totals["rss"], entry["peak_rss_bytes"] or 0)
+
+        metrics = [
+            ("stage_calls_total", "counter", "Number of completed spans.", "calls"),
+            ("stage_wall_seconds_total", "counter", "Wall-clock seconds spent in the stage.", "wall"),
+            ("stage_cpu_seconds_total", "counter", "Process CPU seconds spent in the stage.", "cpu"),
+            ("stage_peak_rss_bytes", "gauge", "Peak RSS while the stage ran (rss_scope=\"process\": process-lifetime peak).", "rss"),
+        ]
+        lines = []
+        for name, kind, help_text, field in metrics:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for key, totals in series.items():
+                label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+                lines.append(f"{prefix}_{name}{{{label_text}}} {totals[field]}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Write the spans to `path`; `.prom`/`.txt` gives Prometheus text, anything else JSON."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+_default_recorder = MetricsRecorder()
+_current_recorder = contextvars.ContextVar("gtm_metrics_recorder", default=None)
+
+def get_recorder():
+    """Recorder for the current context, falling back to the process-wide one."""
+    return _current_recorder.get() or _default_recorder
+
+@contextmanager
+def use_recorder(recorder):
+    """Route spans in this context (e.g. one Streamlit run) to `recorder`."""
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+@contextmanager
+def span(stage, **labels):
+    """Time the enclosed block as `stage`; recorded even if the block raises."""
+    peak_token = _span_peaks.start()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        wall_seconds = time.perf_counter() - wall_start
+        cpu_seconds = time.process_time() - cpu_start
+        if peak_token is not None:
+            peak_rss, scope = _span_peaks.stop(peak_token), "span"
+        else:
+            peak_rss, scope = peak_rss_bytes(), "process"
+        get_recorder().record(stage, wall_seconds, cpu_seconds, peak_rss, labels, peak_rss_scope=scope)
+
+def timed(stage):
+    """Decorator form of `span`, labelled with the wrapped function's name."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage, name=fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
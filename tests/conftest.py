@@ -0,0 +1,18 @@
+import pandas as pd
+import pytest
+
+from data_pipeline.date_codec import epoch_day, format_dates
+
+def daily_frame(start, prices, morning=None):
+    """Scraper-shaped frame: 'd-Mon-yy' dates from `start` on consecutive days, string prices."""
+    days = epoch_day(pd.Timestamp(start)) + pd.RangeIndex(len(prices)).to_numpy()
+    prices = [str(price) for price in prices]
+    return pd.DataFrame({
+        'Date': format_dates(days),
+        'Morning': prices if morning is None else [str(price) for price in morning],
+        'Evening': prices,
+    })
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "gold_prices.db")
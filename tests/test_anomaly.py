@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from data_pipeline.anomaly import WARMUP_CHANGES, Z_THRESHOLD, DetectorState, scan, update_state
+from data_pipeline.date_codec import epoch_day
+from database.db_handler import GoldPriceDB
+from tests.conftest import daily_frame
+
+def random_walk(days, seed=0):
+    return np.round(8000 + np.cumsum(np.random.default_rng(seed).normal(0, 20, days)), 2)
+
+def with_jump(prices, at, size=600):
+    # The price moves `size` up on row `at` and stays there
+    prices = prices.copy()
+    prices[at:] += size
+    return prices
+
+def test_jump_after_warm_up_is_flagged():
+    # Row 0 seeds the state; row i is the i-th change, seen after i - 1 earlier ones
+    at = WARMUP_CHANGES + 10
+    _, events = scan(None, daily_frame('2024-01-01', with_jump(random_walk(60), at)))
+    assert events['Date'].tolist() == [(pd.Timestamp('2024-01-01') + pd.Timedelta(days=at)).strftime('%Y-%m-%d')]
+    assert events['zscore'].iloc[0] > Z_THRESHOLD
+
+def test_no_events_during_warm_up():
+    state, events = scan(None, daily_frame('2024-01-01', with_jump(random_walk(60), WARMUP_CHANGES)))
+    assert events.empty
+    assert state.n == 59
+
+def test_late_backfills_are_skipped():
+    state, _ = scan(None, daily_frame('2024-01-01', random_walk(40)))
+    before = state.to_dict()
+    state, event = update_state(state, epoch_day(pd.Timestamp('2024-01-15')), 20000.0)
+    assert event is None
+    assert state.to_dict() == before
+
+def test_saved_state_resumes_like_one_scan(db_path):
+    rows = daily_frame('2024-01-01', with_jump(with_jump(random_walk(120), 50), 90, size=-700))
+    continuous_state, continuous_events = scan(None, rows)
+    assert len(continuous_events) == 2
+
+    db = GoldPriceDB(db_path)
+    try:
+        state, events = scan(None, rows.iloc[:70])
+        db.save_anomalies('Coimbatore', state.to_dict(), events)
+        state, events = scan(DetectorState(**db.get_anomaly_state('Coimbatore')), rows.iloc[70:])
+        db.save_anomalies('Coimbatore', state.to_dict(), events)
+
+        assert state == continuous_state
+        stored = db.get_anomalies('Coimbatore').drop(columns='detected_at')
+        pd.testing.assert_frame_equal(stored, continuous_events, check_dtype=False)
+    finally:
+        db.close()
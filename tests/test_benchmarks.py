@@ -0,0 +1,35 @@
+from benchmarks.run_benchmarks import _scaling_anchor, check_scaling, compare
+
+BASELINES = {"case": {"seconds": 0.004, "peak_alloc_bytes": 10 * 2**20}}
+
+def test_small_absolute_changes_are_noise():
+    # +75% on a 4 ms case is 3 ms: under the floor
+    status, regressions = compare("case", {"seconds": 0.007, "peak_alloc_bytes": 10 * 2**20}, BASELINES, 0.5)
+    assert (status, regressions) == ("ok", [])
+
+def test_large_changes_regress():
+    status, regressions = compare("case", {"seconds": 0.020, "peak_alloc_bytes": 20 * 2**20}, BASELINES, 0.5)
+    assert status == "REGRESSION"
+    assert [message.split()[0] for message in regressions] == ["seconds", "peak_alloc_bytes"]
+
+def test_unknown_cases_are_new():
+    assert compare("other", {"seconds": 1.0, "peak_alloc_bytes": 0}, BASELINES, 0.5) == ("new", [])
+
+def test_linear_growth_scales():
+    smaller = {"seconds": 0.1, "peak_alloc_bytes": 10 * 2**20}
+    assert check_scaling(smaller, {"seconds": 0.4, "peak_alloc_bytes": 40 * 2**20}, 4, 0.5) == []
+
+def test_superlinear_growth_regresses_without_a_baseline():
+    # 4x the input taking 16x the time: quadratic where linear is expected
+    smaller = {"seconds": 0.1, "peak_alloc_bytes": 10 * 2**20}
+    regressions = check_scaling(smaller, {"seconds": 1.6, "peak_alloc_bytes": 40 * 2**20}, 4, 0.5)
+    assert [message.split()[0] for message in regressions] == ["seconds"]
+
+def test_scaling_is_measured_from_the_largest_baselined_size():
+    anchors = {"db_read": [(1, 1, "a"), (1, 10, "b"), (5, 1, "c"), (5, 10, "d")],
+               "cross_city": [(5, 10, "e")]}
+    assert _scaling_anchor("db_read", 40, 300, anchors) == ("d", 8 * 30)
+    assert _scaling_anchor("db_read", 10, 1, anchors) == ("c", 2)
+    # Correlating every pair of cities is quadratic in the number of cities
+    assert _scaling_anchor("cross_city", 5, 100, anchors) == ("e", 100)
+    assert _scaling_anchor("preprocess_data", 10, 1, anchors) is None
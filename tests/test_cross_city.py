@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+
+from eda.cross_city import MIN_OVERLAP, correlation_matrix, lead_lag
+
+def test_correlation_matrix_matches_pandas_on_gappy_rows():
+    rng = np.random.default_rng(0)
+    common = np.cumsum(rng.normal(size=400))
+    values = np.stack([common + rng.normal(scale=scale, size=400) for scale in (0.5, 2.0, 5.0, 1.0)])
+    values[0, 50:120] = np.nan
+    values[1, rng.choice(400, 150, replace=False)] = np.nan
+    values[2, :300] = np.nan
+    # Row 3 shares fewer than MIN_OVERLAP days with row 2
+    values[3, 280:] = np.nan
+
+    expected = pd.DataFrame(values.T).corr(min_periods=MIN_OVERLAP).to_numpy()
+    assert np.isnan(expected[2, 3])
+    np.testing.assert_allclose(correlation_matrix(values), expected, rtol=1e-9, atol=1e-12)
+
+def test_lead_lag_peaks_at_the_lead():
+    rng = np.random.default_rng(1)
+    reference = rng.normal(size=500)
+    reference[rng.choice(500, 40, replace=False)] = np.nan
+    k = 3
+    # Row 0 moves k days before the reference, row 1 k days after it
+    leader = np.full(500, np.nan)
+    leader[:-k] = reference[k:]
+    follower = np.full(500, np.nan)
+    follower[k:] = reference[:-k]
+
+    correlations, lags = lead_lag(np.stack([leader, follower]), reference)
+    assert lags[np.nanargmax(correlations, axis=1)].tolist() == [k, -k]
+    np.testing.assert_allclose(np.nanmax(correlations, axis=1), 1.0, atol=0.05)
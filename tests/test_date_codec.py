@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_pipeline.date_codec import INVALID_DAY, epoch_day, format_dates, parse_dates, to_datetime64
+
+# The two-digit years %y reads: 69-99 are 19yy, 00-68 are 20yy
+DAYS = pd.date_range('1969-01-01', '2068-12-31')
+
+def test_round_trip_matches_pandas():
+    days = epoch_day(DAYS[0]) + np.arange(len(DAYS))
+    strings = pd.Series(format_dates(days))
+    expected = pd.to_datetime(strings, format='%d-%b-%y')
+
+    assert strings.iloc[0] == '1-Jan-69'
+    pd.testing.assert_index_equal(pd.DatetimeIndex(expected), DAYS, check_names=False)
+    np.testing.assert_array_equal(parse_dates(strings), days)
+    np.testing.assert_array_equal(to_datetime64(parse_dates(strings)), expected.to_numpy())
+
+def test_case_and_padding_are_tolerated():
+    values = ['01-aug-21', ' 1-AUG-21 ', '1-Aug-2021']
+    assert parse_dates(values).tolist() == [epoch_day(pd.Timestamp('2021-08-01'))] * 3
+
+INVALID = ['', 'today', '31-Feb-24', '1-Foo-24', '1-Aug', '1/8/21', None, np.nan]
+
+def test_invalid_values_are_coerced():
+    values = ['1-Aug-21'] + INVALID
+    days = parse_dates(values, errors='coerce')
+    assert days[0] == epoch_day(pd.Timestamp('2021-08-01'))
+    assert (days[1:] == INVALID_DAY).all()
+    assert pd.isna(to_datetime64(days)[1:]).all()
+    # pandas agrees, except that it reads "today" as the current time even with a format
+    strings = pd.Series([value for value in values[1:] if value != 'today'])
+    assert pd.to_datetime(strings, format='%d-%b-%y', errors='coerce').isna().all()
+
+@pytest.mark.parametrize('value', INVALID)
+def test_invalid_values_raise(value):
+    with pytest.raises(ValueError):
+        parse_dates(['1-Aug-21', value])
@@ -0,0 +1,111 @@
+import multiprocessing
+import sqlite3
+
+from database.db_handler import GoldPriceDB
+from tests.conftest import daily_frame
+
+def make_legacy_db(path):
+    """A database in the one-table-per-city layout, with the oddities real ones have."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE coimbatore_prices (Date TEXT, Morning TEXT, Evening TEXT);")
+    rows = [(f"{day}-Mar-25", str(8000 + day), str(8000 + day)) for day in range(1, 11)]
+    rows += [("5-Mar-25", "8105", "8105"),   # re-scraped day: the later row wins
+             ("today", "8200", "8200")]      # unparseable date
+    conn.executemany("INSERT INTO coimbatore_prices VALUES (?, ?, ?);", rows)
+    conn.execute("CREATE TABLE chennai_prices (Date TEXT, Morning TEXT, Evening TEXT);")
+    conn.executemany("INSERT INTO chennai_prices VALUES (?, ?, ?);",
+                     [(f"{day}-Apr-25", "9000", "9010") for day in range(1, 6)])
+    conn.execute("CREATE TABLE coimbatore_quarantine (Date TEXT, Morning TEXT, Evening TEXT, reason TEXT, quarantined_at TEXT);")
+    conn.execute("INSERT INTO coimbatore_quarantine VALUES ('11-Mar-25', '16000', '8010', 'jump', '2025-03-12T00:00:00');")
+    conn.execute("CREATE TABLE coimbatore_rollups (period TEXT, period_start INTEGER);")
+    conn.execute("CREATE TABLE anomaly_state (city TEXT PRIMARY KEY, last_day INTEGER, last_price REAL, mean REAL, var REAL, n INTEGER);")
+    conn.commit()
+    conn.close()
+
+def tables(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table';")}
+    finally:
+        conn.close()
+
+def test_legacy_migration_keeps_every_row(db_path):
+    make_legacy_db(db_path)
+    db = GoldPriceDB(db_path)
+
+    assert not {'coimbatore_prices', 'chennai_prices', 'coimbatore_quarantine', 'coimbatore_rollups'} & tables(db_path)
+    assert db.cities() == ['chennai', 'coimbatore']
+    assert db.count_rows('Coimbatore') == 10
+    assert db.count_rows('Chennai') == 5
+
+    data = db.get_all_data('Coimbatore')
+    assert data.loc[data['Date'] == '5-Mar-25', 'Evening'].tolist() == [8105.0]
+    quarantine = db.get_quarantine('Coimbatore')
+    assert sorted(quarantine['reason']) == ['bad_date', 'jump']
+
+    monthly = db.get_rollups('Coimbatore', 'month')
+    assert monthly['Evening_count'].tolist() == [10]
+    assert monthly['Evening_max'].tolist() == [8105.0]
+    assert db.get_anomaly_state('Coimbatore') is None
+    db.close()
+
+def test_reopening_a_migrated_db_changes_nothing(db_path):
+    make_legacy_db(db_path)
+    GoldPriceDB(db_path).close()
+    db = GoldPriceDB(db_path)
+    assert db.count_rows('Coimbatore') == 10
+    assert len(db.get_quarantine('Coimbatore')) == 2
+    db.close()
+
+def _open_and_count(path, queue):
+    try:
+        db = GoldPriceDB(path)
+        queue.put((db.count_rows('Coimbatore'), db.count_rows('Chennai'), len(db.get_quarantine('Coimbatore'))))
+        db.close()
+    except Exception as e:
+        queue.put(repr(e))
+
+def test_concurrent_opens_migrate_once(db_path):
+    make_legacy_db(db_path)
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    workers = [context.Process(target=_open_and_count, args=(db_path, queue)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    results = [queue.get(timeout=120) for _ in workers]
+    for worker in workers:
+        worker.join()
+    assert results == [(10, 5, 2)] * 4
+
+def test_update_replaces_stored_days_and_rebuilds_rollups(db_path):
+    db = GoldPriceDB(db_path)
+    db.update_data('Coimbatore', daily_frame('2025-03-01', [8000, 8010, 8020]))
+    version = db.data_version('Coimbatore')
+    db.update_data('Coimbatore', daily_frame('2025-03-03', [7000, 7010]))
+
+    assert db.count_rows('Coimbatore') == 4
+    assert db.data_version('Coimbatore') == version + 1
+    monthly = db.get_rollups('Coimbatore', 'month')
+    assert monthly['Evening_count'].tolist() == [4]
+    assert monthly['Evening_low'].tolist() == [7000.0]
+    assert monthly['Evening_close'].tolist() == [7010.0]
+    db.close()
+
+def test_bulk_reads_and_writes(db_path):
+    db = GoldPriceDB(db_path)
+    db.update_cities({'A': daily_frame('2025-01-01', [1, 2, 3]), 'B': daily_frame('2025-01-02', [4, 5])})
+    data = db.get_cities_data(['b', 'A'])
+    assert data.groupby('City').size().to_dict() == {'a': 3, 'b': 2}
+    arrays = db.get_price_arrays(['A', 'missing'])
+    assert arrays['a'][1]['Evening'].tolist() == [1.0, 2.0, 3.0]
+    assert arrays['missing'][0].size == 0
+    assert db.get_latest_date('missing') is None
+    db.close()
+
+def test_city_names_are_bound_parameters(db_path):
+    db = GoldPriceDB(db_path)
+    city = "x'; DROP TABLE prices; --"
+    db.update_data(city, daily_frame('2025-01-01', [1]))
+    assert db.count_rows(city) == 1
+    assert 'prices' in tables(db_path)
+    db.close()
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from monitoring.metrics import MetricsRecorder, _span_peaks, enable_span_peaks, peak_rss_bytes, span, use_recorder
+
+MIB = 2**20
+
+def by_stage(recorder):
+    return {entry["stage"]: entry for entry in recorder.spans}
+
+@pytest.fixture
+def span_peaks():
+    enable_span_peaks()
+    yield
+    enable_span_peaks(False)
+
+def test_span_peaks_are_per_span(span_peaks):
+    recorder = MetricsRecorder()
+    with use_recorder(recorder):
+        with span("outer"):
+            with span("large"):
+                block = np.ones(200 * MIB // 8)
+                del block
+            with span("small"):
+                np.ones(1000).sum()
+    spans = by_stage(recorder)
+    if _span_peaks.supported is False:
+        pytest.skip("no resettable RSS high-water mark on this platform")
+
+    assert {entry["peak_rss_scope"] for entry in spans.values()} == {"span"}
+    # The 200 MiB block was freed before "small" started, so only "large" and its enclosing span saw it
+    assert spans["large"]["peak_rss_bytes"] - spans["small"]["peak_rss_bytes"] > 150 * MIB
+    assert spans["outer"]["peak_rss_bytes"] >= spans["large"]["peak_rss_bytes"]
+
+def test_unsupported_platforms_report_the_process_peak(monkeypatch):
+    monkeypatch.setattr(_span_peaks, "supported", False)
+    recorder = MetricsRecorder()
+    with use_recorder(recorder), span("fit"):
+        pass
+    assert recorder.spans[0]["peak_rss_scope"] == "process"
+    assert recorder.summary()["fit"]["peak_rss_scope"] == "process"
+    assert 'rss_scope="process"' in recorder.to_prometheus()
+
+def test_default_spans_leave_the_process_peak_alone():
+    np.ones(100 * MIB // 8).sum()
+    before = peak_rss_bytes()
+    recorder = MetricsRecorder()
+    with use_recorder(recorder), span("fit"):
+        pass
+    # Resetting VmHWM would also pull ru_maxrss down to the current RSS
+    assert peak_rss_bytes() >= before
+    assert recorder.spans[0]["peak_rss_scope"] == "process"
+    assert recorder.spans[0]["peak_rss_bytes"] >= before
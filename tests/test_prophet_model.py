@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("prophet")
+
+from models import prophet_model
+from models.prophet_model import train_prophet
+
+class RecordingProphet:
+    """Stands in for Prophet: records the init it was fitted from, and 'learns' the mean of y."""
+    fits = []
+
+    def __init__(self, uncertainty_samples=None):
+        self.params = {}
+
+    def fit(self, df, init=None):
+        RecordingProphet.fits.append(init)
+        level = float(df['y'].mean())
+        self.params = {name: np.array([value]) for name, value in
+                       {'k': [level], 'm': [0.0], 'sigma_obs': [1.0], 'delta': [0.0, 0.0], 'beta': [0.0]}.items()}
+        return self
+
+@pytest.fixture
+def fits(monkeypatch):
+    RecordingProphet.fits = []
+    monkeypatch.setattr(prophet_model, "Prophet", RecordingProphet)
+    return RecordingProphet.fits
+
+def train_frame(days, level):
+    return pd.DataFrame({'ds': pd.date_range('2024-01-01', periods=days), 'y': np.full(days, float(level))})
+
+def test_backtest_is_not_seeded_from_a_longer_fit(tmp_path, fits):
+    key = ("Coimbatore", "Evening_Differenced_1")
+    train_prophet(train_frame(100, 5.0), warm_start_key=key, registry_dir=str(tmp_path))
+    # A backtest on the first 70 days must not start from parameters fitted on days 71-100
+    train_prophet(train_frame(70, 3.0), warm_start_key=key, registry_dir=str(tmp_path))
+    # The next full fit still starts from the longest history, not from the backtest
+    train_prophet(train_frame(101, 5.0), warm_start_key=key, registry_dir=str(tmp_path))
+
+    assert fits[0] is None
+    assert fits[1] is None
+    assert fits[2]['k'] == 5.0
+
+def test_fits_without_a_key_start_cold(tmp_path, fits):
+    train_prophet(train_frame(30, 1.0), registry_dir=str(tmp_path))
+    train_prophet(train_frame(30, 1.0), registry_dir=str(tmp_path))
+    assert fits == [None, None]
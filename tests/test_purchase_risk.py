@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from models.baseline_models import TRAINERS, train_holt_winters
+from models.purchase_risk import forecast_purchase_risk, simulate_bootstrap_paths, simulate_residual_paths
+
+def test_baselines_keep_their_one_step_errors():
+    rng = np.random.default_rng(0)
+    prices = 8000 + np.cumsum(rng.normal(0, 20, size=(3, 200)), axis=1)
+    for train in TRAINERS.values():
+        model = train(prices)
+        assert model.residuals.shape[0] == 3
+        np.testing.assert_allclose(model.residual_std, np.sqrt(np.mean(model.residuals ** 2, axis=1)))
+
+def test_block_bootstrap_draws_runs_of_consecutive_residuals():
+    residuals = np.arange(100, dtype=np.float64)
+    horizons = np.arange(1, 15)
+    paths = simulate_residual_paths(np.zeros(14), horizons, residuals, n_paths=50, seed=1, block_length=7)
+    errors = np.diff(np.concatenate([np.zeros((50, 1)), paths], axis=1), axis=1)
+
+    # Centred residuals, one consecutive run per 7-day block
+    assert np.isin(errors, residuals - residuals.mean()).all()
+    for block in (errors[:, :7], errors[:, 7:]):
+        assert (np.diff(block, axis=1) == 1).all()
+
+def test_fast_mode_simulates_from_holt_winters_residuals():
+    dates = pd.date_range('2024-01-01', periods=120)
+    prices = 8000 + 10 * np.sin(np.arange(120) / 3)
+    model = train_holt_winters(prices)
+    forecast = pd.DataFrame({'ds': pd.date_range('2024-04-30', periods=30), 'yhat': np.full(30, 8000.0)})
+
+    risk = forecast_purchase_risk(forecast, dates[-1], model.residuals[0], '2024-04-30', '2024-05-29', seed=0,
+                                  block_length=7)
+    assert len(risk) == 30
+    assert np.isclose(risk['Chance Cheapest (%)'].sum(), 100)
+
+def test_model_free_bootstrap_is_reproducible():
+    differences = np.random.default_rng(2).normal(0, 10, 365)
+    horizons = np.arange(1, 91)
+    first = simulate_bootstrap_paths(differences, 8000.0, horizons, n_paths=100, seed=3)
+    second = simulate_bootstrap_paths(differences, 8000.0, horizons, n_paths=100, seed=3)
+    np.testing.assert_array_equal(first, second)
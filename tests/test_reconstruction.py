@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_pipeline.date_codec import epoch_day
+from eda.series_store import CompactSeries
+from models.pipeline import fit_arima, prepare_model_data
+from models.reconstruction import one_step_levels, reconstruct_levels
+
+def test_levels_are_the_running_total_from_the_last_price():
+    levels, lower, upper = reconstruct_levels([1.0, -2.0, 3.0], 100.0)
+    np.testing.assert_allclose(levels, [101.0, 99.0, 102.0])
+    assert lower is None and upper is None
+
+def test_rows_reconstruct_independently():
+    levels, _, _ = reconstruct_levels(np.array([[1.0, 1.0], [0.0, -1.0]]), [10.0, 20.0])
+    np.testing.assert_allclose(levels, [[11.0, 12.0], [20.0, 19.0]])
+
+def test_bounds_widen_in_quadrature():
+    differences = np.zeros(4)
+    levels, lower, upper = reconstruct_levels(differences, 50.0, differences - 3.0, differences + 4.0)
+    np.testing.assert_allclose(levels - lower, 3.0 * np.sqrt(np.arange(1, 5)))
+    np.testing.assert_allclose(upper - levels, 4.0 * np.sqrt(np.arange(1, 5)))
+
+def test_one_step_levels_start_from_the_previous_actual_price():
+    actual_levels = np.array([101.0, 103.0, 102.0])
+    actual_differences = np.array([1.0, 2.0, -1.0])
+    np.testing.assert_allclose(one_step_levels([0.5, 0.5, 0.5], actual_levels, actual_differences),
+                               [100.5, 101.5, 103.5])
+
+def synthetic_series(days=730):
+    prices = np.round(8000 + np.cumsum(np.random.default_rng(0).normal(0, 20, days)))
+    start = epoch_day(pd.Timestamp('2000-01-01'))
+    return CompactSeries.from_days('Coimbatore', start + np.arange(days), {'Morning': prices, 'Evening': prices})
+
+@pytest.fixture
+def series():
+    return synthetic_series()
+
+def arima_outputs(inputs):
+    return fit_arima(inputs).outputs
+
+@pytest.mark.filterwarnings('ignore')
+def test_arima_levels_start_from_the_last_training_price(series):
+    inputs = prepare_model_data(series, test_days=30)
+    outputs = arima_outputs(inputs)
+    last_train_day = inputs.train_series.index[-1]
+
+    np.testing.assert_array_equal(outputs['forecast_levels'].index, inputs.test_series.index)
+    np.testing.assert_allclose(outputs['forecast_levels'],
+                               inputs.levels[last_train_day] + np.cumsum(outputs['forecast'].to_numpy()))
+    np.testing.assert_allclose(outputs['test_levels'], inputs.levels[inputs.test_series.index])
+    assert (outputs['conf_int_levels']['lower'] <= outputs['forecast_levels']).all()
+
+@pytest.mark.filterwarnings('ignore')
+def test_arima_without_hold_out_has_no_actuals_to_compare(series):
+    # The "Model the data" page: the forecast runs past the history and starts from its last price
+    inputs = prepare_model_data(series)
+    outputs = arima_outputs(inputs)
+    forecast_levels = outputs['forecast_levels']
+
+    assert forecast_levels.index[0] == series.index()[-1] + pd.Timedelta(days=1)
+    assert forecast_levels.iloc[0] == pytest.approx(inputs.levels.iloc[-1] + outputs['forecast'].iloc[0])
+    assert outputs['test_levels'].isna().all()
@@ -0,0 +1,111 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from api import ForecastCache, create_server
+from models import registry
+from models.registry import get_entry, load_forecast, manifest_mtime, register_forecast
+
+def forecast_frame(level, days=5):
+    return pd.DataFrame({
+        'ds': pd.date_range('2030-01-01', periods=days),
+        'yhat': [float(level)] * days,
+        'yhat_lower': [level - 10.0] * days,
+        'yhat_upper': [level + 10.0] * days,
+    })
+
+@pytest.mark.parametrize("city", ["", ".", "..", "../coimbatore", "/tmp/registry/coimbatore", "a/b"])
+def test_city_names_cannot_leave_the_registry(tmp_path, city):
+    with pytest.raises(ValueError):
+        register_forecast(city, forecast_frame(100), registry_dir=str(tmp_path))
+    # Readers treat such names as never registered
+    assert get_entry(city, str(tmp_path)) is None
+    assert manifest_mtime(city, str(tmp_path)) == 0
+    assert load_forecast(city, str(tmp_path)) == (None, None)
+
+def test_cache_only_serves_configured_cities(tmp_path):
+    # A manifest outside the configured cities, e.g. reached through an absolute path, is never read
+    outside = tmp_path / "elsewhere"
+    register_forecast("coimbatore", forecast_frame(100), registry_dir=str(outside))
+    cache = ForecastCache(registry_dir=str(tmp_path), cities=["Coimbatore"])
+
+    assert cache.get(str(outside / "coimbatore")) is None
+    assert cache.get("../elsewhere/coimbatore") is None
+    assert cache.get("Chennai") is None
+
+    register_forecast("Coimbatore", forecast_frame(200), registry_dir=str(tmp_path))
+    assert cache.get("COIMBATORE").yhat[0] == 200.0
+
+def test_api_rejects_path_cities_with_404(tmp_path):
+    outside = tmp_path / "elsewhere"
+    register_forecast("coimbatore", forecast_frame(100), registry_dir=str(outside))
+    server = create_server(port=0, registry_dir=str(tmp_path), cities=["Coimbatore"])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        city = urllib.request.quote(str(outside / "coimbatore"), safe="")
+        url = f"http://127.0.0.1:{server.server_address[1]}/forecast?city={city}&start=2030-01-01"
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url, timeout=5)
+        assert error.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_previous_forecast_file_survives_one_generation(tmp_path):
+    registry_dir = str(tmp_path)
+    first = register_forecast("Coimbatore", forecast_frame(100), registry_dir=registry_dir)
+    second = register_forecast("Coimbatore", forecast_frame(200), registry_dir=registry_dir)
+    # A reader holding the first manifest can still open its file
+    assert os.path.exists(tmp_path / "coimbatore" / first["forecast_file"])
+
+    third = register_forecast("Coimbatore", forecast_frame(300), registry_dir=registry_dir)
+    files = sorted(name for name in os.listdir(tmp_path / "coimbatore") if name.endswith(".csv"))
+    assert files == sorted([second["forecast_file"], third["forecast_file"]])
+
+    entry, forecast = load_forecast("Coimbatore", registry_dir)
+    assert entry["version"] == third["version"]
+    assert forecast['yhat'].tolist() == [300.0] * 5
+
+def test_load_forecast_rereads_a_manifest_whose_file_is_gone(tmp_path, monkeypatch):
+    registry_dir = str(tmp_path)
+    first = register_forecast("Coimbatore", forecast_frame(100), registry_dir=registry_dir)
+    register_forecast("Coimbatore", forecast_frame(200), registry_dir=registry_dir)
+    os.remove(tmp_path / "coimbatore" / first["forecast_file"])
+
+    # The first manifest read returns the stale version, as for a reader racing two publishes
+    reads = []
+    def get_entry_racing(city, registry_dir):
+        reads.append(city)
+        if len(reads) == 1:
+            return json.loads(json.dumps(first))
+        return get_entry(city, registry_dir)
+    monkeypatch.setattr(registry, "get_entry", get_entry_racing)
+
+    entry, forecast = load_forecast("Coimbatore", registry_dir)
+    assert len(reads) == 2
+    assert forecast['yhat'].tolist() == [200.0] * 5
+
+def test_api_reuses_encoded_responses_until_a_new_version(tmp_path):
+    register_forecast("Coimbatore", forecast_frame(100), registry_dir=str(tmp_path))
+    server = create_server(port=0, registry_dir=str(tmp_path), cities=["Coimbatore"])
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/forecast?city=Coimbatore&days=3&start=2030-01-01"
+    try:
+        first = json.loads(urllib.request.urlopen(url, timeout=5).read())
+        assert json.loads(urllib.request.urlopen(url, timeout=5).read()) == first
+        assert len(server.cache.get("Coimbatore").responses) == 1
+
+        register_forecast("Coimbatore", forecast_frame(200), registry_dir=str(tmp_path))
+        second = json.loads(urllib.request.urlopen(url, timeout=5).read())
+        assert [row["expected_price"] for row in second["forecast"]] == [200] * 3
+        assert second["version"] != first["version"]
+    finally:
+        server.shutdown()
+        server.server_close()
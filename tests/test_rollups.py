@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from database.db_handler import ROLLUP_PERIODS, GoldPriceDB
+from eda.stationarity import difference_data, plot_scatter_comparison
+from tests.conftest import daily_frame
+
+# Weeks end on Sunday and are labelled by it; rollups label them by their Monday
+RESAMPLE_RULES = {'week': 'W-SUN', 'month': 'MS', 'year': 'YS'}
+
+def random_walk(days, seed=0):
+    return np.round(8000 + np.cumsum(np.random.default_rng(seed).normal(0, 25, days)), 2)
+
+@pytest.fixture
+def db(db_path):
+    db = GoldPriceDB(db_path)
+    yield db
+    db.close()
+
+def test_incremental_merges_match_a_full_rebuild(db):
+    prices = random_walk(800)
+    frame = daily_frame('2022-12-29', prices)
+    # An initial load, then daily appends and a multi-week batch that straddle week, month and year boundaries
+    db.update_data('Coimbatore', frame.iloc[:30])
+    for day in range(30, 40):
+        db.update_data('Coimbatore', frame.iloc[day:day + 1])
+    db.update_data('Coimbatore', frame.iloc[40:800])
+    merged = {period: db.get_rollups('Coimbatore', period) for period in ROLLUP_PERIODS}
+
+    db.refresh_rollups('Coimbatore')
+    for period in ROLLUP_PERIODS:
+        pd.testing.assert_frame_equal(merged[period], db.get_rollups('Coimbatore', period))
+
+def test_rollups_match_resampled_daily_prices(db):
+    # Morning is missing on every tenth day: its counts and means skip those days
+    evening = random_walk(500, seed=1)
+    morning = np.where(np.arange(500) % 10 == 0, np.nan, evening - 5)
+    frame = daily_frame('2023-03-15', evening, morning=morning)
+    frame['Morning'] = frame['Morning'].replace('nan', '')
+    db.update_data('Coimbatore', frame)
+
+    daily = pd.DataFrame({'Morning': morning, 'Evening': evening},
+                         index=pd.date_range('2023-03-15', periods=500, name='Date'))
+    for period, rule in RESAMPLE_RULES.items():
+        rollups = db.get_rollups('Coimbatore', period)
+        for column in ('Morning', 'Evening'):
+            expected = daily[column].resample(rule).agg(['max', 'min', 'mean', 'count'])
+            if period == 'week':
+                expected.index = expected.index - pd.Timedelta(days=6)
+            expected = expected[expected['count'] > 0]
+            np.testing.assert_array_equal(rollups.index, expected.index)
+            np.testing.assert_allclose(rollups[f'{column}_max'], expected['max'])
+            np.testing.assert_allclose(rollups[f'{column}_min'], expected['min'])
+            np.testing.assert_allclose(rollups[f'{column}_mean'], expected['mean'])
+            np.testing.assert_array_equal(rollups[f'{column}_count'], expected['count'])
+        assert rollups['Evening_count'].sum() == 500
+
+def test_rollup_date_range(db):
+    db.update_data('Coimbatore', daily_frame('2024-01-01', random_walk(366)))
+    months = db.get_rollups('Coimbatore', 'month', start='2024-03-01', end='2024-05-31')
+    assert list(months.index.strftime('%Y-%m')) == ['2024-03', '2024-04', '2024-05']
+    with pytest.raises(ValueError):
+        db.get_rollups('Coimbatore', 'quarter')
+
+def test_two_year_lag_scatter_reads_weekly_rollups(db):
+    db.update_data('Coimbatore', daily_frame('2021-01-04', random_walk(1100, seed=2)))
+    weekly = db.get_rollups('Coimbatore', 'week')
+    data = difference_data(pd.DataFrame({'Evening': random_walk(1100, seed=2)}), 'Evening')
+
+    fig = plot_scatter_comparison(data, 'Evening', weekly=weekly)
+    long_lag = fig.axes[2].collections[0].get_offsets()
+    # 1100 days are 158 weeks (the last one partial): 158 - 104 pairs two years apart
+    assert len(weekly) == 158
+    assert len(long_lag) == 158 - 104
+    np.testing.assert_allclose(long_lag[:, 0], weekly['Evening_mean'].iloc[:54])
+    np.testing.assert_allclose(long_lag[:, 1], weekly['Evening_mean'].iloc[104:])
@@ -0,0 +1,128 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_pipeline.date_codec import epoch_day
+from data_pipeline.ingest import ingest_range, stored_context
+from data_pipeline.scraper import GoldPriceScraper
+from data_pipeline.validation import find_gaps, validate_batch
+from database.db_handler import GoldPriceDB
+from tests.conftest import daily_frame
+
+class StaticScraper:
+    """Returns a fixed batch, like GoldPriceScraper.scrape_range on a good day."""
+
+    def __init__(self, batch):
+        self.batch = batch
+
+    def scrape_range(self, start_date, end_date):
+        return self.batch
+
+def anchors(start, prices):
+    days = epoch_day(pd.Timestamp(start)) + np.arange(len(prices))
+    prices = np.asarray(prices, dtype=np.float64)
+    return days, {'Morning': prices, 'Evening': prices}
+
+def reasons(result):
+    return dict(zip(result.quarantined['Date'], result.quarantined['reason']))
+
+def test_one_row_jump_is_quarantined():
+    # The daily ingest case: one new row, 12.7% above the last stored prices
+    result = validate_batch(daily_frame('2024-03-03', [9300]), previous=anchors('2024-03-01', [8200, 8250]))
+    assert result.valid.empty
+    assert reasons(result) == {'3-Mar-24': 'jump'}
+
+def test_one_row_normal_move_is_stored():
+    result = validate_batch(daily_frame('2024-03-03', [8300]), previous=anchors('2024-03-01', [8200, 8250]))
+    assert result.valid['Evening'].tolist() == ['8300']
+    assert result.quarantined.empty
+
+def test_spike_is_quarantined_but_not_its_neighbours():
+    prices = [8200, 8210, 8190, 9500, 8220, 8230, 8240]
+    result = validate_batch(daily_frame('2024-03-01', prices))
+    assert reasons(result) == {'4-Mar-24': 'jump'}
+    assert len(result.valid) == 6
+
+def test_level_shift_passes_once_the_batch_outvotes_the_anchors():
+    previous = anchors('2024-03-01', [8200, 8250])
+    result = validate_batch(daily_frame('2024-03-03', [9300, 9310, 9320]), previous=previous)
+    assert result.quarantined.empty
+    assert len(result.valid) == 3
+
+def test_rejection_reasons():
+    batch = pd.DataFrame({
+        'Date': ['1-Mar-24', 'today', '2-Mar-24', '3-Mar-24', '3-Mar-24', '4-Mar-24'],
+        'Morning': ['8,200', '8200', 'n/a', '8210', '8215', '8220'],
+        'Evening': ['₹8,200', '8200', '8200', '8210', '8215', '-1'],
+    })
+    result = validate_batch(batch, existing_days=[epoch_day(pd.Timestamp('2024-03-01'))])
+    assert list(zip(result.quarantined['Date'], result.quarantined['reason'])) == [
+        ('1-Mar-24', 'duplicate'), ('today', 'bad_date'), ('2-Mar-24', 'bad_price'),
+        ('3-Mar-24', 'duplicate'), ('4-Mar-24', 'bad_price'),
+    ]
+    # The later of the repeated days wins, with normalized prices
+    assert result.valid[['Date', 'Morning', 'Evening']].values.tolist() == [['3-Mar-24', '8215', '8215']]
+
+def test_gaps_count_stored_days():
+    previous = anchors('2024-02-27', [8200, 8200])       # 27 and 28 Feb stored
+    existing = epoch_day(pd.Timestamp('2024-03-02')) + np.arange(2)  # 2 and 3 Mar stored and re-scraped
+    batch = daily_frame('2024-03-02', [8200, 8200, 8200, 8200, 8200]).drop(index=2)  # 4 Mar missing
+    result = validate_batch(batch, existing_days=existing, previous=previous)
+    assert result.gaps == [('2024-02-29', '2024-03-01'), ('2024-03-04', '2024-03-04')]
+    assert find_gaps([]) == []
+
+def test_schema_error():
+    with pytest.raises(ValueError):
+        validate_batch(pd.DataFrame({'Date': ['1-Mar-24']}))
+
+def test_daily_ingest_checks_against_stored_prices(db_path):
+    db = GoldPriceDB(db_path)
+    try:
+        db.update_data('Coimbatore', daily_frame('2024-01-01', np.linspace(8000, 8250, 60).round()))
+        start = datetime(2024, 3, 1)
+
+        result = ingest_range(db, StaticScraper(daily_frame('2024-03-01', [9300])), 'Coimbatore', start, start)
+        assert result.valid.empty
+        assert db.get_quarantine('Coimbatore')['reason'].tolist() == ['jump']
+        assert db.get_latest_date('Coimbatore') == '2024-02-29'
+
+        result = ingest_range(db, StaticScraper(daily_frame('2024-03-01', [8260])), 'Coimbatore', start, start)
+        assert result.valid['Evening'].tolist() == ['8260']
+        assert db.get_latest_date('Coimbatore') == '2024-03-01'
+    finally:
+        db.close()
+
+def test_stored_context_reads_only_the_batch_range(db_path):
+    db = GoldPriceDB(db_path)
+    try:
+        db.update_data('Coimbatore', daily_frame('2024-01-01', [8000 + day for day in range(60)]))
+        existing, (days, prices) = stored_context(db, 'Coimbatore', daily_frame('2024-02-28', [8100, 8100, 8100]))
+        assert existing.tolist() == [epoch_day(pd.Timestamp('2024-02-28')), epoch_day(pd.Timestamp('2024-02-29'))]
+        assert days.tolist() == [epoch_day(pd.Timestamp('2024-02-26')), epoch_day(pd.Timestamp('2024-02-27'))]
+        assert prices['Evening'].tolist() == [8056.0, 8057.0]
+
+        assert stored_context(db, 'Chennai', daily_frame('2024-02-28', [8100]))[0].size == 0
+        assert stored_context(db, 'Coimbatore', pd.DataFrame({'Date': ['today']})) == (None, None)
+    finally:
+        db.close()
+
+def test_unparseable_scraped_dates_reach_quarantine(db_path, monkeypatch):
+    # A month page as scraped: days before the range, good days, a blank cell, the "today" row and garbage
+    page = pd.DataFrame({
+        'Date': ['28-Feb-24', '1-Mar-24', '2-Mar-24', '', 'Today', '3-Marc-24'],
+        'Morning': ['8100', '8110', '8120', '8125', '8130', '8140'],
+        'Evening': ['8100', '8110', '8120', '8125', '8130', '8140'],
+    })
+    monkeypatch.setattr(GoldPriceScraper, "scrape_month", lambda self, month, year: page)
+    db = GoldPriceDB(db_path)
+    try:
+        result = ingest_range(db, GoldPriceScraper('Coimbatore'), 'Coimbatore',
+                              datetime(2024, 3, 1), datetime(2024, 3, 2))
+        assert result.valid['Date'].tolist() == ['1-Mar-24', '2-Mar-24']
+        quarantined = db.get_quarantine('Coimbatore')
+        assert quarantined['Date'].tolist() == ['', 'Today', '3-Marc-24']
+        assert set(quarantined['reason']) == {'bad_date'}
+    finally:
+        db.close()